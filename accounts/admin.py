@@ -16,7 +16,7 @@ class DeliveryAgentAdmin(admin.ModelAdmin):
     list_display = ('full_name', 'user', 'phone', 'vehicle_type', 'availability_status', 'created_at')
     list_filter = ('vehicle_type', 'availability_status', 'created_at')
     search_fields = ('full_name', 'user__username', 'phone', 'vehicle_number', 'driving_license')
-    readonly_fields = ('created_at', 'updated_at', 'total_deliveries', 'total_earnings')
+    readonly_fields = ('created_at', 'updated_at', 'total_deliveries', 'total_earnings', 'last_latitude', 'last_longitude', 'last_location_at')
     
     fieldsets = (
         ('User Information', {
@@ -29,7 +29,7 @@ class DeliveryAgentAdmin(admin.ModelAdmin):
             'fields': ('vehicle_type', 'vehicle_number', 'driving_license')
         }),
         ('Status', {
-            'fields': ('availability_status',)
+            'fields': ('availability_status', 'last_latitude', 'last_longitude', 'last_location_at')
         }),
         ('Documents', {
             'fields': ('id_proof',)
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from foodify_project.spatial import GeohashedModelMixin
 
 
 class UserProfile(models.Model):
@@ -40,8 +41,10 @@ class UserProfile(models.Model):
         verbose_name_plural = 'User Profiles'
 
 
-class DeliveryAgent(models.Model):
+class DeliveryAgent(GeohashedModelMixin, models.Model):
     """Delivery agent profile with vehicle and license information"""
+    GEOHASH_FIELDS = {'last_geohash': ('last_latitude', 'last_longitude')}
+    
     VEHICLE_TYPE_CHOICES = [
         ('bike', 'Bike'),
         ('scooter', 'Scooter'),
@@ -57,6 +60,11 @@ class DeliveryAgent(models.Model):
     vehicle_number = models.CharField(max_length=20)
     driving_license = models.CharField(max_length=50)
     availability_status = models.BooleanField(default=True)
+    # Last reported position, written by flush_agent_locations (see delivery/location_store.py)
+    last_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    last_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    last_location_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False, help_text='Spatial index of the last position')
     id_proof = models.FileField(upload_to='delivery_agents/id_proofs/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -64,19 +72,20 @@ class DeliveryAgent(models.Model):
     def __str__(self):
         return f"{self.full_name} - {self.user.username}"
     
+    def _earnings_counters(self):
+        # Kept current by delivery/earnings.py; no row yet means no deliveries
+        from delivery.models import AgentEarnings
+        return AgentEarnings.objects.filter(agent_id=self.user_id).first() or AgentEarnings(agent_id=self.user_id)
+    
     @property
     def total_deliveries(self):
         """Total number of deliveries completed"""
-        from orders.models import Order
-        return Order.objects.filter(delivery_agent=self.user, status='delivered').count()
+        return self._earnings_counters().deliveries
     
     @property
     def total_earnings(self):
         """Total earnings from deliveries"""
-        from orders.models import Order
-        from decimal import Decimal
-        delivered_orders = Order.objects.filter(delivery_agent=self.user, status='delivered')
-        return sum(order.delivery_fee for order in delivered_orders) if delivered_orders.exists() else Decimal('0.00')
+        return self._earnings_counters().earnings
     
     class Meta:
         verbose_name = 'Delivery Agent'
@@ -1,3 +1,31 @@
 from django.contrib import admin
+from .models import AgentEarnings, DeliveryTrajectory, EarningEntry, LocationBreadcrumb
 
-# Register your models here.
+
+@admin.register(LocationBreadcrumb)
+class LocationBreadcrumbAdmin(admin.ModelAdmin):
+    list_display = ('order', 'agent', 'latitude', 'longitude', 'accuracy', 'recorded_at', 'received_at')
+    list_filter = ('recorded_at',)
+    search_fields = ('order__id', 'agent__username')
+    readonly_fields = ('received_at',)
+
+
+@admin.register(DeliveryTrajectory)
+class DeliveryTrajectoryAdmin(admin.ModelAdmin):
+    list_display = ('order', 'points', 'raw_points', 'max_error', 'tolerance', 'started_at', 'ended_at')
+    search_fields = ('order__id',)
+    readonly_fields = ('created_at',)
+
+
+@admin.register(EarningEntry)
+class EarningEntryAdmin(admin.ModelAdmin):
+    list_display = ('order', 'agent', 'amount', 'earned_at')
+    list_filter = ('earned_at',)
+    search_fields = ('order__id', 'agent__username')
+
+
+@admin.register(AgentEarnings)
+class AgentEarningsAdmin(admin.ModelAdmin):
+    list_display = ('agent', 'deliveries', 'earnings', 'day', 'day_deliveries', 'day_earnings', 'week', 'week_deliveries', 'week_earnings')
+    search_fields = ('agent__username',)
+    readonly_fields = ('updated_at',)
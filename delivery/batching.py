@@ -0,0 +1,193 @@
+"""
+Multi-drop batching and route sequencing.
+
+Waiting orders are grouped into batches one agent can carry together:
+pickups close to each other, drops close to each other, and ready times
+within a window. An order joins a batch only if carrying it along adds
+less distance than delivering it on its own trip.
+
+Stops are sequenced with nearest neighbour followed by 2-opt, keeping
+every pickup before its drop. A batch of 4 orders (8 stops) sequences in
+well under a millisecond.
+"""
+from datetime import timedelta
+import numpy as np
+from scipy.spatial import cKDTree
+from django.conf import settings
+from foodify_project.geo import distance_matrix_km, haversine_km, project_km
+from orders.models import Order
+from orders.state_machine import AWAITING_PICKUP
+
+
+PICKUP = 'pickup'
+DROP = 'drop'
+
+
+class BatchOrder:
+    """What batching needs to know about an order; drop is None if the delivery location is unknown"""
+
+    def __init__(self, order_id, pickup, drop, ready_at, picked_up=False):
+        self.order_id = order_id
+        self.pickup = (float(pickup[0]), float(pickup[1]))
+        self.drop = (float(drop[0]), float(drop[1])) if drop and drop[0] is not None else None
+        self.ready_at = ready_at
+        self.picked_up = picked_up
+
+    @property
+    def trip_km(self):
+        """Pickup -> drop distance when delivered on its own"""
+        return float(haversine_km(*self.pickup, *self.drop))
+
+
+def estimated_ready_at(confirmed_at, created_at):
+    """Orders carry no ready time; assume ORDER_PREP_MINUTES after confirmation"""
+    return (confirmed_at or created_at) + timedelta(minutes=getattr(settings, 'ORDER_PREP_MINUTES', 15))
+
+
+def _route_length(dist, tour):
+    return sum(dist[a][b] for a, b in zip(tour, tour[1:]))
+
+
+def _feasible(tour, pickup_of):
+    # Every drop node must come after its pickup node (if that is in the tour)
+    seen = set()
+    for node in tour:
+        if node in pickup_of and pickup_of[node] not in seen:
+            return False
+        seen.add(node)
+    return True
+
+
+def sequence_stops(orders, start=None):
+    """
+    Order the stops of a batch. `start` is the agent's (lat, lng); without
+    it the route starts at the pickup of the earliest-ready order. Orders
+    already picked up only need their drop. Returns ([(order_id, PICKUP|DROP)],
+    route_km).
+    """
+    points, stops, pickup_of = [], [], {}
+    if start is not None:
+        points.append((float(start[0]), float(start[1])))
+        stops.append(None)
+    for order in orders:
+        if not order.picked_up:
+            points.append(order.pickup)
+            stops.append((order.order_id, PICKUP))
+            pickup_node = len(points) - 1
+        points.append(order.drop)
+        stops.append((order.order_id, DROP))
+        if not order.picked_up:
+            pickup_of[len(points) - 1] = pickup_node
+
+    # Nested lists: the loops below index single entries, which is much faster than on an array
+    dist = distance_matrix_km(points, points).tolist()
+    if start is None:
+        first = min(orders, key=lambda order: order.ready_at)
+        first_node = stops.index((first.order_id, PICKUP if not first.picked_up else DROP))
+    else:
+        first_node = 0
+
+    # Nearest neighbour over the stops that are allowed next
+    tour = [first_node]
+    remaining = set(range(len(points))) - {first_node}
+    while remaining:
+        visited = set(tour)
+        allowed = [node for node in remaining if node not in pickup_of or pickup_of[node] in visited]
+        node = min(allowed, key=lambda candidate: dist[tour[-1]][candidate])
+        tour.append(node)
+        remaining.remove(node)
+
+    # 2-opt on the open path; the first stop stays fixed
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(tour) - 1):
+            for j in range(i + 1, len(tour)):
+                before = dist[tour[i - 1]][tour[i]] + (dist[tour[j]][tour[j + 1]] if j + 1 < len(tour) else 0.0)
+                after = dist[tour[i - 1]][tour[j]] + (dist[tour[i]][tour[j + 1]] if j + 1 < len(tour) else 0.0)
+                if after < before - 1e-9:
+                    candidate = tour[:i] + tour[i:j + 1][::-1] + tour[j + 1:]
+                    if _feasible(candidate, pickup_of):
+                        tour = candidate
+                        improved = True
+
+    return [stops[node] for node in tour if stops[node] is not None], _route_length(dist, tour)
+
+
+def build_batches(orders, max_orders=None, pickup_radius_km=None, drop_radius_km=None, ready_window=None):
+    """
+    Group BatchOrders into batches, earliest-ready first. Each batch starts
+    from its earliest-ready order and takes compatible orders while that
+    shortens the total distance. Returns a list of lists of BatchOrders.
+    """
+    max_orders = max_orders or getattr(settings, 'BATCH_MAX_ORDERS', 4)
+    pickup_radius_km = pickup_radius_km or getattr(settings, 'BATCH_PICKUP_RADIUS_KM', 1.0)
+    drop_radius_km = drop_radius_km or getattr(settings, 'BATCH_DROP_RADIUS_KM', 3.0)
+    ready_window = ready_window or timedelta(seconds=getattr(settings, 'BATCH_READY_WINDOW', 600))
+
+    orders = sorted(orders, key=lambda order: order.ready_at)
+    if max_orders <= 1 or len(orders) <= 1:
+        return [[order] for order in orders]
+
+    pickups = np.array([order.pickup for order in orders])
+    drops = np.array([order.drop for order in orders])
+    ready = np.array([order.ready_at.timestamp() for order in orders])
+    trip_km = haversine_km(pickups[:, 0], pickups[:, 1], drops[:, 0], drops[:, 1])
+    projected = project_km(pickups, pickups[:, 0].mean())
+    nearby = cKDTree(projected).query_ball_point(projected, r=pickup_radius_km * 1.01)
+
+    batched = np.zeros(len(orders), dtype=bool)
+    batches = []
+    for seed_index, seed in enumerate(orders):
+        if batched[seed_index]:
+            continue
+        batched[seed_index] = True
+        batch = [seed]
+        length = trip_km[seed_index]
+
+        # Compatible candidates, earliest-ready first (orders are sorted by ready time)
+        candidates = np.sort(np.asarray(nearby[seed_index], dtype=np.int64))
+        candidates = candidates[~batched[candidates]]
+        candidates = candidates[np.abs(ready[candidates] - ready[seed_index]) <= ready_window.total_seconds()]
+        candidates = candidates[
+            (haversine_km(*pickups[seed_index], pickups[candidates, 0], pickups[candidates, 1]) <= pickup_radius_km)
+            & (haversine_km(*drops[seed_index], drops[candidates, 0], drops[candidates, 1]) <= drop_radius_km)
+        ]
+        for index in candidates.tolist():
+            if len(batch) == max_orders:
+                break
+            _, combined = sequence_stops(batch + [orders[index]])
+            if combined - length < trip_km[index]:
+                batch.append(orders[index])
+                length = combined
+                batched[index] = True
+        batches.append(batch)
+    return batches
+
+
+def agent_route(user, start=None):
+    """
+    Sequenced stops for the orders an agent currently holds. Returns
+    ([(order_id, PICKUP|DROP, (lat, lng))], route_km) with the route starting
+    at `start` if given.
+    """
+    rows = Order.objects.filter(
+        delivery_agent=user, status__in=(*AWAITING_PICKUP, 'out_for_delivery'),
+        delivery_latitude__isnull=False, delivery_longitude__isnull=False,
+    ).values_list('id', 'status', 'restaurant__latitude', 'restaurant__longitude', 'restaurant_latitude',
+                  'restaurant_longitude', 'delivery_latitude', 'delivery_longitude', 'confirmed_at', 'created_at')
+    orders = []
+    for (order_id, status, lat, lng, picked_lat, picked_lng, drop_lat, drop_lng, confirmed_at, created_at) in rows:
+        pickup = (lat, lng) if lat is not None else (picked_lat, picked_lng)
+        if pickup[0] is None:
+            pickup = (drop_lat, drop_lng)
+        orders.append(BatchOrder(order_id, pickup, (drop_lat, drop_lng), estimated_ready_at(confirmed_at, created_at),
+                                 picked_up=status == 'out_for_delivery'))
+    if not orders:
+        return [], 0.0
+    stops, route_km = sequence_stops(orders, start)
+    by_id = {order.order_id: order for order in orders}
+    return [
+        (order_id, kind, by_id[order_id].pickup if kind == PICKUP else by_id[order_id].drop)
+        for order_id, kind in stops
+    ], route_km
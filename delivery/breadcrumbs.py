@@ -0,0 +1,113 @@
+"""
+Batched GPS breadcrumb ingestion.
+
+Agents' devices buffer fixes while offline and upload them in batches. A
+batch is validated as a whole, stored with one bulk insert and
+de-duplicated on (order, recorded_at) so retried uploads are harmless. The
+newest fix is also copied to the Order row and the live location store,
+for both the order and the agent.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from orders.models import Order
+from .location_store import get_location, record_agent_location, record_location
+from .models import LocationBreadcrumb
+
+
+# Device clocks drift; reject fixes claiming to be further in the future than this
+MAX_CLOCK_SKEW = timedelta(minutes=2)
+
+
+class InvalidFix(ValueError):
+    """A fix in the batch is malformed"""
+
+
+def _parse_timestamp(value):
+    # Accept epoch milliseconds (Geolocation API position.timestamp) or ISO 8601
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is not None:
+            return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, dt_timezone.utc)
+    raise InvalidFix(f'Invalid timestamp: {value!r}')
+
+
+def parse_coordinate(value, limit, name):
+    """A latitude (limit 90) or longitude (limit 180) as a 6-decimal Decimal; raises InvalidFix"""
+    try:
+        coordinate = Decimal(str(value)).quantize(Decimal('0.000001'))
+    except (InvalidOperation, ValueError):
+        raise InvalidFix(f'Invalid {name}: {value!r}')
+    if not coordinate.is_finite():
+        # quantize() lets NaN through, and NaN cannot be compared to the limits
+        raise InvalidFix(f'Invalid {name}: {value!r}')
+    if not -limit <= coordinate <= limit:
+        raise InvalidFix(f'{name} out of range: {value!r}')
+    return coordinate
+
+
+def parse_fixes(raw_fixes):
+    """
+    Validate a list of {latitude, longitude, timestamp, accuracy?} dicts and
+    return (latitude, longitude, recorded_at, accuracy) tuples sorted by time,
+    keeping one fix per timestamp. Raises InvalidFix.
+    """
+    if not isinstance(raw_fixes, list) or not raw_fixes:
+        raise InvalidFix('fixes must be a non-empty list')
+    max_batch = getattr(settings, 'BREADCRUMB_BATCH_MAX', 500)
+    if len(raw_fixes) > max_batch:
+        raise InvalidFix(f'At most {max_batch} fixes per batch')
+
+    latest_allowed = timezone.now() + MAX_CLOCK_SKEW
+    fixes = {}
+    for raw in raw_fixes:
+        if not isinstance(raw, dict):
+            raise InvalidFix('Each fix must be an object')
+        recorded_at = _parse_timestamp(raw.get('timestamp'))
+        if recorded_at > latest_allowed:
+            raise InvalidFix(f'Timestamp in the future: {raw.get("timestamp")!r}')
+        accuracy = raw.get('accuracy')
+        fixes[recorded_at] = (
+            parse_coordinate(raw.get('latitude'), 90, 'latitude'),
+            parse_coordinate(raw.get('longitude'), 180, 'longitude'),
+            recorded_at,
+            float(accuracy) if isinstance(accuracy, (int, float)) and not isinstance(accuracy, bool) else None,
+        )
+    return [fixes[recorded_at] for recorded_at in sorted(fixes)]
+
+
+def store_breadcrumbs(order, agent, fixes, live=True):
+    """
+    Append parsed fixes to the order's breadcrumb trail and make the newest
+    one the order's current agent location, unless a newer one is already
+    known. With live=False (a delivered order) the live location store is
+    left alone. Returns the newest fix of the batch.
+    """
+    LocationBreadcrumb.objects.bulk_create(
+        [
+            LocationBreadcrumb(order=order, agent=agent, latitude=latitude, longitude=longitude,
+                               accuracy=accuracy, recorded_at=recorded_at)
+            for latitude, longitude, recorded_at, accuracy in fixes
+        ],
+        ignore_conflicts=True,
+    )
+
+    latitude, longitude, recorded_at, _ = latest = fixes[-1]
+    Order.objects.filter(pk=order.pk).filter(
+        Q(agent_location_updated_at__isnull=True) | Q(agent_location_updated_at__lt=recorded_at)
+    ).update(
+        agent_current_latitude=latitude,
+        agent_current_longitude=longitude,
+        agent_location_updated_at=recorded_at,
+    )
+    if live:
+        current = get_location(order.pk)
+        if current is None or current.updated_at < recorded_at:
+            record_location(order.pk, latitude, longitude, at=recorded_at)
+            record_agent_location(agent.pk, latitude, longitude, at=recorded_at)
+    return latest
@@ -0,0 +1,147 @@
+"""
+Delivery agent earnings ledger and counters.
+
+Every delivered order appends one EarningEntry (its delivery fee) and bumps
+the agent's AgentEarnings row with a single conditional UPDATE: totals are
+incremented, and the day and week counters are incremented if they belong
+to the same period or restarted if a new one began. Dashboards read that
+one row instead of summing the agent's whole order history.
+
+The ledger is keyed by order, so recording a delivery twice is a no-op.
+rebuild_counters() recomputes everything from orders and reports drift; it
+backs `manage.py reconcile_earnings`.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from orders.models import Order
+from .models import AgentEarnings, EarningEntry
+
+
+COUNTER_FIELDS = ('deliveries', 'earnings', 'day', 'day_deliveries', 'day_earnings',
+                  'week', 'week_deliveries', 'week_earnings')
+
+
+def week_start(day):
+    """Monday of the week containing `day`"""
+    return day - timedelta(days=day.weekday())
+
+
+def _period_update(field, period, count, amount):
+    # Same period: add. Counters already on a later period (a late entry): keep.
+    # Otherwise the period rolled over: restart from this entry.
+    def bump(name, value):
+        return Case(
+            When(**{field: period}, then=F(name) + value),
+            When(**{f'{field}__gt': period}, then=F(name)),
+            default=Value(value),
+            output_field=AgentEarnings._meta.get_field(name),
+        )
+    return {
+        f'{field}_deliveries': bump(f'{field}_deliveries', count),
+        f'{field}_earnings': bump(f'{field}_earnings', amount),
+        field: Case(When(**{f'{field}__gt': period}, then=F(field)), default=Value(period)),
+    }
+
+
+def record_delivery(order_id):
+    """
+    Append the ledger entry of a delivered order and update its agent's
+    counters. Returns the new EarningEntry, or None if the order is not a
+    delivered order with an agent or was already recorded.
+    """
+    row = Order.objects.filter(pk=order_id, status='delivered', delivery_agent__isnull=False).values_list(
+        'delivery_agent_id', 'delivery_fee', 'delivered_at').first()
+    if row is None:
+        return None
+    agent_id, amount, delivered_at = row
+    earned_at = delivered_at or timezone.now()
+    day = timezone.localdate(earned_at)
+
+    with transaction.atomic():
+        entry, created = EarningEntry.objects.get_or_create(
+            order_id=order_id, defaults={'agent_id': agent_id, 'amount': amount, 'earned_at': earned_at})
+        if not created:
+            return None
+        AgentEarnings.objects.get_or_create(agent_id=agent_id)
+        AgentEarnings.objects.filter(agent_id=agent_id).update(
+            deliveries=F('deliveries') + 1,
+            earnings=F('earnings') + amount,
+            **_period_update('day', day, 1, amount),
+            **_period_update('week', week_start(day), 1, amount),
+        )
+    return entry
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_counters(agent_ids=None, today=None, commit=True):
+    """
+    Recompute the ledger and counters from delivered orders: missing entries
+    are appended, entries of orders no longer delivered by their agent are
+    dropped, and the counters are recomputed from the ledger. Returns
+    [(agent_id, stored counters or None, rebuilt counters)] for the agents
+    whose counters were wrong. With commit=False nothing is written.
+    """
+    today = today or timezone.localdate()
+    week = week_start(today)
+    orders = Order.objects.filter(status='delivered', delivery_agent__isnull=False)
+    entries = EarningEntry.objects.order_by()
+    counters = AgentEarnings.objects.all()
+    if agent_ids is not None:
+        orders = orders.filter(delivery_agent__in=agent_ids)
+        entries = entries.filter(Q(agent__in=agent_ids) | Q(order__delivery_agent__in=agent_ids))
+        counters = counters.filter(agent__in=agent_ids)
+
+    with transaction.atomic():
+        entries.filter(
+            ~Q(order__status='delivered') | Q(order__delivery_agent__isnull=True) | ~Q(agent=F('order__delivery_agent'))
+        ).delete()
+        EarningEntry.objects.bulk_create([
+            EarningEntry(order_id=order_id, agent_id=agent_id, amount=amount, earned_at=earned_at)
+            for order_id, agent_id, amount, earned_at in orders.filter(earning__isnull=True).values_list(
+                'id', 'delivery_agent_id', 'delivery_fee', Coalesce('delivered_at', 'updated_at'))
+        ], batch_size=1000)
+
+        in_day = Q(earned_at__gte=_local_midnight(today), earned_at__lt=_local_midnight(today + timedelta(days=1)))
+        in_week = Q(earned_at__gte=_local_midnight(week), earned_at__lt=_local_midnight(week + timedelta(days=7)))
+        zero = Value(Decimal('0.00'))
+        rebuilt = {
+            row.pop('agent'): dict(row, day=today, week=week)
+            for row in entries.values('agent').annotate(
+                deliveries=Count('pk'),
+                earnings=Sum('amount'),
+                day_deliveries=Count('pk', filter=in_day),
+                day_earnings=Coalesce(Sum('amount', filter=in_day), zero),
+                week_deliveries=Count('pk', filter=in_week),
+                week_earnings=Coalesce(Sum('amount', filter=in_week), zero),
+            )
+        }
+
+        stored = {counter.agent_id: counter for counter in counters}
+        drift, created, updated = [], [], []
+        for agent_id in sorted(stored.keys() | rebuilt.keys()):
+            values = rebuilt.get(agent_id) or dict(
+                dict.fromkeys(COUNTER_FIELDS, 0), earnings=Decimal('0.00'), day=today, week=week)
+            counter = stored.get(agent_id)
+            expected = AgentEarnings(**values).snapshot(today)
+            if counter is None or counter.snapshot(today) != expected:
+                drift.append((agent_id, counter.snapshot(today) if counter else None, expected))
+            if counter is None:
+                created.append(AgentEarnings(agent_id=agent_id, **values))
+            else:
+                for field, value in values.items():
+                    setattr(counter, field, value)
+                updated.append(counter)
+
+        if commit:
+            AgentEarnings.objects.bulk_create(created, batch_size=1000)
+            AgentEarnings.objects.bulk_update(updated, COUNTER_FIELDS, batch_size=1000)
+        else:
+            transaction.set_rollback(True)
+    return drift
@@ -0,0 +1,185 @@
+"""
+Live delivery-agent locations.
+
+GPS pings are written to the Django cache, keyed by order, instead of the
+Order row. Tracking pages read the freshest fix from there. Every few
+seconds `flush_agent_locations` writes back the latest fix of each order
+that moved since the last flush. It uses one bulk_update of the three
+location columns, so the database sees one write per flush instead of one
+per ping.
+
+Agents' own positions (with or without an order) are kept the same way
+and flushed to DeliveryAgent.last_latitude/last_longitude/last_location_at.
+Each of them is also a presence heartbeat (see presence.py).
+
+The cache must be shared by all web processes (Redis/Memcached) in
+production, otherwise each process only sees the pings it received.
+"""
+import logging
+from datetime import datetime
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from accounts.models import DeliveryAgent
+from foodify_project.geo import encode_geohash
+from orders.models import Order
+from .presence import heartbeat
+
+
+logger = logging.getLogger(__name__)
+
+LOCATION_FIELDS = ['agent_current_latitude', 'agent_current_longitude', 'agent_location_updated_at']
+AGENT_LOCATION_FIELDS = ['last_latitude', 'last_longitude', 'last_location_at', 'last_geohash']
+
+
+class LiveLocation:
+    """One GPS fix for an order"""
+
+    def __init__(self, latitude, longitude, updated_at):
+        self.latitude = Decimal(str(latitude))
+        self.longitude = Decimal(str(longitude))
+        self.updated_at = updated_at
+
+    @property
+    def is_valid(self):
+        """Finite and on the globe, i.e. storable in the location columns"""
+        return (self.latitude.is_finite() and self.longitude.is_finite()
+                and abs(self.latitude) <= 90 and abs(self.longitude) <= 180)
+
+    def as_dict(self):
+        return {
+            'latitude': str(self.latitude),
+            'longitude': str(self.longitude),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+def _key(order_id):
+    return f'delivery:location:{order_id}'
+
+
+def _agent_key(user_id):
+    return f'delivery:agent-location:{user_id}'
+
+
+def _ttl():
+    return getattr(settings, 'LIVE_LOCATION_TTL', 3600)
+
+
+def record_location(order_id, latitude, longitude, at=None):
+    """Store the agent's latest fix for an order; returns the LiveLocation"""
+    location = LiveLocation(latitude, longitude, at or timezone.now())
+    cache.set(_key(order_id), (str(location.latitude), str(location.longitude), location.updated_at.isoformat()), _ttl())
+    return location
+
+
+def record_agent_location(user_id, latitude, longitude, at=None):
+    """Store an agent's own latest position and mark them online; returns the LiveLocation"""
+    location = LiveLocation(latitude, longitude, at or timezone.now())
+    cache.set(_agent_key(user_id), (str(location.latitude), str(location.longitude), location.updated_at.isoformat()), _ttl())
+    heartbeat(user_id, location.latitude, location.longitude)
+    return location
+
+
+def _load(value):
+    latitude, longitude, updated_at = value
+    return LiveLocation(latitude, longitude, datetime.fromisoformat(updated_at))
+
+
+def get_location(order_id):
+    """Latest cached fix for an order, or None"""
+    value = cache.get(_key(order_id))
+    return _load(value) if value else None
+
+
+def get_locations(order_ids):
+    """{order_id: LiveLocation} for the orders that have a cached fix"""
+    order_ids = list(order_ids)
+    values = cache.get_many([_key(order_id) for order_id in order_ids])
+    return {order_id: _load(values[_key(order_id)]) for order_id in order_ids if _key(order_id) in values}
+
+
+def get_agent_locations(user_ids):
+    """{user_id: LiveLocation} for the agents that have a cached position"""
+    user_ids = list(user_ids)
+    values = cache.get_many([_agent_key(user_id) for user_id in user_ids])
+    return {user_id: _load(values[_agent_key(user_id)]) for user_id in user_ids if _agent_key(user_id) in values}
+
+
+def apply_live_location(order):
+    """Overlay the cached fix on an Order instance if it is newer than the stored one"""
+    location = get_location(order.id)
+    if location and (order.agent_location_updated_at is None or location.updated_at > order.agent_location_updated_at):
+        order.agent_current_latitude = location.latitude
+        order.agent_current_longitude = location.longitude
+        order.agent_location_updated_at = location.updated_at
+    return order
+
+
+def forget_location(order_id):
+    cache.delete(_key(order_id))
+
+
+def flush_locations(order_ids=None):
+    """
+    Write cached fixes that are newer than the database copy back to the
+    Order rows (only the three location columns). Defaults to every order
+    out for delivery. Returns the number of orders updated.
+    """
+    if order_ids is None:
+        queryset = Order.objects.filter(status='out_for_delivery')
+    else:
+        queryset = Order.objects.filter(id__in=order_ids)
+    stored = dict(queryset.values_list('id', 'agent_location_updated_at'))
+    if not stored:
+        return 0
+
+    changed = []
+    for order_id, location in get_locations(stored).items():
+        if not location.is_valid:
+            # One bad fix must not fail the whole batch at every flush
+            logger.warning('Dropping invalid live location of order %s: %s', order_id, location.as_dict())
+            forget_location(order_id)
+        elif stored[order_id] is None or location.updated_at > stored[order_id]:
+            changed.append(Order(
+                id=order_id,
+                agent_current_latitude=location.latitude,
+                agent_current_longitude=location.longitude,
+                agent_location_updated_at=location.updated_at,
+            ))
+    Order.objects.bulk_update(changed, LOCATION_FIELDS, batch_size=500)
+    return len(changed)
+
+
+def flush_agent_positions(user_ids=None):
+    """
+    Write cached agent positions that are newer than the database copy to
+    DeliveryAgent rows. Defaults to every available agent. Returns the number
+    of agents updated.
+    """
+    queryset = DeliveryAgent.objects.all()
+    if user_ids is None:
+        queryset = queryset.filter(availability_status=True)
+    else:
+        queryset = queryset.filter(user_id__in=user_ids)
+    stored = {user_id: (pk, at) for pk, user_id, at in queryset.values_list('id', 'user_id', 'last_location_at')}
+    if not stored:
+        return 0
+
+    changed = []
+    for user_id, location in get_agent_locations(stored).items():
+        pk, stored_at = stored[user_id]
+        if not location.is_valid:
+            logger.warning('Dropping invalid live position of agent %s: %s', user_id, location.as_dict())
+            cache.delete(_agent_key(user_id))
+        elif stored_at is None or location.updated_at > stored_at:
+            changed.append(DeliveryAgent(
+                id=pk,
+                last_latitude=location.latitude,
+                last_longitude=location.longitude,
+                last_location_at=location.updated_at,
+                last_geohash=encode_geohash(location.latitude, location.longitude),
+            ))
+    DeliveryAgent.objects.bulk_update(changed, AGENT_LOCATION_FIELDS, batch_size=500)
+    return len(changed)
@@ -0,0 +1,85 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection
+from orders.models import Order
+from orders.state_machine import transition
+
+
+class Command(BaseCommand):
+    help = 'Race many agents to accept the same orders and check that every order gets exactly one winner'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=50, help='Concurrent agents')
+        parser.add_argument('--orders', type=int, default=20, help='Orders every agent tries to accept')
+        parser.add_argument('--legacy', action='store_true',
+                            help='Use the old read-check-save pattern instead of the state machine')
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        customer = User.objects.create_user(username=f'race-customer-{run_id}')
+        agents = [User.objects.create_user(username=f'race-agent-{run_id}-{i}') for i in range(options['agents'])]
+        order_ids = [
+            Order.objects.create(user=customer, total_amount=100, delivery_address='Race', status='preparing').id
+            for _ in range(options['orders'])
+        ]
+        accept = self._legacy_accept if options['legacy'] else self._accept
+
+        wins = Counter()
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(agents))
+
+        def race(agent):
+            try:
+                barrier.wait()
+                for order_id in order_ids:
+                    if accept(order_id, agent):
+                        with lock:
+                            wins[order_id] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        try:
+            threads = [threading.Thread(target=race, args=(agent,)) for agent in agents]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            assigned = dict(Order.objects.filter(id__in=order_ids).values_list('id', 'delivery_agent_id'))
+            double_wins = sum(1 for order_id in order_ids if wins[order_id] > 1)
+            unassigned = sum(1 for order_id in order_ids if assigned[order_id] is None)
+
+            self.stdout.write(f'Mode: {"legacy read-check-save" if options["legacy"] else "compare-and-set"}')
+            self.stdout.write(f'Agents: {len(agents)}, orders: {len(order_ids)}, attempts: {len(agents) * len(order_ids)}')
+            self.stdout.write(f'Accepts reported as successful: {sum(wins.values())}')
+            self.stdout.write(f'Orders with more than one "winner": {double_wins}')
+            self.stdout.write(f'Orders left unassigned: {unassigned}')
+            self.stdout.write(f'Errors: {len(errors)}')
+            self.stdout.write(f'Elapsed: {elapsed * 1000:.1f} ms')
+            if double_wins or unassigned or errors:
+                self.stdout.write(self.style.ERROR('✗ Incorrect outcomes detected'))
+            else:
+                self.stdout.write(self.style.SUCCESS('✓ Every order was won by exactly one agent'))
+        finally:
+            Order.objects.filter(id__in=order_ids).delete()
+            User.objects.filter(username__startswith='race-').filter(username__contains=run_id).delete()
+
+    def _accept(self, order_id, agent):
+        return transition(order_id, 'accept', values={'delivery_agent': agent})
+
+    def _legacy_accept(self, order_id, agent):
+        order = Order.objects.get(id=order_id)
+        if order.delivery_agent is not None or order.status not in ['confirmed', 'preparing']:
+            return False
+        order.delivery_agent = agent
+        order.save()
+        return True
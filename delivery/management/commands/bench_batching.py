@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from delivery.batching import BatchOrder, build_batches, sequence_stops
+
+
+class Command(BaseCommand):
+    help = 'Compare solo and batched deliveries over synthetic orders, and time stop sequencing (nothing is stored)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help='Waiting orders')
+        parser.add_argument('--restaurants', type=int, default=150, help='Restaurants the orders come from')
+        parser.add_argument('--radius-km', type=float, default=10.0, help='City radius')
+        parser.add_argument('--drop-km', type=float, default=4.0, help='Farthest drop from its restaurant')
+        parser.add_argument('--window', type=int, default=30, help='Minutes over which the orders become ready')
+        parser.add_argument('--speed', type=float, default=20.0, help='Agent speed in km/h')
+        parser.add_argument('--stop-minutes', type=float, default=4.0, help='Time spent at each pickup and drop')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        center = np.array([17.385, 78.4867])
+        now = timezone.now()
+
+        restaurants = center + rng.uniform(-1, 1, size=(options['restaurants'], 2)) * options['radius_km'] / 111.0
+        pickups = restaurants[rng.integers(0, options['restaurants'], size=options['orders'])]
+        drops = pickups + rng.uniform(-1, 1, size=(options['orders'], 2)) * options['drop_km'] / 111.0 / np.sqrt(2)
+        ready = rng.uniform(0, options['window'] * 60, size=options['orders'])
+        orders = [
+            BatchOrder(i, pickup, drop, now + timedelta(seconds=seconds))
+            for i, (pickup, drop, seconds) in enumerate(zip(pickups.tolist(), drops.tolist(), ready.tolist()))
+        ]
+
+        started = time.perf_counter()
+        batches = build_batches(orders)
+        batch_ms = (time.perf_counter() - started) * 1000
+
+        # Agent time per trip: driving at --speed plus --stop-minutes per stop.
+        # Travel to the first pickup is left out; it is the same either way.
+        def hours(km, stops):
+            return km / options['speed'] + stops * options['stop_minutes'] / 60
+
+        solo_km = sum(order.trip_km for order in orders)
+        solo_hours = sum(hours(order.trip_km, 2) for order in orders)
+        batched_km = batched_hours = 0.0
+        for batch in batches:
+            stops, km = sequence_stops(batch)
+            batched_km += km
+            batched_hours += hours(km, len(stops))
+
+        self.stdout.write(f'{len(orders)} orders -> {len(batches)} batches '
+                          f'(mean {len(orders) / len(batches):.2f} orders) in {batch_ms:.0f} ms')
+        self.stdout.write(f'{"mode":>8} {"trips":>6} {"km/delivery":>12} {"deliveries/agent-hour":>22}')
+        for mode, trips, km, agent_hours in (('solo', len(orders), solo_km, solo_hours),
+                                             ('batched', len(batches), batched_km, batched_hours)):
+            self.stdout.write(f'{mode:>8} {trips:>6} {km / len(orders):>12.2f} {len(orders) / agent_hours:>22.2f}')
+
+        # Sequencing cost for full batches of 4 orders (8 stops)
+        timings = []
+        for first in range(0, min(len(orders), 2000) - 3, 4):
+            started = time.perf_counter()
+            sequence_stops(orders[first:first + 4])
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f'sequence_stops, 8 stops: mean {np.mean(timings):.3f} ms, max {np.max(timings):.3f} ms '
+                          f'over {len(timings)} batches')
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
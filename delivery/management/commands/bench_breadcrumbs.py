@@ -0,0 +1,77 @@
+import json
+import time
+import uuid
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from orders.models import Order
+from delivery.location_store import forget_location
+
+
+class Command(BaseCommand):
+    help = 'Compare GPS fix ingestion: one fix per request vs batched breadcrumb uploads (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixes', type=int, default=600, help='Fixes uploaded per mode')
+        parser.add_argument('--batch-sizes', default='1,10,50,200', help='Comma-separated batch sizes')
+
+    def handle(self, *args, **options):
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+        total = options['fixes']
+
+        self.stdout.write(f'{total} fixes per mode')
+        self.stdout.write(f'{"mode":>10} {"requests":>9} {"queries":>8} {"fixes/s":>9} {"ms/request":>11}')
+
+        with override_settings(ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            run_id = uuid.uuid4().hex[:8]
+            customer = User.objects.create_user(username=f'bench-crumb-customer-{run_id}')
+            agent = User.objects.create_user(username=f'bench-crumb-agent-{run_id}')
+            agent.profile.user_type = 'delivery_agent'
+            agent.profile.save()
+            order = Order.objects.create(user=customer, delivery_agent=agent, total_amount=100,
+                                         delivery_address='Benchmark', status='out_for_delivery')
+            client = Client()
+            client.force_login(agent)
+            start_at = timezone.now() - timedelta(days=1)
+
+            self._run(client, 'single', total, lambda i: (
+                reverse('delivery:update_location'),
+                {'order_id': order.id, 'latitude': 17.385 + i * 1e-5, 'longitude': 78.4867},
+            ), requests=total)
+
+            for run, size in enumerate(batch_sizes):
+                offset = (run + 1) * total
+
+                def batch(i, size=size, offset=offset):
+                    first = i * size
+                    return reverse('delivery:update_location_batch'), {'order_id': order.id, 'fixes': [
+                        {'latitude': 17.385 + n * 1e-5, 'longitude': 78.4867,
+                         'timestamp': (start_at + timedelta(seconds=offset + n)).isoformat()}
+                        for n in range(first, min(first + size, total))
+                    ]}
+
+                self._run(client, f'batch {size}', total, batch, requests=-(-total // size))
+
+            forget_location(order.id)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
+
+    def _run(self, client, mode, total, build, requests):
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as ctx:
+            for i in range(requests):
+                url, body = build(i)
+                response = client.post(url, json.dumps(body), content_type='application/json')
+                if response.status_code != 200:
+                    raise RuntimeError(f'{mode}: HTTP {response.status_code} {response.content[:200]!r}')
+        elapsed = time.perf_counter() - started
+        queries = len(ctx.captured_queries)
+        reset_queries()
+        self.stdout.write(f'{mode:>10} {requests:>9} {queries:>8} {total / elapsed:>9.0f} '
+                          f'{elapsed * 1000 / requests:>11.2f}')
@@ -0,0 +1,85 @@
+import time
+import uuid
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import DeliveryAgent, UserProfile
+from orders.models import Order
+from restaurants.models import Restaurant
+from delivery.dispatch import run_dispatch, solve_assignment
+from delivery.presence import heartbeat, leave
+
+
+class Command(BaseCommand):
+    help = 'Time a dispatch round over synthetic orders and agents spread across a city (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help='Waiting orders')
+        parser.add_argument('--agents', type=int, default=2000, help='Idle agents')
+        parser.add_argument('--restaurants', type=int, default=300, help='Restaurants the orders come from')
+        parser.add_argument('--radius-km', type=float, default=15.0, help='City radius')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        center = np.array([17.385, 78.4867])
+        spread = options['radius_km'] / 111.0
+
+        def points(n):
+            return center + rng.uniform(-spread, spread, size=(n, 2))
+
+        # The solver alone, without the database
+        agent_points, order_points = points(options['agents']), points(options['orders'])
+        started = time.perf_counter()
+        matches = solve_assignment(agent_points, order_points, 8.0)
+        self.stdout.write(f'Solver: {options["orders"]} orders x {options["agents"]} agents -> '
+                          f'{len(matches)} matches in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+        with transaction.atomic():
+            run_id = uuid.uuid4().hex[:8]
+            now = timezone.now()
+            owner = User.objects.create_user(username=f'bench-dispatch-owner-{run_id}')
+            customer = User.objects.create_user(username=f'bench-dispatch-customer-{run_id}')
+            restaurants = Restaurant.objects.bulk_create([
+                Restaurant(owner=owner, name=f'Bench {run_id} {i}', cuisine='Benchmark', location='Benchmark', description='',
+                           latitude=round(lat, 6), longitude=round(lng, 6))
+                for i, (lat, lng) in enumerate(points(options['restaurants']).tolist())
+            ])
+            Order.objects.bulk_create([
+                Order(user=customer, restaurant=restaurants[i], total_amount=100, delivery_address='Benchmark',
+                      status='preparing', confirmed_at=now, delivery_latitude=round(lat, 6),
+                      delivery_longitude=round(lng, 6))
+                for i, (lat, lng) in zip(rng.integers(0, len(restaurants), size=options['orders']).tolist(),
+                                         points(options['orders']).tolist())
+            ])
+            users = User.objects.bulk_create([
+                User(username=f'bench-dispatch-agent-{run_id}-{i}') for i in range(options['agents'])
+            ])
+            UserProfile.objects.bulk_create([UserProfile(user=user, user_type='delivery_agent') for user in users])
+            agent_points = points(options['agents']).round(6).tolist()
+            DeliveryAgent.objects.bulk_create([
+                DeliveryAgent(user=user, full_name=user.username, phone='0', address='Benchmark', vehicle_type='bike',
+                              vehicle_number='0', driving_license='0', last_latitude=lat, last_longitude=lng,
+                              last_location_at=now)
+                for user, (lat, lng) in zip(users, agent_points)
+            ])
+            started = time.perf_counter()
+            for user, (lat, lng) in zip(users, agent_points):
+                heartbeat(user.id, lat, lng)
+            self.stdout.write(f'Presence: {len(users)} heartbeats in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+            started = time.perf_counter()
+            result = run_dispatch(now)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Dispatch round: {result["assigned"]} of {result["orders"]} orders in {result["batches"]} batches '
+                f'assigned to {result["agents"]} agents, mean pickup {result["mean_pickup_km"]:.2f} km in {elapsed * 1000:.0f} ms '
+                f'(load {result["load_ms"]:.0f}, batch {result["batch_ms"]:.0f}, solve {result["solve_ms"]:.0f}, commit {result["commit_ms"]:.0f})'
+            )
+            for user in users:
+                leave(user.id)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
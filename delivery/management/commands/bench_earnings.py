@@ -0,0 +1,64 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from orders.models import Order
+from restaurants.models import Restaurant
+from delivery.earnings import rebuild_counters
+from delivery.models import AgentEarnings
+
+
+class Command(BaseCommand):
+    help = 'Time dashboard earnings stats for an agent with a long history: order scan vs counters (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=5000, help='Delivered orders of the agent')
+        parser.add_argument('--loads', type=int, default=50, help='Dashboard loads to time')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            run_id = uuid.uuid4().hex[:8]
+            now = timezone.now()
+            agent = User.objects.create_user(username=f'bench-earnings-agent-{run_id}')
+            customer = User.objects.create_user(username=f'bench-earnings-customer-{run_id}')
+            restaurant = Restaurant.objects.create(owner=customer, name=f'Bench {run_id}', cuisine='Benchmark',
+                                                   location='Benchmark', description='')
+            Order.objects.bulk_create([
+                Order(user=customer, restaurant=restaurant, delivery_agent=agent, total_amount=100,
+                      delivery_address='Benchmark', status='delivered', delivered_at=now)
+                for _ in range(options['deliveries'])
+            ], batch_size=1000)
+            started = time.perf_counter()
+            rebuild_counters([agent.id])
+            self.stdout.write(f'Rebuilt counters from {options["deliveries"]} orders in '
+                              f'{(time.perf_counter() - started) * 1000:.0f} ms')
+
+            def scan():
+                # What the dashboard did before: load every delivered order and sum in Python
+                delivered = Order.objects.filter(delivery_agent=agent, status='delivered')
+                return delivered.count(), sum(order.delivery_fee for order in delivered)
+
+            def aggregate():
+                totals = Order.objects.filter(delivery_agent=agent, status='delivered').aggregate(
+                    deliveries=Count('id'), earnings=Sum('delivery_fee'))
+                return totals['deliveries'], totals['earnings']
+
+            def counters():
+                stats = AgentEarnings.objects.get(agent=agent).snapshot()
+                return stats['deliveries'], stats['earnings']
+
+            expected = scan()
+            self.stdout.write(f'{"mode":>10} {"ms/load":>8}')
+            for mode, read in (('scan', scan), ('aggregate', aggregate), ('counters', counters)):
+                started = time.perf_counter()
+                for _ in range(options['loads']):
+                    result = read()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{mode:>10} {elapsed * 1000 / options["loads"]:>8.2f}'
+                                  f'{"" if result == expected else "  MISMATCH"}')
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
@@ -0,0 +1,92 @@
+import time
+import uuid
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from orders.models import Order
+from delivery.location_store import record_location, flush_locations, forget_location
+
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = 'Compare database writes per minute of GPS pings: per-ping order.save() vs the live location store (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=500, help='Active deliveries')
+        parser.add_argument('--ping-interval', type=int, default=5, help='Seconds between pings per agent')
+        parser.add_argument('--flush-interval', type=int, default=15, help='Seconds between location store flushes')
+        parser.add_argument('--minutes', type=int, default=1, help='Simulated minutes')
+
+    def handle(self, *args, **options):
+        seconds = options['minutes'] * 60
+        ticks = range(0, seconds, options['ping_interval'])
+
+        self.stdout.write(f'{options["deliveries"]} active deliveries, one ping every {options["ping_interval"]} s, '
+                          f'{options["minutes"]} simulated minute(s), flush every {options["flush_interval"]} s')
+        self.stdout.write(f'{"mode":>8} {"pings":>7} {"DB writes":>10} {"writes/min":>11} {"DB reads":>9} {"elapsed s":>10}')
+
+        with transaction.atomic():
+            run_id = uuid.uuid4().hex[:8]
+            customer = User.objects.create_user(username=f'bench-loc-customer-{run_id}')
+            agent = User.objects.create_user(username=f'bench-loc-agent-{run_id}')
+            orders = Order.objects.bulk_create([
+                Order(user=customer, delivery_agent=agent, total_amount=100, delivery_address='Benchmark',
+                      status='out_for_delivery')
+                for _ in range(options['deliveries'])
+            ])
+            start_at = timezone.now()
+
+            for run, mode in enumerate(('save', 'store')):
+                writes = reads = pings = 0
+                started = time.perf_counter()
+                for second in ticks:
+                    # Each mode simulates its own window so its fixes are newer than the previous mode's
+                    at = start_at + timedelta(seconds=run * seconds + second)
+                    for i, order in enumerate(orders):
+                        latitude, longitude = 17.385 + i * 1e-4 + second * 1e-5, 78.4867 + second * 1e-5
+                        with CaptureQueriesContext(connection) as ctx:
+                            if mode == 'save':
+                                self._legacy_ping(order.id, agent, latitude, longitude, at)
+                            else:
+                                self._store_ping(order.id, agent, latitude, longitude, at)
+                        pings += 1
+                        w, r = self._count(ctx)
+                        writes, reads = writes + w, reads + r
+                    if mode == 'store' and (second + options['ping_interval']) % options['flush_interval'] == 0:
+                        with CaptureQueriesContext(connection) as ctx:
+                            flush_locations()
+                        w, r = self._count(ctx)
+                        writes, reads = writes + w, reads + r
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{mode:>8} {pings:>7} {writes:>10} {writes / options["minutes"]:>11.0f} '
+                                  f'{reads:>9} {elapsed:>10.2f}')
+
+            for order in orders:
+                forget_location(order.id)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
+
+    def _legacy_ping(self, order_id, agent, latitude, longitude, at):
+        # What update_agent_location used to do for every ping
+        order = Order.objects.get(id=order_id, delivery_agent=agent, status='out_for_delivery')
+        order.agent_current_latitude = round(latitude, 6)
+        order.agent_current_longitude = round(longitude, 6)
+        order.agent_location_updated_at = at
+        order.save()
+
+    def _store_ping(self, order_id, agent, latitude, longitude, at):
+        if Order.objects.filter(id=order_id, delivery_agent=agent, status='out_for_delivery').exists():
+            record_location(order_id, round(latitude, 6), round(longitude, 6), at=at)
+
+    def _count(self, ctx):
+        writes = sum(1 for query in ctx.captured_queries if query['sql'].lstrip().upper().startswith(WRITE_PREFIXES))
+        reads = len(ctx.captured_queries) - writes
+        # Keep the connection's bounded query log from overflowing on long runs
+        reset_queries()
+        return writes, reads
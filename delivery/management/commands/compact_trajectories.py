@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Max, Q
+from orders.models import Order
+from delivery.trajectory import compact_trajectory
+
+
+class Command(BaseCommand):
+    help = 'Simplify breadcrumbs of delivered orders into trajectories and report compression and error'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', type=int, action='append', dest='order_ids', help='Only this order (repeatable)')
+        parser.add_argument('--tolerance', type=float, help='Tolerance in meters (default: TRAJECTORY_TOLERANCE)')
+        parser.add_argument('--dry-run', action='store_true', help='Report only; keep breadcrumbs and store nothing')
+
+    def handle(self, *args, **options):
+        if options['order_ids']:
+            orders = Order.objects.filter(id__in=options['order_ids'])
+        else:
+            # Delivered orders with breadcrumbs their trajectory (if any) was not built from:
+            # with TRAJECTORY_KEEP_BREADCRUMBS, compacted orders keep theirs
+            orders = Order.objects.filter(status='delivered').annotate(
+                breadcrumb_count=Count('breadcrumbs'), last_breadcrumb=Max('breadcrumbs__recorded_at'),
+            ).filter(breadcrumb_count__gt=0).filter(
+                Q(trajectory__isnull=True)
+                | Q(trajectory__ended_at__lt=F('last_breadcrumb'))
+                | Q(trajectory__raw_points__lt=F('breadcrumb_count'))
+                | Q(trajectory__raw_points__gt=F('breadcrumb_count'))
+            )
+
+        self.stdout.write(f'{"order":>8} {"raw":>7} {"kept":>6} {"ratio":>7} {"max error m":>12} {"chars":>7}')
+        raw_total = kept_total = compacted = 0
+        max_error = 0.0
+        for order in orders.order_by('id').iterator():
+            trajectory = compact_trajectory(order, tolerance=options['tolerance'], commit=not options['dry_run'])
+            if trajectory is None:
+                continue
+            compacted += 1
+            raw_total += trajectory.raw_points
+            kept_total += trajectory.points
+            max_error = max(max_error, trajectory.max_error)
+            self.stdout.write(f'{order.id:>8} {trajectory.raw_points:>7} {trajectory.points:>6} '
+                              f'{trajectory.compression_ratio:>6.1f}x {trajectory.max_error:>12.2f} '
+                              f'{len(trajectory.polyline) + len(trajectory.timestamps):>7}')
+
+        if not compacted:
+            self.stdout.write('No breadcrumbs to compact')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {"Would compact" if options["dry_run"] else "Compacted"} {compacted} trajectories: '
+            f'{raw_total} -> {kept_total} points ({raw_total / kept_total:.1f}x), max error {max_error:.2f} m'
+        ))
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from delivery.location_store import flush_locations, flush_agent_positions
+
+
+class Command(BaseCommand):
+    help = 'Periodically write live agent locations from the location store to their orders and agent profiles (runs until stopped unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Flush once and exit')
+        parser.add_argument('--interval', type=float, default=15.0, help='Seconds between flushes')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                updated = flush_locations()
+                agents = flush_agent_positions()
+                if updated or agents:
+                    self.stdout.write(self.style.SUCCESS(f'✓ Flushed locations for {updated} order(s) and {agents} agent(s)'))
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
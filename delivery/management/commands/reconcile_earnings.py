@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from delivery.earnings import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the earnings ledger and agent counters from delivered orders and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agent', type=int, action='append', dest='agent_ids', help='Only this agent user id (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift only; change nothing')
+
+    def handle(self, *args, **options):
+        drift = rebuild_counters(options['agent_ids'], commit=not options['dry_run'])
+        for agent_id, stored, rebuilt in drift:
+            if stored is None:
+                self.stdout.write(f'agent {agent_id}: no counters, rebuilt {rebuilt["deliveries"]} deliveries / ₹{rebuilt["earnings"]}')
+                continue
+            changes = ', '.join(
+                f'{field} {stored[field]} -> {rebuilt[field]}' for field in rebuilt if stored[field] != rebuilt[field]
+            )
+            self.stdout.write(f'agent {agent_id}: {changes}')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('✓ Earnings counters match the orders'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {"Found" if options["dry_run"] else "Fixed"} drift for {len(drift)} agent(s)'
+        ))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from delivery.dispatch import run_dispatch
+
+
+class Command(BaseCommand):
+    help = 'Periodically assign waiting orders to the nearest idle agents (runs until stopped unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one dispatch round and exit')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between dispatch rounds')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                result = run_dispatch()
+                if result['assigned'] or options['once']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✓ Assigned {result["assigned"]} of {result["orders"]} waiting order(s) '
+                        f'({result["batches"]} batch(es)) to {result["agents"]} idle agent(s), mean pickup {result["mean_pickup_km"]:.2f} km '
+                        f'(load {result["load_ms"]:.0f} ms, batch {result["batch_ms"]:.0f} ms, solve {result["solve_ms"]:.0f} ms, commit {result["commit_ms"]:.0f} ms)'
+                    ))
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
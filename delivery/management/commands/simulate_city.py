@@ -0,0 +1,68 @@
+import uuid
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.conf import settings
+from delivery.simulation import City, Simulator
+
+
+class Command(BaseCommand):
+    help = ('Replay a simulated day of orders in a synthetic city through the real order and delivery code, '
+            'and report latency, waits, utilization and queries per event (all data is rolled back)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=60)
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--agents', type=int, default=30)
+        parser.add_argument('--orders', type=int, default=400, help='Orders over the day')
+        parser.add_argument('--hours', type=float, default=12.0, help='Service hours from 10:00')
+        parser.add_argument('--radius-km', type=float, default=8.0, help='City radius')
+        parser.add_argument('--speed', type=float, default=20.0, help='Agent speed in km/h')
+        parser.add_argument('--prep-minutes', type=float, default=15.0, help='Mean food preparation time')
+        parser.add_argument('--ping-interval', type=float, default=45.0, help='Simulated seconds between agent pings')
+        parser.add_argument('--dispatch-interval', type=float, default=30.0, help='Simulated seconds between dispatch rounds')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data instead of rolling it back')
+
+    def handle(self, *args, **options):
+        if options['ping_interval'] >= getattr(settings, 'PRESENCE_TTL', 60):
+            raise CommandError('--ping-interval must be shorter than PRESENCE_TTL or agents drop offline between pings')
+
+        rng = np.random.default_rng(options['seed'])
+        with transaction.atomic():
+            city = City(rng, options['restaurants'], options['customers'], options['agents'], options['radius_km'],
+                        run_id=uuid.uuid4().hex[:8])
+            simulator = Simulator(city, options['orders'], hours=options['hours'], speed_kmh=options['speed'],
+                                  prep_minutes=options['prep_minutes'], ping_interval=options['ping_interval'],
+                                  dispatch_interval=options['dispatch_interval'])
+            report = simulator.run()
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'{report["orders"]} orders, {report["delivered"]} delivered by {report["agents"]} agents over '
+            f'{report["simulated_hours"]:.1f} simulated hours in {report["wall_seconds"]:.0f} s'
+        )
+
+        dispatch_ms = report['dispatch_ms']
+        if len(dispatch_ms):
+            self.stdout.write(f'Dispatch rounds: {len(dispatch_ms)}, p50 {np.percentile(dispatch_ms, 50):.1f} ms, '
+                              f'p95 {np.percentile(dispatch_ms, 95):.1f} ms, max {dispatch_ms.max():.1f} ms')
+
+        self.stdout.write(f'{"minutes from order to":>22} {"p50":>7} {"p90":>7} {"max":>7}')
+        for stage, waits in report['waits'].items():
+            if len(waits):
+                self.stdout.write(f'{stage:>22} {np.percentile(waits, 50):>7.1f} {np.percentile(waits, 90):>7.1f} '
+                                  f'{waits.max():>7.1f}')
+
+        utilization = report['utilization']
+        self.stdout.write(f'Agent utilization: mean {utilization.mean():.0%}, min {utilization.min():.0%}, '
+                          f'max {utilization.max():.0%}; {report["deliveries_per_agent_hour"]:.2f} deliveries per agent-hour')
+
+        self.stdout.write(f'{"event":>20} {"count":>8} {"queries/event":>14} {"ms/event":>9}')
+        for kind, (count, queries, seconds) in sorted(report['events'].items()):
+            self.stdout.write(f'{kind:>20} {count:>8} {queries / count:>14.1f} {seconds * 1000 / count:>9.2f}')
+
+        self.stdout.write(self.style.SUCCESS(
+            '✓ Simulation complete' + (' (data kept)' if options['keep'] else ' (no data was kept)')
+        ))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from accounts.models import DeliveryAgent
+from delivery.presence import sweep_presence
+
+
+class Command(BaseCommand):
+    help = 'Periodically remove expired agent presences from the presence store (runs until stopped unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Sweep once and exit')
+        parser.add_argument('--interval', type=float, default=30.0, help='Seconds between sweeps')
+        parser.add_argument('--mark-unavailable', action='store_true',
+                            help='Also switch agents whose presence expired to unavailable')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                expired = sweep_presence()
+                marked = 0
+                if expired and options['mark_unavailable']:
+                    marked = DeliveryAgent.objects.filter(user_id__in=expired, availability_status=True).update(
+                        availability_status=False)
+                if expired or options['once']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✓ Expired {len(expired)} agent presence(s)'
+                        + (f', {marked} marked unavailable' if options['mark_unavailable'] else '')
+                    ))
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
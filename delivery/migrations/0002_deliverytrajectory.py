@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0001_initial'),
+        ('orders', '0006_checkoutsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryTrajectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('polyline', models.TextField(help_text='Encoded polyline (precision 5) of the simplified track')),
+                ('timestamps', models.TextField(help_text='Polyline-encoded seconds since started_at of each point')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('raw_points', models.PositiveIntegerField(help_text='Breadcrumbs before simplification')),
+                ('points', models.PositiveIntegerField(help_text='Points kept')),
+                ('tolerance', models.FloatField(help_text='Simplification tolerance in meters')),
+                ('max_error', models.FloatField(help_text='Largest distance in meters from a breadcrumb to the stored track')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='trajectory', to='orders.order')),
+            ],
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:08
+
+from datetime import timedelta
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_earnings(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    EarningEntry = apps.get_model('delivery', 'EarningEntry')
+    AgentEarnings = apps.get_model('delivery', 'AgentEarnings')
+    today = timezone.localdate()
+    week = today - timedelta(days=today.weekday())
+    counters = {}
+    entries = []
+    delivered = Order.objects.filter(status='delivered', delivery_agent__isnull=False).values_list(
+        'id', 'delivery_agent_id', 'delivery_fee', 'delivered_at', 'updated_at')
+    for order_id, agent_id, amount, delivered_at, updated_at in delivered.iterator():
+        earned_at = delivered_at or updated_at
+        entries.append(EarningEntry(order_id=order_id, agent_id=agent_id, amount=amount, earned_at=earned_at))
+        counter = counters.setdefault(agent_id, AgentEarnings(agent_id=agent_id, day=today, week=week))
+        counter.deliveries += 1
+        counter.earnings += amount
+        day = timezone.localdate(earned_at)
+        if day == today:
+            counter.day_deliveries += 1
+            counter.day_earnings += amount
+        if day - timedelta(days=day.weekday()) == week:
+            counter.week_deliveries += 1
+            counter.week_earnings += amount
+    EarningEntry.objects.bulk_create(entries, batch_size=1000)
+    AgentEarnings.objects.bulk_create(counters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('delivery', '0002_deliverytrajectory'),
+        ('orders', '0007_order_delivery_geohash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentEarnings',
+            fields=[
+                ('agent', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='earnings', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('deliveries', models.PositiveIntegerField(default=0)),
+                ('earnings', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('day', models.DateField(blank=True, null=True)),
+                ('day_deliveries', models.PositiveIntegerField(default=0)),
+                ('day_earnings', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('week', models.DateField(blank=True, null=True)),
+                ('week_deliveries', models.PositiveIntegerField(default=0)),
+                ('week_earnings', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Agent earnings',
+            },
+        ),
+        migrations.CreateModel(
+            name='EarningEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('earned_at', models.DateTimeField()),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='earning_entries', to=settings.AUTH_USER_MODEL)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='earning', to='orders.order')),
+            ],
+            options={
+                'ordering': ['-earned_at'],
+                'indexes': [models.Index(fields=['agent', 'earned_at'], name='earning_agent_earned_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_earnings, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,122 @@
+from datetime import timedelta
+from decimal import Decimal
 from django.db import models
+from django.utils import timezone
+from django.contrib.auth.models import User
+from orders.models import Order
 
-# Create your models here.
+
+class LocationBreadcrumb(models.Model):
+    """
+    Append-only GPS history of a delivery, uploaded by the agent's device in
+    batches. A fix is identified by its order and device timestamp, so a
+    batch re-sent after a dropped connection does not store points twice.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='breadcrumbs')
+    agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='location_breadcrumbs')
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    accuracy = models.FloatField(null=True, blank=True, help_text='Reported accuracy in meters')
+    recorded_at = models.DateTimeField(help_text='When the device took the fix')
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['order', 'recorded_at']
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'recorded_at'], name='breadcrumb_order_recorded_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"Order #{self.order_id} @ {self.recorded_at:%H:%M:%S} ({self.latitude}, {self.longitude})"
+
+
+class DeliveryTrajectory(models.Model):
+    """
+    Simplified GPS track of a completed delivery, kept for dispute
+    resolution and ETA modeling after its breadcrumbs are compacted
+    (see delivery/trajectory.py).
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='trajectory')
+    polyline = models.TextField(help_text='Encoded polyline (precision 5) of the simplified track')
+    timestamps = models.TextField(help_text='Polyline-encoded seconds since started_at of each point')
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    raw_points = models.PositiveIntegerField(help_text='Breadcrumbs before simplification')
+    points = models.PositiveIntegerField(help_text='Points kept')
+    tolerance = models.FloatField(help_text='Simplification tolerance in meters')
+    max_error = models.FloatField(help_text='Largest distance in meters from a breadcrumb to the stored track')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Trajectory of Order #{self.order_id} ({self.points}/{self.raw_points} points)"
+    
+    @property
+    def compression_ratio(self):
+        return self.raw_points / self.points if self.points else 0
+    
+    def decode(self):
+        """[(latitude, longitude, recorded_at), ...] of the stored points"""
+        from .trajectory import decode_polyline
+        latlng = decode_polyline(self.polyline)
+        offsets = decode_polyline(self.timestamps, dimensions=1, factor=1)[:, 0]
+        return [
+            (latitude, longitude, self.started_at + timedelta(seconds=offset))
+            for (latitude, longitude), offset in zip(latlng.tolist(), offsets.tolist())
+        ]
+
+
+class EarningEntry(models.Model):
+    """
+    Append-only earnings ledger: one row per delivered order, written when
+    the agent marks it delivered (see delivery/earnings.py).
+    """
+    agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='earning_entries')
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='earning')
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    earned_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-earned_at']
+        indexes = [models.Index(fields=['agent', 'earned_at'], name='earning_agent_earned_idx')]
+    
+    def __str__(self):
+        return f"{self.agent.username}: ₹{self.amount} for Order #{self.order_id}"
+
+
+class AgentEarnings(models.Model):
+    """
+    Running totals of an agent's ledger, so dashboard stats are one row read.
+    The day and week counters belong to `day` and `week` (the Monday it
+    starts); once those are past the counters read as zero.
+    `manage.py reconcile_earnings` rebuilds them from orders.
+    """
+    agent = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='earnings')
+    deliveries = models.PositiveIntegerField(default=0)
+    earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    day = models.DateField(null=True, blank=True)
+    day_deliveries = models.PositiveIntegerField(default=0)
+    day_earnings = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    week = models.DateField(null=True, blank=True)
+    week_deliveries = models.PositiveIntegerField(default=0)
+    week_earnings = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'Agent earnings'
+    
+    def __str__(self):
+        return f"{self.agent.username}: {self.deliveries} deliveries, ₹{self.earnings}"
+    
+    def snapshot(self, today=None):
+        """Counters as of `today` (default: the local date)"""
+        from .earnings import week_start
+        today = today or timezone.localdate()
+        current_day, current_week = self.day == today, self.week == week_start(today)
+        return {
+            'deliveries': self.deliveries,
+            'earnings': self.earnings,
+            'today_deliveries': self.day_deliveries if current_day else 0,
+            'today_earnings': self.day_earnings if current_day else Decimal('0.00'),
+            'week_deliveries': self.week_deliveries if current_week else 0,
+            'week_earnings': self.week_earnings if current_week else Decimal('0.00'),
+        }
@@ -0,0 +1,182 @@
+"""
+Delivery agent presence.
+
+availability_status says an agent is on shift; presence says their app is
+actually running. Every location ping is a heartbeat that keeps the agent
+online for PRESENCE_TTL seconds. An agent whose app was closed drops out on
+its own once the TTL passes, without anything writing to the database.
+
+Everything lives in the Django cache:
+
+- delivery:presence:<user_id> holds the agent's last position, heartbeat
+  time and cell. It expires with the TTL.
+- delivery:presence:cell:<geohash> holds {user_id: expires_at} for the
+  agents last seen in that cell, a geohash of PRESENCE_CELL_PRECISION
+  characters (~4.9 km at 5). "Online near X" reads the few cells around X.
+- delivery:presence:cells holds {geohash: expires_at} for the cells in use,
+  so listing everyone online or sweeping never scans the agent table.
+
+Cell and registry writes are read-modify-write. Two agents pinging in the
+same cell at the same moment can drop one of them from the cell; their next
+heartbeat adds them back. Expired entries are ignored on read and removed by
+sweep_presence() (`manage.py sweep_presence`), which reports who went
+offline.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from foodify_project.geo import encode_geohash, geohash_cells, haversine_km
+
+
+REGISTRY_KEY = 'delivery:presence:cells'
+# Cells and the registry outlive their members so the sweep still sees who expired
+INDEX_TTL_FACTOR = 5
+
+
+class Presence:
+    """An online agent's last heartbeat"""
+
+    def __init__(self, user_id, latitude, longitude, seen_at):
+        self.user_id = user_id
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.seen_at = seen_at
+
+
+def _key(user_id):
+    return f'delivery:presence:{user_id}'
+
+
+def _cell_key(cell):
+    return f'delivery:presence:cell:{cell}'
+
+
+def _ttl():
+    return getattr(settings, 'PRESENCE_TTL', 60)
+
+
+def _cell(latitude, longitude):
+    return encode_geohash(latitude, longitude, getattr(settings, 'PRESENCE_CELL_PRECISION', 5))
+
+
+def _now():
+    return timezone.now().timestamp()
+
+
+def _live(entries, now):
+    return {key: expires_at for key, expires_at in entries.items() if expires_at > now}
+
+
+def heartbeat(user_id, latitude, longitude, now=None):
+    """Mark an agent online at this position for PRESENCE_TTL seconds"""
+    now = now or _now()
+    expires_at = now + _ttl()
+    cell = _cell(latitude, longitude)
+    cell_key = _cell_key(cell)
+
+    current = cache.get_many([_key(user_id), cell_key, REGISTRY_KEY])
+    cache.set(_key(user_id), (float(latitude), float(longitude), now, cell), _ttl())
+
+    # Expired members are left for sweep_presence() to collect and report
+    members = current.get(cell_key, {})
+    members[user_id] = expires_at
+    updates = {cell_key: members}
+
+    previous = current.get(_key(user_id))
+    if previous and previous[3] != cell:
+        # Moved to another cell: leave the old one
+        old_key = _cell_key(previous[3])
+        old_members = cache.get(old_key, {})
+        old_members.pop(user_id, None)
+        updates[old_key] = old_members
+
+    cache.set_many(updates, INDEX_TTL_FACTOR * _ttl())
+
+    # The registry is only rewritten when a cell appears or its expiry moves by
+    # half a TTL; sweep_presence() removes cells that emptied
+    registry = current.get(REGISTRY_KEY, {})
+    if registry.get(cell, 0) < expires_at - _ttl() / 2:
+        registry[cell] = expires_at
+        cache.set(REGISTRY_KEY, registry, INDEX_TTL_FACTOR * _ttl())
+
+
+def leave(user_id):
+    """Mark an agent offline now (e.g. when they go unavailable)"""
+    previous = cache.get(_key(user_id))
+    cache.delete(_key(user_id))
+    if previous:
+        members = cache.get(_cell_key(previous[3]), {})
+        if members.pop(user_id, None) is not None:
+            cache.set(_cell_key(previous[3]), members, INDEX_TTL_FACTOR * _ttl())
+
+
+def _presences(user_ids, now):
+    values = cache.get_many([_key(user_id) for user_id in user_ids])
+    presences = {}
+    for user_id in user_ids:
+        value = values.get(_key(user_id))
+        if value and value[2] + _ttl() > now:
+            presences[user_id] = Presence(user_id, value[0], value[1], value[2])
+    return presences
+
+
+def _members(cells, now):
+    buckets = cache.get_many([_cell_key(cell) for cell in cells])
+    return {user_id for members in buckets.values() for user_id in _live(members, now)}
+
+
+def online_near(latitude, longitude, radius_km, now=None):
+    """[(Presence, distance_km)] of the agents online within radius_km, nearest first"""
+    now = now or _now()
+    cells = geohash_cells(latitude, longitude, radius_km, getattr(settings, 'PRESENCE_CELL_PRECISION', 5))
+    presences = list(_presences(_members(cells, now), now).values())
+    if not presences:
+        return []
+    distances = haversine_km(float(latitude), float(longitude),
+                             [presence.latitude for presence in presences],
+                             [presence.longitude for presence in presences]).tolist()
+    return sorted(
+        ((presence, distance) for presence, distance in zip(presences, distances) if distance <= radius_km),
+        key=lambda pair: pair[1],
+    )
+
+
+def online_agents(now=None):
+    """{user_id: Presence} of every agent online now"""
+    now = now or _now()
+    # Registry expiries may lag their cells' by half a TTL, so every listed cell is read
+    return _presences(_members(cache.get(REGISTRY_KEY, {}), now), now)
+
+
+def is_online(user_id, now=None):
+    return user_id in _presences([user_id], now or _now())
+
+
+def sweep_presence(now=None):
+    """
+    Drop expired agents from every cell and empty cells from the registry,
+    in one bulk read and write. Returns the user ids that expired.
+    """
+    now = now or _now()
+    registry = cache.get(REGISTRY_KEY, {})
+    if not registry:
+        return []
+    buckets = cache.get_many([_cell_key(cell) for cell in registry])
+
+    stale, kept, emptied = set(), {}, []
+    for cell in registry:
+        members = buckets.get(_cell_key(cell), {})
+        live = _live(members, now)
+        stale.update(user_id for user_id in members if user_id not in live)
+        if live:
+            kept[_cell_key(cell)] = live
+        else:
+            emptied.append(_cell_key(cell))
+
+    cache.set_many(kept, INDEX_TTL_FACTOR * _ttl())
+    cache.delete_many(emptied)
+    cache.set(REGISTRY_KEY, {cell: max(kept[_cell_key(cell)].values()) for cell in registry
+                             if _cell_key(cell) in kept}, INDEX_TTL_FACTOR * _ttl())
+    # A stale entry can be left behind in a cell the agent moved out of
+    online = _presences(stale, now)
+    return sorted(user_id for user_id in stale if user_id not in online)
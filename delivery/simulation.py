@@ -0,0 +1,373 @@
+"""
+Synthetic city simulator for the order and delivery code paths.
+
+A City is a set of restaurants (clustered around a few hubs, like food
+streets), customers and delivery agents with coordinates, written as the
+same Restaurant, Order and DeliveryAgent rows production has. Simulator
+replays a day of order arrivals through the real code against it:
+
+- orders are placed with place_order_from_cart() and moved to preparing
+  by the owner through the order status view
+- agents ping /delivery/location/update/, get their stops from
+  /delivery/route/plan/, and call the pickup and deliver views
+- run_dispatch(), the location flushers and the presence sweep run on
+  their usual intervals
+
+Views are called through Django's test client, so URL routing,
+middleware and sessions are included. A simulated clock replaces
+django.utils.timezone.now for the whole run, so a day takes minutes.
+Agents drive in straight lines at a fixed speed.
+
+Every real call is timed and its queries counted per event kind. Only
+the simulator's own bookkeeping queries are left out.
+"""
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from accounts.models import DeliveryAgent, UserProfile
+from foodify_project.geo import encode_geohashes, haversine_km
+from orders.checkout import place_order_from_cart
+from orders.models import Cart, Order
+from restaurants.models import MenuItem, Restaurant
+from .dispatch import run_dispatch
+from .location_store import flush_agent_positions, flush_locations, forget_location
+from .presence import leave, sweep_presence
+
+
+ORDER_RADIUS_KM = 5.0
+
+
+class SimClock:
+    """Stands in for timezone.now() during a simulation"""
+
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def advance_to(self, when):
+        self.current = max(self.current, when)
+
+
+@contextmanager
+def simulated_time(clock):
+    with mock.patch('django.utils.timezone.now', clock.now):
+        yield
+
+
+def arrival_times(rng, count, hours):
+    """
+    Seconds from the start of service (10:00) of `count` order arrivals: a
+    lunch peak at 13:00, a bigger dinner peak at 20:00 and a steady trickle.
+    """
+    kind = rng.choice(3, size=count, p=[0.35, 0.45, 0.20])
+    seconds = np.where(
+        kind == 0, rng.normal(3 * 3600, 3600, count),
+        np.where(kind == 1, rng.normal(10 * 3600, 4300, count), rng.uniform(0, hours * 3600, count)),
+    )
+    return np.sort(np.clip(seconds, 0, hours * 3600 - 1))
+
+
+class City:
+    """Synthetic restaurants, customers and agents around a center point"""
+
+    def __init__(self, rng, restaurants, customers, agents, radius_km, hubs=6, center=(17.385, 78.4867), run_id=''):
+        self.rng = rng
+        self.center = np.array(center)
+        self.radius = radius_km / 111.195
+        self.owner = User.objects.create_user(username=f'sim-owner-{run_id}')
+        UserProfile.objects.filter(user=self.owner).update(user_type='restaurant_owner')
+
+        hub_points = self._points(hubs, 0.6)
+        spots = hub_points[rng.integers(0, hubs, size=restaurants)] + rng.normal(0, 0.8 / 111.195, size=(restaurants, 2))
+        self.spots = spots = spots.round(6)
+        hashes = encode_geohashes(spots[:, 0], spots[:, 1])
+        self.restaurants = Restaurant.objects.bulk_create([
+            Restaurant(owner=self.owner, name=f'Sim {run_id} {i}', cuisine='Simulated', location='Simulated',
+                       description='', latitude=lat, longitude=lng, geohash=geohash)
+            for i, ((lat, lng), geohash) in enumerate(zip(spots.tolist(), hashes))
+        ])
+        self.menu_items = MenuItem.objects.bulk_create([
+            MenuItem(restaurant=restaurant, name='Meal', price=round(float(rng.uniform(120, 450)), 2), description='')
+            for restaurant in self.restaurants
+        ])
+
+        self.customers = User.objects.bulk_create([User(username=f'sim-customer-{run_id}-{i}') for i in range(customers)])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in self.customers])
+        self.homes = self._points(customers).round(6)
+
+        self.agents = User.objects.bulk_create([User(username=f'sim-agent-{run_id}-{i}') for i in range(agents)])
+        UserProfile.objects.bulk_create([UserProfile(user=user, user_type='delivery_agent') for user in self.agents])
+        DeliveryAgent.objects.bulk_create([
+            DeliveryAgent(user=user, full_name=user.username, phone='0', address='Simulated', vehicle_type='bike',
+                          vehicle_number='0', driving_license='0')
+            for user in self.agents
+        ])
+        self.starts = self._points(agents).round(6)
+
+    def _points(self, count, spread=1.0):
+        angle = self.rng.uniform(0, 2 * np.pi, count)
+        distance = np.sqrt(self.rng.uniform(0, 1, count)) * self.radius * spread
+        return self.center + np.column_stack((np.sin(angle) * distance,
+                                              np.cos(angle) * distance / np.cos(np.radians(self.center[0]))))
+
+
+class SimOrder:
+    def __init__(self, order_id, arrived_at, ready_at):
+        self.order_id = order_id
+        self.arrived_at = arrived_at
+        self.ready_at = ready_at
+        self.assigned_at = self.picked_at = self.delivered_at = None
+
+
+class SimAgent:
+    def __init__(self, user, start):
+        self.user = user
+        self.client = Client()
+        self.client.force_login(user)
+        self.position = tuple(start)
+        self.leg = None  # (from, to, departed_at, arrives_at)
+        self.stops = []
+        self.carrying = []
+        self.busy_since = None
+        self.busy_seconds = 0.0
+        self.deliveries = 0
+
+    def position_at(self, now):
+        if not self.leg:
+            return self.position
+        origin, target, departed_at, arrives_at = self.leg
+        span = (arrives_at - departed_at).total_seconds()
+        share = min(max((now - departed_at).total_seconds() / span, 0.0), 1.0) if span else 1.0
+        return tuple(a + (b - a) * share for a, b in zip(origin, target))
+
+
+class Simulator:
+    """
+    Runs one simulated service day over a City. Intervals are simulated
+    seconds. run() returns the report as a dict.
+    """
+
+    def __init__(self, city, orders, hours=12, speed_kmh=20.0, prep_minutes=15, ping_interval=45,
+                 dispatch_interval=30, flush_interval=60):
+        self.city = city
+        self.rng = city.rng
+        self.hours = hours
+        self.speed_kmh = speed_kmh
+        self.prep_minutes = prep_minutes
+        self.intervals = {'ping': ping_interval, 'dispatch': dispatch_interval, 'flush': flush_interval}
+        self.start = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        self.end = self.start + timedelta(hours=hours)
+        self.clock = SimClock(self.start)
+        self.arrivals = arrival_times(self.rng, orders, hours)
+        self.owner_client = Client()
+
+        self.events = []
+        self.sequence = itertools.count()
+        self.orders = {}
+        self.undelivered = 0
+        self.agents = {}
+        self.stats = defaultdict(lambda: [0, 0, 0.0])  # kind -> [events, queries, seconds]
+        self.dispatch_rounds = []
+
+    # Event queue
+
+    def schedule(self, when, kind, *args):
+        heapq.heappush(self.events, (when, next(self.sequence), kind, args))
+
+    @contextmanager
+    def measure(self, kind):
+        # The query log is capped; a full one would count nothing
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - started
+        stats = self.stats[kind]
+        stats[0] += 1
+        stats[1] += len(queries)
+        stats[2] += elapsed
+
+    def run(self):
+        with simulated_time(self.clock), override_settings(ALLOWED_HOSTS=['testserver']):
+            self.owner_client.force_login(self.city.owner)
+            for user, start in zip(self.city.agents, self.city.starts.tolist()):
+                agent = SimAgent(user, start)
+                self.agents[user.id] = agent
+                self.schedule(self.start + timedelta(seconds=float(self.rng.uniform(0, self.intervals['ping']))), 'ping', agent)
+            for i, offset in enumerate(self.arrivals.tolist()):
+                self.schedule(self.start + timedelta(seconds=offset), 'order', i)
+            self.schedule(self.start, 'dispatch')
+            self.schedule(self.start, 'flush')
+
+            wall_started = time.perf_counter()
+            # After closing the run continues until every order is delivered, for at most 3 hours
+            while self.events:
+                when, _, kind, args = heapq.heappop(self.events)
+                if when > self.end + timedelta(hours=3):
+                    break
+                self.clock.advance_to(when)
+                getattr(self, f'on_{kind}')(*args)
+            wall_seconds = time.perf_counter() - wall_started
+
+            for agent in self.agents.values():
+                leave(agent.user.id)
+            for order_id in self.orders:
+                forget_location(order_id)
+        return self.report(wall_seconds)
+
+    def _running(self):
+        return self.clock.now() <= self.end or self.undelivered > 0
+
+    # Handlers
+
+    def on_order(self, index):
+        customer_index = int(self.rng.integers(0, len(self.city.customers)))
+        customer = self.city.customers[customer_index]
+        # Customers order from a restaurant within ORDER_RADIUS_KM of home if there is one
+        distances = haversine_km(*self.city.homes[customer_index], self.city.spots[:, 0], self.city.spots[:, 1])
+        nearby = np.flatnonzero(distances <= ORDER_RADIUS_KM)
+        choices = nearby if len(nearby) else np.argsort(distances)[:1]
+        item = self.city.menu_items[int(self.rng.choice(choices))]
+        Cart.objects.create(user=customer, menu_item=item, quantity=int(self.rng.integers(1, 4)))
+        with self.measure('place order'):
+            order, _ = place_order_from_cart(customer, 'Simulated', transaction_id=f'sim-{customer.id}-{index}',
+                                             payment_method='simulated')
+        # The customer's geocoded address
+        lat, lng = self.city.homes[customer_index].tolist()
+        Order.objects.filter(pk=order.pk).update(
+            delivery_latitude=lat, delivery_longitude=lng, delivery_geohash=encode_geohashes([lat], [lng])[0])
+
+        now = self.clock.now()
+        prep = max(5.0, float(self.rng.normal(self.prep_minutes, 4)))
+        self.orders[order.id] = SimOrder(order.id, now, now + timedelta(minutes=prep))
+        self.undelivered += 1
+        self.schedule(now + timedelta(minutes=2), 'prepare', order.id)
+
+    def on_prepare(self, order_id):
+        with self.measure('owner status update'):
+            self.owner_client.post(f'/orders/update-status/{order_id}/', {'status': 'preparing'})
+
+    def on_dispatch(self):
+        with self.measure('dispatch round'):
+            result = run_dispatch(self.clock.now())
+        self.dispatch_rounds.append(result)
+        if result['assigned']:
+            self._hand_out_orders()
+        if self._running():
+            self.schedule(self.clock.now() + timedelta(seconds=self.intervals['dispatch']), 'dispatch')
+
+    def _hand_out_orders(self):
+        now = self.clock.now()
+        unassigned = [order_id for order_id, order in self.orders.items() if order.assigned_at is None]
+        assigned = Order.objects.filter(id__in=unassigned, delivery_agent__isnull=False).values_list('id', 'delivery_agent_id')
+        agents = set()
+        for order_id, agent_id in assigned:
+            self.orders[order_id].assigned_at = now
+            agents.add(agent_id)
+        for agent_id in agents:
+            agent = self.agents[agent_id]
+            with self.measure('route plan'):
+                plan = agent.client.get('/delivery/route/plan/').json()
+            agent.stops = [(stop['order_id'], stop['kind'], (stop['latitude'], stop['longitude'])) for stop in plan['stops']]
+            agent.busy_since = agent.busy_since or now
+            self._next_stop(agent)
+
+    def _next_stop(self, agent):
+        now = self.clock.now()
+        if not agent.stops:
+            agent.leg = None
+            agent.busy_seconds += (now - agent.busy_since).total_seconds()
+            agent.busy_since = None
+            return
+        target = agent.stops[0][2]
+        km = float(haversine_km(*agent.position, *target))
+        arrives_at = now + timedelta(hours=km / self.speed_kmh)
+        agent.leg = (agent.position, target, now, arrives_at)
+        self.schedule(arrives_at, 'arrive', agent)
+
+    def on_arrive(self, agent):
+        now = self.clock.now()
+        order_id, kind, target = agent.stops[0]
+        agent.position, agent.leg = target, None
+        order = self.orders[order_id]
+        if kind == 'pickup':
+            if now < order.ready_at:
+                self.schedule(order.ready_at, 'arrive', agent)
+                return
+            with self.measure('pickup'):
+                agent.client.post(f'/delivery/pickup/{order_id}/')
+            order.picked_at = now
+            agent.carrying.append(order_id)
+        else:
+            with self.measure('deliver'):
+                agent.client.post(f'/delivery/deliver/{order_id}/')
+            order.delivered_at = now
+            self.undelivered -= 1
+            agent.carrying.remove(order_id)
+            agent.deliveries += 1
+        agent.stops.pop(0)
+        self._next_stop(agent)
+
+    def on_ping(self, agent):
+        latitude, longitude = agent.position_at(self.clock.now())
+        payload = {'latitude': round(latitude, 6), 'longitude': round(longitude, 6)}
+        if agent.carrying:
+            payload['order_id'] = agent.carrying[0]
+        with self.measure('location ping'):
+            agent.client.post('/delivery/location/update/', payload, content_type='application/json')
+        if self._running():
+            self.schedule(self.clock.now() + timedelta(seconds=self.intervals['ping']), 'ping', agent)
+
+    def on_flush(self):
+        with self.measure('location flush'):
+            flush_locations()
+            flush_agent_positions()
+        with self.measure('presence sweep'):
+            sweep_presence()
+        if self._running():
+            self.schedule(self.clock.now() + timedelta(seconds=self.intervals['flush']), 'flush')
+
+    # Report
+
+    def report(self, wall_seconds):
+        def minutes(attribute):
+            return np.array([
+                (getattr(order, attribute) - order.arrived_at).total_seconds() / 60
+                for order in self.orders.values() if getattr(order, attribute)
+            ])
+
+        simulated_seconds = (self.clock.now() - self.start).total_seconds()
+        rounds_ms = np.array([sum(result[key] for key in ('load_ms', 'batch_ms', 'solve_ms', 'commit_ms'))
+                              for result in self.dispatch_rounds])
+        busy = np.array([agent.busy_seconds for agent in self.agents.values()])
+        return {
+            'orders': len(self.orders),
+            'delivered': sum(1 for order in self.orders.values() if order.delivered_at),
+            'agents': len(self.agents),
+            'simulated_hours': simulated_seconds / 3600,
+            'wall_seconds': wall_seconds,
+            'dispatch_ms': rounds_ms,
+            'waits': {
+                'assigned': minutes('assigned_at'),
+                'picked up': minutes('picked_at'),
+                'delivered': minutes('delivered_at'),
+            },
+            'utilization': busy / simulated_seconds if simulated_seconds else busy,
+            'deliveries_per_agent_hour': (
+                sum(agent.deliveries for agent in self.agents.values()) / (len(self.agents) * simulated_seconds / 3600)
+                if simulated_seconds else 0.0
+            ),
+            'events': {kind: tuple(values) for kind, values in self.stats.items()},
+        }
@@ -1,3 +1,260 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import DeliveryAgent
+from orders.models import Order
+from restaurants.models import Restaurant
+from .location_store import (
+    flush_agent_positions, flush_locations, get_agent_locations, get_location, record_agent_location, record_location,
+)
+from .models import AgentEarnings, DeliveryTrajectory, EarningEntry, LocationBreadcrumb
 
-# Create your tests here.
+
+class DeliveryTestCase(TestCase):
+    """A restaurant, a customer and a logged-in delivery agent"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='owner')
+        self.restaurant = Restaurant.objects.create(owner=owner, name='Paradise', cuisine='Hyderabadi',
+                                                    location='Hyderabad', description='Biryani')
+        self.customer = User.objects.create_user(username='customer')
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        self.agent.profile.user_type = 'delivery_agent'
+        self.agent.profile.save()
+        self.client.login(username='agent', password='secret')
+
+    def create_order(self, **fields):
+        return Order.objects.create(user=self.customer, restaurant=self.restaurant, total_amount=Decimal('200'),
+                                    delivery_fee=Decimal('40'), delivery_address='Banjara Hills', **fields)
+
+
+class AgentTransitionTests(DeliveryTestCase):
+    """Accepting, rejecting and picking up orders"""
+
+    def post(self, name, order):
+        return self.client.post(reverse(f'delivery:{name}', args=[order.id]))
+
+    def test_first_agent_to_accept_wins(self):
+        order = self.create_order(status='confirmed')
+        self.assertEqual(self.post('accept_order', order).status_code, 200)
+        rival = User.objects.create_user(username='rival', password='secret')
+        rival.profile.user_type = 'delivery_agent'
+        rival.profile.save()
+        self.client.login(username='rival', password='secret')
+        response = self.post('accept_order', order)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Order already assigned')
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_agent, self.agent)
+
+    def test_reject_before_pickup_unassigns(self):
+        order = self.create_order(status='preparing', delivery_agent=self.agent)
+        self.assertEqual(self.post('reject_order', order).status_code, 200)
+        order.refresh_from_db()
+        self.assertIsNone(order.delivery_agent)
+        self.assertEqual(order.status, 'preparing')
+
+    def test_reject_after_pickup_is_refused(self):
+        for fields in [{'status': 'out_for_delivery'}, {'status': 'preparing', 'picked_at': timezone.now()}]:
+            with self.subTest(**fields):
+                order = self.create_order(delivery_agent=self.agent, **fields)
+                self.assertEqual(self.post('reject_order', order).status_code, 400)
+                order.refresh_from_db()
+                self.assertEqual(order.delivery_agent, self.agent)
+
+    def test_pick_up(self):
+        order = self.create_order(status='confirmed', delivery_agent=self.agent)
+        self.assertEqual(self.post('mark_as_picked', order).status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'out_for_delivery')
+        self.assertIsNotNone(order.picked_at)
+        # A second tap finds it already out for delivery
+        self.assertEqual(self.post('mark_as_picked', order).status_code, 400)
+
+    def test_pick_up_needs_an_order_ready_for_pickup(self):
+        for status in ['pending', 'delivered', 'cancelled']:
+            with self.subTest(status=status):
+                order = self.create_order(status=status, delivery_agent=self.agent)
+                self.assertEqual(self.post('mark_as_picked', order).status_code, 400)
+                order.refresh_from_db()
+                self.assertEqual(order.status, status)
+
+    def test_only_the_assigned_agent_can_pick_up(self):
+        order = self.create_order(status='confirmed', delivery_agent=User.objects.create_user(username='rival'))
+        self.assertEqual(self.post('mark_as_picked', order).status_code, 404)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'confirmed')
+
+
+class LiveLocationTests(DeliveryTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def ping(self, **data):
+        return self.client.post(reverse('delivery:update_location'), json.dumps(data), content_type='application/json')
+
+    def test_ping_updates_the_order_on_flush(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        self.assertEqual(self.ping(latitude='17.41', longitude=0, order_id=order.id).status_code, 200)
+        self.assertEqual(flush_locations(), 1)
+        order.refresh_from_db()
+        self.assertEqual((order.agent_current_latitude, order.agent_current_longitude), (Decimal('17.41'), 0))
+
+    def test_invalid_coordinates_are_rejected(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        for latitude, longitude in [('Infinity', 78.4), ('NaN', 78.4), (1000, 78.4), (17.4, -181), (17.4, 'east')]:
+            with self.subTest(latitude=latitude, longitude=longitude):
+                response = self.ping(latitude=latitude, longitude=longitude, order_id=order.id)
+                self.assertEqual(response.status_code, 400)
+        self.assertIsNone(get_location(order.id))
+        self.assertEqual(self.ping(latitude=17.4, order_id=order.id).status_code, 400)
+
+    def test_flush_drops_an_invalid_cached_fix(self):
+        # Cached before ingest was validated: must not block the other orders
+        valid = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        poisoned = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        record_location(valid.id, '17.41', '78.44')
+        record_location(poisoned.id, 'Infinity', '78.44')
+        with self.assertLogs('delivery.location_store', 'WARNING'):
+            self.assertEqual(flush_locations(), 1)
+        valid.refresh_from_db()
+        self.assertEqual(valid.agent_current_latitude, Decimal('17.41'))
+        self.assertIsNone(get_location(poisoned.id))
+        self.assertEqual(flush_locations(), 0)
+
+    def test_agent_positions_are_flushed_without_invalid_ones(self):
+        rival = User.objects.create_user(username='rival')
+        for user in (self.agent, rival):
+            DeliveryAgent.objects.create(user=user, full_name=user.username, phone='9999999999', address='Hyderabad',
+                                         vehicle_type='bike', vehicle_number='TS09', driving_license='DL1')
+        self.assertEqual(self.ping(latitude='NaN', longitude=78.4).status_code, 400)
+        self.assertIsNone(get_agent_locations([self.agent.id]).get(self.agent.id))
+
+        record_agent_location(self.agent.id, 17.41, 78.44)
+        record_agent_location(rival.id, 'NaN', 78.44)
+        with self.assertLogs('delivery.location_store', 'WARNING'):
+            self.assertEqual(flush_agent_positions(), 1)
+        agent = DeliveryAgent.objects.get(user=self.agent)
+        self.assertEqual(agent.last_latitude, Decimal('17.41'))
+        self.assertTrue(agent.last_geohash)
+        self.assertIsNone(DeliveryAgent.objects.get(user=rival).last_latitude)
+        self.assertEqual(get_agent_locations([rival.id]), {})
+
+
+class BreadcrumbBatchTests(DeliveryTestCase):
+    def fix(self, latitude, longitude, seconds_ago):
+        timestamp = (timezone.now() - timedelta(seconds=seconds_ago)).isoformat()
+        return {'latitude': latitude, 'longitude': longitude, 'timestamp': timestamp}
+
+    def upload(self, order, fixes):
+        return self.client.post(reverse('delivery:update_location_batch'),
+                                json.dumps({'order_id': order.id, 'fixes': fixes}), content_type='application/json')
+
+    def test_batch_is_stored(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        response = self.upload(order, [self.fix(17.41, 78.44, 10), self.fix(17.42, 78.45, 5)])
+        self.assertEqual(response.json()['accepted'], 2)
+        self.assertEqual(LocationBreadcrumb.objects.filter(order=order).count(), 2)
+
+    def test_invalid_coordinates_reject_the_batch(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        for latitude in ['NaN', 'nan', 'Infinity', '-inf', '1e400', 91, None]:
+            with self.subTest(latitude=latitude):
+                response = self.upload(order, [self.fix(17.41, 78.44, 10), self.fix(latitude, 78.45, 5)])
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(LocationBreadcrumb.objects.exists())
+
+    def test_late_upload_extends_the_trajectory(self):
+        cache.clear()
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        self.upload(order, [self.fix(17.40, 78.44, 300), self.fix(17.41, 78.44, 240), self.fix(17.42, 78.45, 180)])
+        self.client.post(reverse('delivery:mark_as_delivered', args=[order.id]))
+        self.assertFalse(LocationBreadcrumb.objects.exists())
+
+        # The device was offline for the end of the trip and uploads it after the drop
+        response = self.upload(order, [self.fix(17.43, 78.46, 120), self.fix(17.44, 78.47, 60)])
+        self.assertEqual(response.status_code, 200)
+        trajectory = DeliveryTrajectory.objects.get(order=order)
+        self.assertEqual(trajectory.raw_points, 5)
+        points = trajectory.decode()
+        self.assertEqual((points[0][0], points[-1][0]), (17.40, 17.44))
+        self.assertFalse(LocationBreadcrumb.objects.exists())
+        self.assertIsNone(get_location(order.id))
+
+    def test_late_upload_window_is_bounded(self):
+        rival = User.objects.create_user(username='rival')
+        orders = [
+            self.create_order(status='delivered', delivery_agent=self.agent,
+                              delivered_at=timezone.now() - timedelta(hours=2)),
+            self.create_order(status='delivered', delivery_agent=rival, delivered_at=timezone.now()),
+            self.create_order(status='cancelled', delivery_agent=self.agent),
+        ]
+        for order in orders:
+            with self.subTest(status=order.status):
+                self.assertEqual(self.upload(order, [self.fix(17.41, 78.44, 10)]).status_code, 404)
+        self.assertFalse(LocationBreadcrumb.objects.exists())
+
+
+class MarkAsDeliveredTests(DeliveryTestCase):
+    def deliver(self, order):
+        return self.client.post(reverse('delivery:mark_as_delivered', args=[order.id]))
+
+    def test_delivery_is_recorded_in_the_earnings_ledger(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        self.assertEqual(self.deliver(order).status_code, 200)
+        self.assertEqual(EarningEntry.objects.get(order=order).amount, Decimal('40'))
+        self.assertEqual(AgentEarnings.objects.get(agent=self.agent).deliveries, 1)
+
+    def test_ledger_failure_rolls_back_the_delivery(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        with mock.patch('delivery.views.record_delivery', side_effect=RuntimeError('ledger down')), \
+                self.assertRaises(RuntimeError):
+            self.deliver(order)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'out_for_delivery')
+        self.assertIsNone(order.delivered_at)
+
+    def test_trajectory_failure_does_not_fail_the_delivery(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        with mock.patch('delivery.views.compact_trajectory', side_effect=RuntimeError('boom')), \
+                self.assertLogs('delivery.views', 'ERROR') as logs:
+            response = self.deliver(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'order {order.id}', logs.output[0])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'delivered')
+
+
+@override_settings(TRAJECTORY_KEEP_BREADCRUMBS=True)
+class CompactTrajectoriesCommandTests(DeliveryTestCase):
+    def add_breadcrumbs(self, order, *minutes_ago):
+        for minutes in minutes_ago:
+            LocationBreadcrumb.objects.create(order=order, agent=self.agent, latitude=Decimal('17.4') + Decimal(minutes) / 100,
+                                              longitude=Decimal('78.44'),
+                                              recorded_at=timezone.now() - timedelta(minutes=minutes))
+
+    def compact(self):
+        out = StringIO()
+        call_command('compact_trajectories', stdout=out)
+        return out.getvalue()
+
+    def test_up_to_date_trajectories_are_skipped(self):
+        order = self.create_order(status='delivered', delivery_agent=self.agent)
+        self.add_breadcrumbs(order, 30, 20, 10)
+        self.assertIn('Compacted 1 trajectories', self.compact())
+        self.assertEqual(self.compact().strip().splitlines()[-1], 'No breadcrumbs to compact')
+
+        # A breadcrumb the trajectory does not include yet brings it back
+        self.add_breadcrumbs(order, 5)
+        self.assertIn('Compacted 1 trajectories', self.compact())
+        self.assertEqual(DeliveryTrajectory.objects.get(order=order).raw_points, 4)
+        self.assertEqual(self.compact().strip().splitlines()[-1], 'No breadcrumbs to compact')
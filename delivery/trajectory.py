@@ -0,0 +1,168 @@
+"""
+Compact trajectories of completed deliveries.
+
+When an order is delivered its breadcrumb trail is simplified with
+Douglas-Peucker and stored on a DeliveryTrajectory as an encoded polyline
+(precision 5, the format map libraries read), with the fix times encoded
+alongside. The raw breadcrumbs are then dropped unless
+TRAJECTORY_KEEP_BREADCRUMBS is set; fixes the device uploads after that are
+merged into the stored track.
+
+Distances are computed on an equirectangular projection around the track's
+mean latitude. That is accurate to well under a meter over the few
+kilometers of a delivery.
+"""
+import math
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .models import DeliveryTrajectory, LocationBreadcrumb
+
+
+EARTH_RADIUS_M = 6371008.8
+POLYLINE_PRECISION = 1e5
+
+
+def encode_polyline(rows, factor=POLYLINE_PRECISION):
+    """
+    Encode a sequence of coordinate tuples (or plain numbers) with the
+    Google polyline algorithm: scaled, delta-coded, zig-zagged 5-bit chunks.
+    """
+    values = np.round(np.asarray(rows, dtype=float) * factor).astype(np.int64)
+    if values.ndim == 1:
+        values = values[:, None]
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, values.shape[1]), dtype=np.int64))
+    chunks = []
+    for value in deltas.ravel().tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def decode_polyline(encoded, dimensions=2, factor=POLYLINE_PRECISION):
+    """Inverse of encode_polyline; returns an (n, dimensions) float array"""
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    return np.cumsum(np.array(values, dtype=np.int64).reshape(-1, dimensions), axis=0) / factor
+
+
+def project(latlng, origin_latitude=None):
+    """Project (lat, lng) degrees to (x, y) meters around the mean (or given) latitude"""
+    latlng = np.radians(np.asarray(latlng, dtype=float))
+    origin = latlng[:, 0].mean() if origin_latitude is None else math.radians(origin_latitude)
+    return np.column_stack((latlng[:, 1] * math.cos(origin), latlng[:, 0])) * EARTH_RADIUS_M
+
+
+def segment_distances(points, starts, ends):
+    """Distance from each point to the segment start->end (row-wise, or one segment for all points)"""
+    segment = ends - starts
+    length2 = np.einsum('...i,...i', segment, segment)
+    offset = points - starts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length2 > 0, np.einsum('...i,...i', offset, segment) / length2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(*(offset - t[..., None] * segment).T)
+
+
+def douglas_peucker(xy, tolerance):
+    """Indices of the points kept by Douglas-Peucker simplification of an (n, 2) array"""
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = segment_distances(xy[start + 1:end], xy[start], xy[end])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.extend(((start, split), (split, end)))
+    return np.flatnonzero(keep)
+
+
+def max_deviation(raw_xy, kept, simplified_xy):
+    """Largest distance in meters from a raw point to the simplified segment spanning it"""
+    if len(simplified_xy) < 2:
+        return float(np.hypot(*(raw_xy - simplified_xy[0]).T).max())
+    segment = np.clip(np.searchsorted(kept, np.arange(len(raw_xy)), side='right') - 1, 0, len(kept) - 2)
+    return float(segment_distances(raw_xy, simplified_xy[segment], simplified_xy[segment + 1]).max())
+
+
+def build_trajectory(order, fixes, tolerance):
+    """
+    Simplify (latitude, longitude, recorded_at) fixes sorted by time into an
+    unsaved DeliveryTrajectory. The reported error is measured against the
+    decoded polyline, so it includes the rounding to 5 decimals.
+    """
+    latlng = np.array([(float(latitude), float(longitude)) for latitude, longitude, _ in fixes])
+    origin = latlng[:, 0].mean()
+    raw_xy = project(latlng, origin)
+    kept = douglas_peucker(raw_xy, tolerance)
+
+    started_at = fixes[0][2]
+    polyline = encode_polyline(latlng[kept])
+    offsets = [(fixes[i][2] - started_at).total_seconds() for i in kept.tolist()]
+    stored_xy = project(decode_polyline(polyline), origin)
+
+    return DeliveryTrajectory(
+        order=order,
+        polyline=polyline,
+        timestamps=encode_polyline(offsets, factor=1),
+        started_at=started_at,
+        ended_at=fixes[-1][2],
+        raw_points=len(fixes),
+        points=len(kept),
+        tolerance=tolerance,
+        max_error=round(max_deviation(raw_xy, kept, stored_xy), 2),
+    )
+
+
+def _breadcrumbs_dropped(trajectory, fixes):
+    # Fewer breadcrumbs over its span than it was built from: the rest were
+    # dropped at compaction and these were uploaded late
+    within = sum(1 for _, _, recorded_at in fixes if trajectory.started_at <= recorded_at <= trajectory.ended_at)
+    return within < trajectory.raw_points
+
+
+def compact_trajectory(order, tolerance=None, commit=True):
+    """
+    Replace an order's breadcrumbs with a simplified trajectory. Returns the
+    DeliveryTrajectory (unsaved if commit is False), or None if the order
+    has no breadcrumbs. Breadcrumbs uploaded after the order was compacted
+    (and its breadcrumbs dropped) extend the stored trajectory.
+    """
+    if tolerance is None:
+        tolerance = getattr(settings, 'TRAJECTORY_TOLERANCE', 10.0)
+    fixes = list(LocationBreadcrumb.objects.filter(order=order)
+                 .order_by('recorded_at').values_list('latitude', 'longitude', 'recorded_at'))
+    if not fixes:
+        return None
+
+    previous = DeliveryTrajectory.objects.filter(order=order).first()
+    if previous is not None and _breadcrumbs_dropped(previous, fixes):
+        trajectory = build_trajectory(order, sorted(previous.decode() + fixes, key=lambda fix: fix[2]), tolerance)
+        trajectory.raw_points = previous.raw_points + len(fixes)
+        # Measured against the stored points, not the dropped breadcrumbs: add their error
+        trajectory.max_error = round(trajectory.max_error + previous.max_error, 2)
+    else:
+        trajectory = build_trajectory(order, fixes, tolerance)
+    if commit:
+        with transaction.atomic():
+            DeliveryTrajectory.objects.filter(order=order).delete()
+            trajectory.save()
+            if not getattr(settings, 'TRAJECTORY_KEEP_BREADCRUMBS', False):
+                LocationBreadcrumb.objects.filter(order=order).delete()
+    return trajectory
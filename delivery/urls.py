@@ -9,7 +9,10 @@ urlpatterns = [
     path('reject/<int:order_id>/', views.reject_order, name='reject_order'),
     path('pickup/<int:order_id>/', views.mark_as_picked, name='mark_as_picked'),
     path('deliver/<int:order_id>/', views.mark_as_delivered, name='mark_as_delivered'),
+    path('route/plan/', views.route_plan, name='route_plan'),
     path('route/<int:order_id>/', views.route_map_view, name='route_map'),
     path('location/update/', views.update_agent_location, name='update_location'),
+    path('location/batch/', views.update_agent_location_batch, name='update_location_batch'),
+    path('agents/online/', views.online_agents_near, name='online_agents_near'),
     path('toggle-availability/', views.toggle_availability, name='toggle_availability'),
 ]
@@ -1,13 +1,28 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.http import JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from orders.models import Order
+from orders.state_machine import transition
+from .location_store import record_location, record_agent_location, get_agent_locations, flush_locations, forget_location
+from .breadcrumbs import InvalidFix, parse_coordinate, parse_fixes, store_breadcrumbs
+from .trajectory import compact_trajectory
+from .batching import agent_route
+from .earnings import record_delivery
+from .presence import leave, online_near
+from .models import AgentEarnings
 from accounts.models import DeliveryAgent
+from datetime import timedelta
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 @login_required
@@ -39,14 +54,22 @@ def delivery_dashboard(request):
     # Pending pickups (accepted by agent but not yet picked up)
     pending_orders = assigned_orders.filter(status__in=['confirmed', 'preparing']).order_by('-created_at')
     
+    # Maintained counters (see earnings.py) instead of summing the order history
+    counters = AgentEarnings.objects.filter(agent=request.user).first() or AgentEarnings(agent=request.user)
+    stats = counters.snapshot()
+    
     context = {
         'delivery_agent': delivery_agent,
         'preparing_orders': preparing_orders,  # All preparing orders for browsing
         'assigned_orders': assigned_orders,  # Orders assigned to this agent
         'pending_orders': pending_orders,  # Orders agent accepted but hasn't picked up
         'active_orders': active_orders,
-        'total_deliveries': delivery_agent.total_deliveries,
-        'total_earnings': delivery_agent.total_earnings,
+        'total_deliveries': stats['deliveries'],
+        'total_earnings': stats['earnings'],
+        'today_deliveries': stats['today_deliveries'],
+        'today_earnings': stats['today_earnings'],
+        'week_deliveries': stats['week_deliveries'],
+        'week_earnings': stats['week_earnings'],
     }
     
     return render(request, 'delivery/delivery_dashboard.html', context)
@@ -61,17 +84,13 @@ def accept_order(request, order_id):
     
     order = get_object_or_404(Order, id=order_id)
     
-    # Check if order is available
-    if order.delivery_agent is not None:
-        return JsonResponse({'success': False, 'error': 'Order already assigned'}, status=400)
-    
-    if order.status not in ['confirmed', 'preparing']:
+    # Assign agent only if the order is still unassigned (first agent wins)
+    if not transition(order.id, 'accept', values={'delivery_agent': request.user}):
+        order.refresh_from_db(fields=['status', 'delivery_agent'])
+        if order.delivery_agent_id is not None:
+            return JsonResponse({'success': False, 'error': 'Order already assigned'}, status=400)
         return JsonResponse({'success': False, 'error': 'Order not available for pickup'}, status=400)
     
-    # Assign agent to order
-    order.delivery_agent = request.user
-    order.save()
-    
     messages.success(request, f'Order #{order.id} accepted! Head to the restaurant to pick it up.')
     return JsonResponse({
         'success': True,
@@ -90,28 +109,26 @@ def mark_as_picked(request, order_id):
     if not request.user.profile.is_delivery_agent:
         return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
     
-    order = get_object_or_404(Order, id=order_id, delivery_agent=request.user)
-    
-    if order.status not in ['confirmed', 'preparing']:
-        return JsonResponse({'success': False, 'error': 'Order cannot be picked up in current status'}, status=400)
-    
-    # AUTOMATIC STATUS UPDATE
-    order.status = 'out_for_delivery'
-    order.picked_at = timezone.now()
+    order = get_object_or_404(Order.objects.select_related('restaurant'), id=order_id, delivery_agent=request.user)
     
     # Copy restaurant location to order for tracking
+    values = {}
     if order.restaurant:
-        order.restaurant_latitude = order.restaurant.latitude
-        order.restaurant_longitude = order.restaurant.longitude
+        values = {
+            'restaurant_latitude': order.restaurant.latitude,
+            'restaurant_longitude': order.restaurant.longitude,
+        }
     
-    order.save()
+    # AUTOMATIC STATUS UPDATE: confirmed/preparing → out_for_delivery
+    if not transition(order.id, 'pick_up', scope={'delivery_agent': request.user}, values=values):
+        return JsonResponse({'success': False, 'error': 'Order cannot be picked up in current status'}, status=400)
     
     messages.success(request, f'Order #{order.id} marked as picked up! Navigate to customer location.')
     return JsonResponse({
         'success': True,
         'message': 'Order marked as picked up',
         'order_id': order.id,
-        'status': order.status,
+        'status': 'out_for_delivery',
         'redirect_url': f'/delivery/route/{order.id}/'
     })
 
@@ -128,20 +145,31 @@ def mark_as_delivered(request, order_id):
     
     order = get_object_or_404(Order, id=order_id, delivery_agent=request.user)
     
-    if order.status != 'out_for_delivery':
-        return JsonResponse({'success': False, 'error': 'Order not out for delivery'}, status=400)
+    # AUTOMATIC STATUS UPDATE: out_for_delivery → delivered, together with its
+    # earnings ledger entry: if either fails, neither happens
+    with transaction.atomic():
+        if not transition(order.id, 'deliver', scope={'delivery_agent': request.user}):
+            return JsonResponse({'success': False, 'error': 'Order not out for delivery'}, status=400)
+        record_delivery(order.id)
+    
+    # Keep the last position of the trip on the order; the flusher only covers active deliveries
+    flush_locations([order.id])
+    forget_location(order.id)
     
-    # AUTOMATIC STATUS UPDATE
-    order.status = 'delivered'
-    order.delivered_at = timezone.now()
-    order.save()
+    # Shrink the trip's breadcrumbs to a trajectory. The order is delivered
+    # either way: if this fails, its breadcrumbs stay and the periodic
+    # `manage.py compact_trajectories` run compacts them.
+    try:
+        compact_trajectory(order)
+    except Exception:
+        logger.exception('Compacting the trajectory of order %s failed; compact_trajectories will retry', order.id)
     
     messages.success(request, f'Order #{order.id} delivered successfully! Great job!')
     return JsonResponse({
         'success': True,
         'message': 'Order delivered successfully',
         'order_id': order.id,
-        'status': order.status,
+        'status': 'delivered',
         'redirect_url': '/delivery/dashboard/'
     })
 
@@ -151,8 +179,10 @@ def mark_as_delivered(request, order_id):
 @require_http_methods(["POST"])
 def update_agent_location(request):
     """
-    Update agent's current location during delivery.
-    Called periodically from mobile app/browser to share live location with customer.
+    Update agent's current location.
+    Called periodically from mobile app/browser. With an order_id the location is
+    shared with the customer of that delivery; without one it only updates the
+    agent's own position, which dispatch uses to offer nearby orders.
     """
     if not request.user.profile.is_delivery_agent:
         return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
@@ -163,36 +193,118 @@ def update_agent_location(request):
         longitude = data.get('longitude')
         order_id = data.get('order_id')
         
-        if not all([latitude, longitude, order_id]):
+        if latitude is None or longitude is None:
             return JsonResponse({'success': False, 'error': 'Missing required fields'}, status=400)
+        # Finite and on the globe, or the cached fix cannot be flushed to the database
+        latitude = parse_coordinate(latitude, 90, 'latitude')
+        longitude = parse_coordinate(longitude, 180, 'longitude')
         
-        # Get order being delivered
-        order = Order.objects.get(
-            id=order_id,
-            delivery_agent=request.user,
-            status='out_for_delivery'
-        )
+        # Only the agent delivering the order may move it
+        if order_id and not Order.objects.filter(id=order_id, delivery_agent=request.user, status='out_for_delivery').exists():
+            raise Order.DoesNotExist
         
-        # Update agent's live location
-        order.agent_current_latitude = latitude
-        order.agent_current_longitude = longitude
-        order.agent_location_updated_at = timezone.now()
-        order.save()
+        # Live location goes to the location store; flush_agent_locations writes it back in bulk
+        location = record_agent_location(request.user.id, latitude, longitude)
+        if order_id:
+            record_location(order_id, latitude, longitude, at=location.updated_at)
         
         return JsonResponse({
             'success': True,
             'message': 'Location updated',
-            'timestamp': order.agent_location_updated_at.isoformat()
+            'timestamp': location.updated_at.isoformat()
         })
         
     except Order.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Order not found or not assigned'}, status=404)
+    except InvalidFix as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+def update_agent_location_batch(request):
+    """
+    Upload a batch of timestamped GPS fixes for one delivery.
+    Body: {"order_id": 1, "fixes": [{"latitude", "longitude", "timestamp", "accuracy"?}, ...]}
+    where timestamp is ISO 8601 or epoch milliseconds. Fixes are appended to the
+    order's breadcrumb trail; the newest becomes the agent's current location.
+    A device that was offline at the drop may still upload its trail for
+    BREADCRUMB_LATE_UPLOAD_WINDOW seconds after delivery; the order's
+    trajectory is then compacted again.
+    """
+    if not request.user.profile.is_delivery_agent:
+        return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict) or not data.get('order_id'):
+            return JsonResponse({'success': False, 'error': 'Missing required fields'}, status=400)
+        fixes = parse_fixes(data.get('fixes'))
+
+        # Only the agent delivering (or who just delivered) the order may add to its trail
+        late_since = timezone.now() - timedelta(seconds=getattr(settings, 'BREADCRUMB_LATE_UPLOAD_WINDOW', 30 * 60))
+        order = Order.objects.only('id', 'status').get(
+            Q(status='out_for_delivery') | Q(status='delivered', delivered_at__gte=late_since),
+            id=data['order_id'], delivery_agent=request.user,
+        )
+        delivered = order.status == 'delivered'
+        latest = store_breadcrumbs(order, request.user, fixes, live=not delivered)
+        if delivered:
+            try:
+                compact_trajectory(order)
+            except Exception:
+                logger.exception('Compacting the trajectory of order %s failed; compact_trajectories will retry',
+                                 order.id)
+
+        return JsonResponse({
+            'success': True,
+            'accepted': len(fixes),
+            'latest': latest[2].isoformat(),
+        })
+
+    except InvalidFix as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    except (Order.DoesNotExist, ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Order not found or not assigned'}, status=404)
+
+
+@login_required
+def route_plan(request):
+    """
+    Stop sequence for every order the agent holds: pickups before their
+    drops, ordered to keep the route short. Starts from the agent's last
+    known position.
+    """
+    if not request.user.profile.is_delivery_agent:
+        return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+
+    start = None
+    location = get_agent_locations([request.user.id]).get(request.user.id)
+    if location:
+        start = (location.latitude, location.longitude)
+    else:
+        agent = DeliveryAgent.objects.filter(user=request.user, last_latitude__isnull=False).first()
+        if agent:
+            start = (agent.last_latitude, agent.last_longitude)
+
+    stops, route_km = agent_route(request.user, start)
+    return JsonResponse({
+        'success': True,
+        'stops': [
+            {'order_id': order_id, 'kind': kind, 'latitude': latitude, 'longitude': longitude}
+            for order_id, kind, (latitude, longitude) in stops
+        ],
+        'route_km': round(route_km, 3),
+    })
+
+
 @login_required
 def route_map_view(request, order_id):
     """
@@ -225,9 +337,7 @@ def reject_order(request, order_id):
     order = get_object_or_404(Order, id=order_id, delivery_agent=request.user)
     
     # Can only reject if not yet picked up
-    if order.status in ['confirmed', 'preparing'] and not order.picked_at:
-        order.delivery_agent = None
-        order.save()
+    if transition(order.id, 'reject', scope={'delivery_agent': request.user}):
         messages.success(request, f'Order #{order.id} rejected.')
         return JsonResponse({'success': True, 'message': 'Order rejected'})
     else:
@@ -243,6 +353,8 @@ def toggle_availability(request):
     agent = request.user.delivery_profile
     agent.availability_status = not agent.availability_status
     agent.save()
+    if not agent.availability_status:
+        leave(request.user.id)
     
     status_text = "available" if agent.availability_status else "unavailable"
     messages.success(request, f'You are now {status_text} for deliveries.')
@@ -252,3 +364,27 @@ def toggle_availability(request):
         'available': agent.availability_status,
         'message': f'Status changed to {status_text}'
     })
+
+
+@login_required
+def online_agents_near(request):
+    """
+    Number of delivery agents online around a point, e.g. for a restaurant
+    dashboard. Query: ?latitude=&longitude=&radius_km= (default 5, max 20).
+    Read from the presence store; only the online agents' rows are queried.
+    """
+    if not (request.user.is_staff or request.user.profile.is_restaurant_owner):
+        return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+
+    try:
+        latitude = float(request.GET['latitude'])
+        longitude = float(request.GET['longitude'])
+        radius_km = float(request.GET.get('radius_km', 5))
+    except (KeyError, ValueError):
+        return JsonResponse({'success': False, 'error': 'latitude and longitude are required numbers'}, status=400)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius_km <= 20):
+        return JsonResponse({'success': False, 'error': 'Coordinates or radius out of range'}, status=400)
+
+    online = [presence.user_id for presence, _ in online_near(latitude, longitude, radius_km)]
+    available = DeliveryAgent.objects.filter(user_id__in=online, availability_status=True).count() if online else 0
+    return JsonResponse({'success': True, 'online': len(online), 'available': available})
@@ -1,10 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from foodify_project.spatial import GeohashedModelMixin
 
 
-class Donation(models.Model):
+class Donation(GeohashedModelMixin, models.Model):
     """Enhanced donation model with quantity tracking, expiry, and multi-user booking support"""
+    GEOHASH_FIELDS = {'geohash': ('latitude', 'longitude')}
+    
     CATEGORY_CHOICES = [
         ('cooked', 'Cooked Food'),
         ('raw', 'Raw Materials'),
@@ -105,6 +108,7 @@ class Donation(models.Model):
         blank=True,
         help_text='Longitude for map location'
     )
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False, help_text='Spatial index of latitude/longitude')
     
     # Contact Information
     contact_phone = models.CharField(max_length=15, help_text='Contact number for pickup')
@@ -1,3 +1,47 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from .models import Donation
 
-# Create your tests here.
+
+class NearbyDonationsTests(TestCase):
+    def setUp(self):
+        Donation.objects.create(donor=User.objects.create_user(username='donor'), food_name='Veg Biryani',
+                                original_quantity=20, available_quantity=20, expiry_time=timezone.now() + timedelta(hours=4),
+                                location='Banjara Hills', latitude=Decimal('17.4126'), longitude=Decimal('78.4482'),
+                                contact_phone='9999999999')
+
+    def nearby(self, **params):
+        return self.client.get(reverse('donations:nearby_donations'), params)
+
+    def test_donations_within_the_radius(self):
+        response = self.nearby(lat='17.41', lon='78.44', radius='5')
+        self.assertEqual([d['food_name'] for d in response.json()['donations']], ['Veg Biryani'])
+        self.assertEqual(self.nearby(lat='17.2', lon='78.44', radius='5').json()['donations'], [])
+
+    def test_invalid_coordinates_and_radius_are_rejected(self):
+        cases = [
+            {'lat': 'nan', 'lon': '78.44'},
+            {'lat': '17.41', 'lon': 'inf'},
+            {'lat': '-inf', 'lon': '78.44'},
+            {'lat': '1e400', 'lon': '78.44'},
+            {'lat': '91', 'lon': '78.44'},
+            {'lat': '17.41', 'lon': '-180.5'},
+            {'lat': '17.41', 'lon': '78.44', 'radius': 'nan'},
+            {'lat': '17.41', 'lon': '78.44', 'radius': 'inf'},
+            {'lat': '17.41', 'lon': '78.44', 'radius': '0'},
+            {'lat': '17.41', 'lon': '78.44', 'radius': '-5'},
+            {'lat': 'north', 'lon': '78.44'},
+            {'lat': '17.41'},
+        ]
+        for params in cases:
+            with self.subTest(**params):
+                self.assertEqual(self.nearby(**params).status_code, 400)
+
+    def test_radius_is_capped(self):
+        response = self.nearby(lat='17.41', lon='78.44', radius='100000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['donations']), 1)
@@ -1,3 +1,4 @@
+import math
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -7,6 +8,10 @@ from django.http import JsonResponse
 from django.conf import settings
 from .models import Donation, DonationBooking, DonationProof, Notification
 from .forms import DonationForm, DonationBookingForm, DonationProofForm
+from foodify_project.spatial import nearest
+
+
+MAX_NEARBY_RADIUS_KM = 50
 
 
 def donation_list(request):
@@ -275,18 +280,25 @@ def delete_donation(request, donation_id):
 
 
 def get_donations_near_location(request):
-    """API endpoint to get donations near a location"""
+    """API endpoint to get donations within `radius` km of a location, nearest first"""
     lat = request.GET.get('lat')
     lon = request.GET.get('lon')
-    radius_km = float(request.GET.get('radius', 5))
     
     if not lat or not lon:
         return JsonResponse({'error': 'Latitude and longitude required'}, status=400)
     
-    # Simple bounding box query (for more accuracy, use geospatial database)
+    try:
+        lat, lon = float(lat), float(lon)
+        radius_km = float(request.GET.get('radius', 5))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid coordinates or radius'}, status=400)
+    # inf and nan parse as floats too; a radius of zero or less would match no geohash cell and scan every row
+    if not all(map(math.isfinite, (lat, lon, radius_km))) or abs(lat) > 90 or abs(lon) > 180 or radius_km <= 0:
+        return JsonResponse({'error': 'Invalid coordinates or radius'}, status=400)
+    radius_km = min(radius_km, MAX_NEARBY_RADIUS_KM)
+    
+    # Geohash index: only donations in the cells around the point are read
     donations = Donation.objects.filter(
-        latitude__isnull=False,
-        longitude__isnull=False,
         expiry_time__gt=timezone.now(),
         status__in=['available', 'partially_booked']
     )
@@ -298,10 +310,11 @@ def get_donations_near_location(request):
             'quantity': f"{d.available_quantity} {d.quantity_unit}",
             'latitude': float(d.latitude),
             'longitude': float(d.longitude),
+            'distance_km': round(distance, 2),
             'urgency': d.urgency_level,
             'hours_left': round(d.hours_until_expiry, 1),
         }
-        for d in donations
+        for d, distance in nearest(donations, lat, lon, radius_km)
     ]
     
     return JsonResponse({'donations': donations_data})
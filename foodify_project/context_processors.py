@@ -2,6 +2,7 @@
 Context processors for foodify_project
 """
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 
 
 def settings_context(request):
@@ -12,3 +13,12 @@ def settings_context(request):
         'GEOAPIFY_API_KEY': settings.GEOAPIFY_API_KEY,
         'STRIPE_PUBLIC_KEY': settings.STRIPE_PUBLIC_KEY,
     }
+
+
+def cart_summary(request):
+    """
+    Expose the current user's cart summary (used by the navbar badge).
+    Evaluated lazily, so pages that never render it cost no query.
+    """
+    from orders.cart import get_cart_summary
+    return {'cart_summary': SimpleLazyObject(lambda: get_cart_summary(request))}
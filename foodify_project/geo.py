@@ -0,0 +1,140 @@
+"""
+Geographic helpers shared by the apps.
+
+Functions take degrees and accept scalars or NumPy arrays, broadcasting
+like any NumPy ufunc, so a whole distance matrix is one call.
+"""
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometers"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix_km(origins, destinations):
+    """(len(origins), len(destinations)) matrix of distances between (lat, lng) pairs"""
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+    return haversine_km(origins[:, :1], origins[:, 1:], destinations[:, 0], destinations[:, 1])
+
+
+def project_km(points, origin_latitude):
+    """
+    Equirectangular projection of (lat, lng) degrees to (x, y) kilometers
+    around origin_latitude. Good enough for nearest-neighbour searches
+    within a city; use haversine_km for the distances themselves.
+    """
+    points = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+    return np.column_stack((points[:, 1] * np.cos(np.radians(origin_latitude)), points[:, 0])) * EARTH_RADIUS_KM
+
+
+# Geohash: the world is split into a grid of 32 cells per character, so
+# points that share a prefix are close together and every cell is a
+# contiguous range of hash strings. An indexed geohash column turns "points
+# near X" into a few index range scans.
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~4.8 m x 4.8 m cells
+
+
+def _geohash_bits(precision):
+    # Geohash interleaves bits starting with longitude, which gets the odd one
+    bits = 5 * precision
+    return bits // 2, bits - bits // 2
+
+
+def _cell_index(value, low, span, bits):
+    index = np.floor((np.asarray(value, dtype=float) - low) / span * (1 << bits)).astype(np.int64)
+    return np.clip(index, 0, (1 << bits) - 1)
+
+
+def _interleave(lat_index, lng_index, precision):
+    lat_bits, lng_bits = _geohash_bits(precision)
+    value = np.zeros(np.shape(lat_index), dtype=np.int64)
+    for bit in range(lng_bits):
+        value |= ((lng_index >> (lng_bits - 1 - bit)) & 1) << (5 * precision - 1 - 2 * bit)
+    for bit in range(lat_bits):
+        value |= ((lat_index >> (lat_bits - 1 - bit)) & 1) << (5 * precision - 2 - 2 * bit)
+    return value
+
+
+def _to_strings(values, precision):
+    chars = np.array(list(GEOHASH_ALPHABET))
+    columns = [chars[(values >> (5 * (precision - 1 - i))) & 31] for i in range(precision)]
+    return [''.join(row) for row in zip(*columns)] if columns else []
+
+
+def encode_geohashes(latitudes, longitudes, precision=GEOHASH_PRECISION):
+    """Geohash strings for arrays of coordinates"""
+    lat_bits, lng_bits = _geohash_bits(precision)
+    values = _interleave(
+        _cell_index(np.ravel(latitudes), -90.0, 180.0, lat_bits),
+        _cell_index(np.ravel(longitudes), -180.0, 360.0, lng_bits),
+        precision,
+    )
+    return _to_strings(values, precision)
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of one point, or '' if a coordinate is missing"""
+    if latitude is None or longitude is None:
+        return ''
+    return encode_geohashes([float(latitude)], [float(longitude)], precision)[0]
+
+
+def _bounding_box(latitude, longitude, radius_km):
+    lat_span = min(radius_km / 111.195, 90.0)
+    lng_span = min(lat_span / max(np.cos(np.radians(float(latitude))), 1e-6), 180.0)
+    south, north = max(float(latitude) - lat_span, -90.0), min(float(latitude) + lat_span, 90.0)
+    return south, north, float(longitude) - lng_span, float(longitude) + lng_span
+
+
+def _box_cells(box, precision):
+    south, north, west, east = box
+    lat_bits, lng_bits = _geohash_bits(precision)
+    lat_cells = np.arange(_cell_index(south, -90.0, 180.0, lat_bits), _cell_index(north, -90.0, 180.0, lat_bits) + 1)
+    # Longitudes wrap around the antimeridian
+    lng_first = int(np.floor((west + 180.0) / 360.0 * (1 << lng_bits)))
+    lng_last = int(np.floor((east + 180.0) / 360.0 * (1 << lng_bits)))
+    lng_cells = np.unique(np.arange(lng_first, lng_last + 1) % (1 << lng_bits))
+    return lat_cells, lng_cells
+
+
+def geohash_cells(latitude, longitude, radius_km, precision):
+    """Geohashes of the cells at `precision` covering the circle of radius_km around the point"""
+    lat_cells, lng_cells = _box_cells(_bounding_box(latitude, longitude, radius_km), precision)
+    lat_grid, lng_grid = np.meshgrid(lat_cells, lng_cells)
+    return _to_strings(np.unique(_interleave(lat_grid.ravel(), lng_grid.ravel(), precision)), precision)
+
+
+def geohash_ranges(latitude, longitude, radius_km, max_cells=64, precision=GEOHASH_PRECISION):
+    """
+    [(low, high)] geohash string ranges (high None = unbounded) whose union
+    covers the circle of radius_km around the point. Uses the finest cell
+    size at which the circle's bounding box spans at most max_cells cells.
+    Adjacent cells are merged into one range.
+    """
+    box = _bounding_box(latitude, longitude, radius_km)
+    for cell_precision in range(precision, 0, -1):
+        lat_cells, lng_cells = _box_cells(box, cell_precision)
+        if len(lat_cells) * len(lng_cells) <= max_cells or cell_precision == 1:
+            break
+
+    lat_grid, lng_grid = np.meshgrid(lat_cells, lng_cells)
+    values = np.unique(_interleave(lat_grid.ravel(), lng_grid.ravel(), cell_precision))
+    ranges = []
+    for value in values.tolist():
+        if ranges and ranges[-1][1] == value:
+            ranges[-1][1] = value + 1
+        else:
+            ranges.append([value, value + 1])
+    return [
+        (_to_strings(np.array([low]), cell_precision)[0],
+         None if high == 1 << (5 * cell_precision) else _to_strings(np.array([high]), cell_precision)[0])
+        for low, high in ranges
+    ]
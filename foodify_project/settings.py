@@ -77,6 +77,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'foodify_project.context_processors.settings_context',
+                'foodify_project.context_processors.cart_summary',
             ],
         },
     },
@@ -158,10 +159,87 @@ LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'accounts:user_home'
 LOGOUT_REDIRECT_URL = 'index'
 
+# Cache. Carts, live locations and presence keep one or more keys per user,
+# far past the local-memory default of 300 entries. Point this at Redis or
+# Memcached when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    }
+}
+
 # Session settings
 SESSION_COOKIE_AGE = 86400  # 1 day
 SESSION_SAVE_EVERY_REQUEST = True
 
+# Cart storage backend (see orders/cart_storage.py)
+# - orders.cart_storage.DatabaseCartBackend: one Cart row per line
+# - orders.cart_storage.SessionCartBackend: cart kept in the session; pair with a
+#   cache or signed_cookies SESSION_ENGINE to keep browsing free of DB writes
+# - orders.cart_storage.CacheCartBackend: cart kept in the cache, keyed by user
+#   (needs a shared cache such as Redis/Memcached when running several workers)
+# Session/cache carts are written to the database only at checkout.
+CART_BACKEND = os.getenv('CART_BACKEND', 'orders.cart_storage.DatabaseCartBackend')
+CART_CACHE_TIMEOUT = 7 * 24 * 3600  # 1 week
+
+# Live delivery-agent locations (see delivery/location_store.py) are kept in
+# the cache and written to orders by `manage.py flush_agent_locations`.
+# Needs a shared cache (Redis/Memcached) when running several workers.
+LIVE_LOCATION_TTL = 3600  # seconds a fix stays readable without new pings
+BREADCRUMB_BATCH_MAX = 500  # fixes per POST to /delivery/location/batch/
+BREADCRUMB_LATE_UPLOAD_WINDOW = 30 * 60  # seconds after delivery a device may still upload its trail
+
+# Breadcrumbs of delivered orders are simplified into a DeliveryTrajectory
+# (see delivery/trajectory.py); `manage.py compact_trajectories` catches up
+# on any the delivery request could not compact.
+TRAJECTORY_TOLERANCE = 10.0  # meters a stored track may deviate from the raw fixes
+TRAJECTORY_KEEP_BREADCRUMBS = False  # keep raw breadcrumbs after compaction
+
+# Agent presence (see delivery/presence.py): every location ping keeps an
+# agent online for PRESENCE_TTL seconds. `manage.py sweep_presence` clears
+# expired entries. Shares the cache caveat of the live locations above.
+PRESENCE_TTL = 60  # seconds; agents' apps ping every few seconds
+PRESENCE_CELL_PRECISION = 5  # geohash length of the area buckets (~4.9 km)
+
+# Automatic dispatch (see delivery/dispatch.py), run by `manage.py run_dispatch`:
+# waiting orders are matched to idle available agents nearby that are online.
+DISPATCH_MAX_PICKUP_KM = 8.0  # farthest agent -> restaurant distance assigned
+DISPATCH_MAX_ORDERS = 5000  # oldest waiting orders considered per round
+DISPATCH_CANDIDATES = 48  # nearest agents considered per order
+
+# Multi-drop batching (see delivery/batching.py): dispatch hands compatible
+# orders to one agent and /delivery/route/plan/ sequences their stops.
+DISPATCH_BATCHING = True
+ORDER_PREP_MINUTES = 15  # assumed confirmation -> ready time
+BATCH_MAX_ORDERS = 4  # orders per batch (8 stops)
+BATCH_PICKUP_RADIUS_KM = 1.0  # farthest apart two pickups of a batch may be
+BATCH_DROP_RADIUS_KM = 3.0  # farthest apart two drops of a batch may be
+BATCH_READY_WINDOW = 600  # seconds between the ready times of a batch
+
+# Restaurant search (see restaurants/search.py): an FTS5 table on SQLite and a
+# tsvector + GIN index on PostgreSQL, kept in sync by signals. Run
+# `manage.py rebuild_search_index` after bulk imports.
+SEARCH_MAX_RESULTS = 500  # ranked matches listed per search
+# Searches without results retry with misspelled words corrected against the
+# vocabulary of names, cuisines and dishes (see restaurants/fuzzy.py)
+FUZZY_MAX_DISTANCE = 2  # edits allowed per word
+FUZZY_PREFIX_LENGTH = 7  # characters of each word indexed
+# Search box autocomplete (/restaurants/api/suggest/, see restaurants/suggest.py),
+# answered from an in-memory index rebuilt in the background
+SUGGEST_CHECK_SECONDS = 1.0  # how often requests look at the catalog version stamp
+SUGGEST_MAX_AGE = 600  # seconds before order counts are reloaded anyway
+SUGGEST_BACKGROUND_REFRESH = True  # False rebuilds in the request that noticed
+# Restaurant listing filter counts (see restaurants/facets.py), cached per
+# search and filters until a restaurant or menu item changes
+FACETS_CACHE_SECONDS = 600
+
+# Customer order tracking stream (Server-Sent Events). Each open stream holds
+# a worker thread, so streams are capped and the browser reconnects; set
+# TRACKING_STREAM_SECONDS=0 to make tracking pages poll with ETags instead.
+TRACKING_STREAM_SECONDS = int(os.getenv('TRACKING_STREAM_SECONDS', '55'))
+TRACKING_STREAM_INTERVAL = 1.0  # seconds between checks for changes
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -172,6 +250,37 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Get your keys from: https://dashboard.stripe.com/test/apikeys
 STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY', 'pk_test_REPLACE_WITH_YOUR_KEY')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', 'sk_test_REPLACE_WITH_YOUR_KEY')
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+
+# Payment gateway used by checkout (see payment_system/gateways.py).
+# Set PAYMENT_GATEWAY=payment_system.gateways.FakeGateway to run checkout
+# offline, e.g. for load tests.
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'payment_system.gateways.StripeGateway')
+if PAYMENT_GATEWAY.endswith('FakeGateway'):
+    PAYMENT_GATEWAY_OPTIONS = {
+        'latency': float(os.getenv('FAKE_GATEWAY_LATENCY', '0.2')),  # seconds per call
+        'failure_rate': float(os.getenv('FAKE_GATEWAY_FAILURE_RATE', '0')),
+    }
+else:
+    PAYMENT_GATEWAY_OPTIONS = {
+        # (connect, read) timeouts in seconds
+        'timeout': (
+            float(os.getenv('STRIPE_CONNECT_TIMEOUT', '3.05')),
+            float(os.getenv('STRIPE_READ_TIMEOUT', '10')),
+        ),
+        'max_network_retries': int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', '2')),
+    }
+
+# Paid checkouts are turned into orders by `manage.py process_payment_events`
+# from gateway webhooks (POST /payments/webhook/), so confirm_payment is only
+# a status poll. If no webhook has been handled within the grace period, the
+# poll finalizes the checkout itself. With async confirmation off it always
+# does (e.g. in development without a webhook tunnel). It defaults to on only
+# when STRIPE_WEBHOOK_SECRET is set: webhooks are refused without it.
+PAYMENT_ASYNC_CONFIRMATION = os.getenv(
+    'PAYMENT_ASYNC_CONFIRMATION', 'True' if STRIPE_WEBHOOK_SECRET else 'False'
+) == 'True'
+PAYMENT_WEBHOOK_GRACE_SECONDS = int(os.getenv('PAYMENT_WEBHOOK_GRACE_SECONDS', '10'))
 
 # Django-Payments Configuration
 PAYMENT_HOST = 'localhost:8000'
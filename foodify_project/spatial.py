@@ -0,0 +1,70 @@
+"""
+Spatial index on plain latitude/longitude columns.
+
+Models that take part keep an indexed geohash column next to each pair of
+coordinates, kept current on save through GeohashedModelMixin. nearest()
+uses it to read only the rows in the geohash cells around a point, then
+ranks them by exact distance. It works on any database, no PostGIS needed.
+
+Code that writes coordinates with queryset.update() or bulk_update() must
+set the geohash column too, with encode_geohash().
+"""
+import heapq
+from django.db.models import Q
+from .geo import encode_geohash, geohash_ranges, haversine_km
+
+
+class GeohashedModelMixin:
+    """
+    Keeps geohash columns in sync with coordinates on save(). Subclasses
+    map each geohash field to its coordinate fields:
+
+        GEOHASH_FIELDS = {'geohash': ('latitude', 'longitude')}
+    """
+    GEOHASH_FIELDS = {}
+
+    def update_geohashes(self):
+        for hash_field, (lat_field, lng_field) in self.GEOHASH_FIELDS.items():
+            setattr(self, hash_field, encode_geohash(getattr(self, lat_field), getattr(self, lng_field)))
+
+    def save(self, *args, **kwargs):
+        self.update_geohashes()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            extra = [
+                hash_field for hash_field, coordinates in self.GEOHASH_FIELDS.items()
+                if set(coordinates) & set(update_fields)
+            ]
+            kwargs['update_fields'] = list(update_fields) + extra
+        super().save(*args, **kwargs)
+
+
+def within_radius_q(latitude, longitude, radius_km, hash_field='geohash'):
+    """Q matching rows whose geohash lies in a cell near the point (a superset of the circle)"""
+    q = Q()
+    for low, high in geohash_ranges(latitude, longitude, radius_km):
+        cell = Q(**{f'{hash_field}__gte': low})
+        if high is not None:
+            cell &= Q(**{f'{hash_field}__lt': high})
+        q |= cell
+    return q
+
+
+def nearest(queryset, latitude, longitude, radius_km, k=None, hash_field='geohash'):
+    """
+    The (at most k) rows of queryset within radius_km of the point, nearest
+    first, as [(instance, distance_km)]. Only rows in the surrounding
+    geohash cells are read.
+    """
+    lat_field, lng_field = queryset.model.GEOHASH_FIELDS[hash_field]
+    candidates = list(queryset.filter(within_radius_q(latitude, longitude, radius_km, hash_field)))
+    if not candidates:
+        return []
+    distances = haversine_km(
+        float(latitude), float(longitude),
+        [float(getattr(obj, lat_field)) for obj in candidates],
+        [float(getattr(obj, lng_field)) for obj in candidates],
+    ).tolist()
+    in_range = [(distance, i) for i, distance in enumerate(distances) if distance <= radius_km]
+    ranked = heapq.nsmallest(k, in_range) if k else sorted(in_range)
+    return [(candidates[i], distance) for distance, i in ranked]
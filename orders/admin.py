@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, Order, OrderItem, Payment
+from .models import Cart, Order, OrderItem, CheckoutSession, Payment
 
 
 @admin.register(Cart)
@@ -24,6 +24,14 @@ class OrderItemAdmin(admin.ModelAdmin):
     search_fields = ('name', 'order__user__username')
 
 
+@admin.register(CheckoutSession)
+class CheckoutSessionAdmin(admin.ModelAdmin):
+    list_display = ('payment_intent_id', 'user', 'status', 'total_amount', 'order', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('payment_intent_id', 'user__username')
+    readonly_fields = ('created_at', 'updated_at')
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('id', 'order', 'variant', 'total', 'status', 'created')
@@ -0,0 +1,89 @@
+"""
+Cart summary helpers.
+
+Totals are computed either from cart lines a view has already loaded (no
+extra query) or with a single aggregate query. The result is memoised on the
+request so the navbar badge and the page body share one lookup.
+"""
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, Sum
+from .models import Cart
+
+
+DELIVERY_FEE = Decimal('40.00')
+TAX_RATE = Decimal('0.05')  # 5% tax
+
+
+class CartSummary:
+    """Line count, item count and money totals for a cart"""
+
+    def __init__(self, line_count=0, item_count=0, subtotal=Decimal('0.00')):
+        self.line_count = line_count
+        self.item_count = item_count
+        self.subtotal = subtotal
+
+    @property
+    def is_empty(self):
+        return self.line_count == 0
+
+    @property
+    def delivery_fee(self):
+        return Decimal('0.00') if self.is_empty else DELIVERY_FEE
+
+    @property
+    def tax(self):
+        return self.subtotal * TAX_RATE
+
+    @property
+    def total(self):
+        return self.subtotal + self.delivery_fee + self.tax
+
+    def as_totals(self):
+        """Totals tuple in the shape used by orders.checkout"""
+        return self.subtotal, self.delivery_fee, self.tax, self.total
+
+
+def summarize_cart(cart_items):
+    """Build a summary from already-loaded cart lines without touching the database"""
+    return CartSummary(
+        line_count=len(cart_items),
+        item_count=sum(item.quantity for item in cart_items),
+        subtotal=sum((item.menu_item.price * item.quantity for item in cart_items), Decimal('0.00')),
+    )
+
+
+def query_cart_summary(user):
+    """Summarise a user's cart with one aggregate query"""
+    totals = Cart.objects.filter(user=user).aggregate(
+        line_count=Count('id'),
+        item_count=Sum('quantity'),
+        subtotal=Sum(
+            F('quantity') * F('menu_item__price'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+    return CartSummary(
+        line_count=totals['line_count'],
+        item_count=totals['item_count'] or 0,
+        subtotal=totals['subtotal'] or Decimal('0.00'),
+    )
+
+
+def get_cart_summary(request, cart_items=None):
+    """
+    Return the cart summary for the current request, computing it at most once.
+
+    Views that already loaded the cart lines pass them in so the summary is
+    derived in Python; otherwise the cart backend computes it (a single
+    aggregate query for the database backend).
+    """
+    if cart_items is not None:
+        request._cart_summary = summarize_cart(cart_items)
+    elif not hasattr(request, '_cart_summary'):
+        if request.user.is_authenticated:
+            from .cart_storage import get_cart
+            request._cart_summary = get_cart(request).summary()
+        else:
+            request._cart_summary = CartSummary()
+    return request._cart_summary
+
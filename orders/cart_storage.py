@@ -0,0 +1,278 @@
+"""
+Pluggable cart storage.
+
+The active backend is chosen with the CART_BACKEND setting:
+
+* DatabaseCartBackend - one Cart row per line (the original behaviour).
+* SessionCartBackend  - lines live in request.session. Combined with a cache
+  or signed-cookie SESSION_ENGINE, browsing causes no database writes.
+* CacheCartBackend    - lines live in the Django cache, keyed by user, so the
+  cart follows the user across devices.
+
+Session and cache carts are only written to the Cart table by persist(),
+right before checkout. Switching backends is safe: the session/cache
+backends adopt a user's existing Cart rows the first time they see that user,
+and the database backend imports any cart left in the session.
+
+Lines are addressed by menu item id in every backend.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from restaurants.models import MenuItem
+from .cart import CartSummary, query_cart_summary, summarize_cart
+from .models import Cart
+
+
+SESSION_CART_KEY = 'cart'
+
+
+class BaseCartBackend:
+    """Interface shared by all cart backends"""
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+
+    def lines(self):
+        """Cart instances (unsaved for non-database backends) with menu_item and restaurant loaded"""
+        raise NotImplementedError
+
+    def quantity(self, menu_item_id):
+        """Quantity of a menu item in the cart, 0 if absent"""
+        raise NotImplementedError
+
+    def add(self, menu_item, quantity=1):
+        """Add quantity of menu_item and return the new line quantity"""
+        raise NotImplementedError
+
+    def set_quantity(self, menu_item_id, quantity):
+        """Set a line's quantity; zero or less removes the line"""
+        raise NotImplementedError
+
+    def change_quantity(self, menu_item_id, delta):
+        """Adjust an existing line by delta and return the new quantity (0 once removed)"""
+        raise NotImplementedError
+
+    def remove(self, menu_item_id):
+        """Remove a line, returning whether it existed"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def summary(self):
+        raise NotImplementedError
+
+    def persist(self):
+        """Make sure the cart exists as Cart rows so checkout can read it"""
+
+    def mark_ordered(self, lines=None):
+        """
+        Forget lines that were turned into an order by the checkout service:
+        the given lines (from orders.checkout.cart_lines), or the whole cart
+        """
+
+
+class DatabaseCartBackend(BaseCartBackend):
+    """Stores each cart line as a Cart row"""
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._import_session_cart()
+
+    def _import_session_cart(self):
+        # Carry over carts left behind by SessionCartBackend
+        session = getattr(self.request, 'session', None)
+        if session is None or SESSION_CART_KEY not in session:
+            return
+        for menu_item_id, quantity in session.pop(SESSION_CART_KEY).items():
+            menu_item = MenuItem.objects.filter(id=menu_item_id).first()
+            if menu_item:
+                self.add(menu_item, quantity)
+
+    def _queryset(self):
+        return Cart.objects.filter(user=self.user)
+
+    def lines(self):
+        return list(self._queryset().select_related('menu_item', 'menu_item__restaurant'))
+
+    def quantity(self, menu_item_id):
+        return self._queryset().filter(menu_item_id=menu_item_id).values_list('quantity', flat=True).first() or 0
+
+    def add(self, menu_item, quantity=1):
+        # Atomic upsert: bump an existing line in SQL, otherwise insert it.
+        # A concurrent insert of the same line trips the unique constraint,
+        # in which case the line now exists and the increment is retried.
+        if not self._increment(menu_item.id, quantity):
+            try:
+                with transaction.atomic():
+                    Cart.objects.create(user=self.user, menu_item=menu_item, quantity=quantity)
+                return quantity
+            except IntegrityError:
+                self._increment(menu_item.id, quantity)
+        return self.quantity(menu_item.id)
+
+    def _increment(self, menu_item_id, delta):
+        return self._queryset().filter(menu_item_id=menu_item_id).update(
+            quantity=F('quantity') + delta,
+            updated_at=timezone.now(),
+        )
+
+    def set_quantity(self, menu_item_id, quantity):
+        if quantity <= 0:
+            self.remove(menu_item_id)
+        else:
+            self._queryset().filter(menu_item_id=menu_item_id).update(quantity=quantity, updated_at=timezone.now())
+
+    def change_quantity(self, menu_item_id, delta):
+        if not self._increment(menu_item_id, delta):
+            return 0
+        # Only drop the line if it is still empty, in case another request bumped it meanwhile
+        self._queryset().filter(menu_item_id=menu_item_id, quantity__lte=0).delete()
+        return self.quantity(menu_item_id)
+
+    def remove(self, menu_item_id):
+        deleted, _ = self._queryset().filter(menu_item_id=menu_item_id).delete()
+        return bool(deleted)
+
+    def clear(self):
+        self._queryset().delete()
+
+    def summary(self):
+        return query_cart_summary(self.user)
+
+
+class MappingCartBackend(BaseCartBackend):
+    """
+    Base for backends that keep the cart as a {menu_item_id: quantity} mapping
+    outside the database. Subclasses implement load_mapping/save_mapping;
+    load_mapping returns None when nothing has been stored for the user yet.
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        mapping = self.load_mapping()
+        if mapping is None:
+            mapping = self._adopt_database_cart()
+        self.mapping = mapping
+
+    def load_mapping(self):
+        raise NotImplementedError
+
+    def save_mapping(self):
+        raise NotImplementedError
+
+    def _adopt_database_cart(self):
+        # First visit since switching backends: move existing Cart rows over
+        rows = Cart.objects.filter(user=self.user)
+        mapping = {str(menu_item_id): quantity for menu_item_id, quantity in rows.values_list('menu_item_id', 'quantity')}
+        if mapping:
+            rows.delete()
+        self.mapping = mapping
+        self.save_mapping()
+        return mapping
+
+    def lines(self):
+        if not self.mapping:
+            return []
+        menu_items = MenuItem.objects.select_related('restaurant').in_bulk([int(pk) for pk in self.mapping])
+        lines = []
+        for menu_item_id, quantity in self.mapping.items():
+            menu_item = menu_items.get(int(menu_item_id))
+            if menu_item:
+                lines.append(Cart(user=self.user, menu_item=menu_item, quantity=quantity))
+        return lines
+
+    def quantity(self, menu_item_id):
+        return self.mapping.get(str(menu_item_id), 0)
+
+    def add(self, menu_item, quantity=1):
+        key = str(menu_item.id)
+        self.mapping[key] = self.mapping.get(key, 0) + quantity
+        self.save_mapping()
+        return self.mapping[key]
+
+    def set_quantity(self, menu_item_id, quantity):
+        if quantity <= 0:
+            self.remove(menu_item_id)
+        else:
+            self.mapping[str(menu_item_id)] = quantity
+            self.save_mapping()
+
+    def change_quantity(self, menu_item_id, delta):
+        quantity = self.quantity(menu_item_id)
+        if not quantity:
+            return 0
+        self.set_quantity(menu_item_id, quantity + delta)
+        return max(quantity + delta, 0)
+
+    def remove(self, menu_item_id):
+        existed = self.mapping.pop(str(menu_item_id), None) is not None
+        if existed:
+            self.save_mapping()
+        return existed
+
+    def clear(self):
+        self.mapping = {}
+        self.save_mapping()
+
+    def summary(self):
+        if not self.mapping:
+            return CartSummary()
+        return summarize_cart(self.lines())
+
+    def persist(self):
+        lines = self.lines()
+        with transaction.atomic():
+            Cart.objects.filter(user=self.user).delete()
+            Cart.objects.bulk_create(lines)
+
+    def mark_ordered(self, lines=None):
+        if lines is None:
+            self.clear()
+            return
+        # Keep whatever was added after the ordered lines were copied
+        for line in lines:
+            key = str(line['menu_item'])
+            remaining = self.mapping.get(key, 0) - line['quantity']
+            if remaining > 0:
+                self.mapping[key] = remaining
+            else:
+                self.mapping.pop(key, None)
+        self.save_mapping()
+
+
+class SessionCartBackend(MappingCartBackend):
+    """Keeps the cart in request.session"""
+
+    def load_mapping(self):
+        return self.request.session.get(SESSION_CART_KEY)
+
+    def save_mapping(self):
+        self.request.session[SESSION_CART_KEY] = self.mapping
+        self.request.session.modified = True
+
+
+class CacheCartBackend(MappingCartBackend):
+    """Keeps the cart in the Django cache, keyed by user"""
+
+    def cache_key(self):
+        return f'cart:{self.user.pk}'
+
+    def load_mapping(self):
+        return cache.get(self.cache_key())
+
+    def save_mapping(self):
+        cache.set(self.cache_key(), self.mapping, getattr(settings, 'CART_CACHE_TIMEOUT', 7 * 24 * 3600))
+
+
+def get_cart(request):
+    """Return the configured cart backend for this request (created once per request)"""
+    if not hasattr(request, '_cart'):
+        backend_path = getattr(settings, 'CART_BACKEND', 'orders.cart_storage.DatabaseCartBackend')
+        request._cart = import_string(backend_path)(request)
+    return request._cart
@@ -0,0 +1,202 @@
+"""
+Checkout pipeline shared by the payment views and the payment event worker.
+
+Turns a user's cart into a paid Order inside a single database transaction:
+the order row, its items, the payment transaction and the cart cleanup
+either all land together or not at all.
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from restaurants.models import MenuItem, Restaurant
+from .cart import CartSummary
+from .models import Cart, CheckoutSession, Order, OrderItem
+
+
+class EmptyCartError(Exception):
+    """Raised when checkout is attempted on an empty cart"""
+
+
+class PaymentNotCompleted(Exception):
+    """The gateway does not (yet) report the checkout's payment as succeeded"""
+
+    def __init__(self, status):
+        super().__init__(f'Payment is {status}')
+        self.status = status
+
+
+def cart_lines(cart_items):
+    """
+    Copy of cart lines (with menu_item loaded) as stored on a CheckoutSession:
+    what its payment is for, whatever happens to the cart or menu afterwards.
+    """
+    return [
+        {
+            'menu_item': item.menu_item_id,
+            'restaurant': item.menu_item.restaurant_id,
+            'name': item.menu_item.name,
+            'price': str(item.menu_item.price),
+            'quantity': item.quantity,
+        }
+        for item in cart_items
+    ]
+
+
+def summarize_lines(lines):
+    """Summary of lines from cart_lines()"""
+    return CartSummary(
+        line_count=len(lines),
+        item_count=sum(line['quantity'] for line in lines),
+        subtotal=sum((Decimal(line['price']) * line['quantity'] for line in lines), Decimal('0.00')),
+    )
+
+
+def place_order_from_cart(user, delivery_address, *, transaction_id, payment_method,
+                          payment_status='completed', payment_intent_id=None,
+                          gateway_response=None, totals=None, payment=None, lines=None):
+    """
+    Create a confirmed, paid order from the user's cart.
+
+    Order items are written with a single bulk insert and the cart lines that
+    were read are deleted in the same transaction, so a failure at any step
+    leaves no half-built order behind. `totals` may be passed to reuse the
+    amounts that were shown (and charged) at checkout; otherwise they are
+    computed from the cart. `lines` (from cart_lines()) orders exactly those
+    lines instead of the cart's current ones; only what they cover is then
+    removed from the cart. Raises EmptyCartError if there is nothing to order.
+
+    Returns (order, payment_transaction).
+    """
+    from payment_system.models import PaymentTransaction
+
+    with transaction.atomic():
+        # Lock the cart lines so a double-submitted checkout cannot order them twice
+        cart_items = list(
+            Cart.objects.select_for_update(of=('self',))
+            .filter(user=user)
+            .select_related('menu_item', 'menu_item__restaurant')
+        )
+        if lines is None:
+            lines = cart_lines(cart_items)
+            restaurant = cart_items[0].menu_item.restaurant if cart_items else None
+            menu_item_ids = {line['menu_item'] for line in lines}
+        elif lines:
+            # Dishes or the restaurant may have been deleted since the lines were copied
+            restaurant = Restaurant.objects.filter(pk=lines[0]['restaurant']).first()
+            menu_item_ids = set(MenuItem.objects.filter(pk__in=[line['menu_item'] for line in lines])
+                                .values_list('pk', flat=True))
+        if not lines:
+            raise EmptyCartError('Cart is empty')
+
+        subtotal, delivery_fee, tax, grand_total = totals or summarize_lines(lines).as_totals()
+        now = timezone.now()
+
+        order = Order.objects.create(
+            user=user,
+            restaurant=restaurant,
+            total_amount=subtotal,
+            delivery_fee=delivery_fee,
+            tax_amount=tax,
+            status='confirmed',  # Auto-confirm paid orders
+            confirmed_at=now,  # AUTO TIMESTAMP: payment → confirmed
+            delivery_address=delivery_address,
+            payment_status=payment_status,
+            payment_intent_id=payment_intent_id,
+            is_paid=True,
+        )
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                menu_item_id=line['menu_item'] if line['menu_item'] in menu_item_ids else None,
+                name=line['name'],
+                price=Decimal(line['price']),
+                quantity=line['quantity'],
+            )
+            for line in lines
+        ])
+
+        if payment is not None:
+            payment.order = order
+            payment.save(update_fields=['order'])
+
+        payment_transaction = PaymentTransaction.objects.create(
+            order=order,
+            restaurant=restaurant,
+            customer=user,
+            transaction_id=transaction_id,
+            payment_method=payment_method,
+            amount=grand_total,
+            currency='INR',
+            status='completed',
+            completed_at=now,
+            gateway_response=gateway_response,
+        )
+
+        # Remove what was ordered; anything added to the cart since stays there
+        ordered = {line['menu_item']: line['quantity'] for line in lines}
+        Cart.objects.filter(pk__in=[
+            item.pk for item in cart_items if item.quantity <= ordered.get(item.menu_item_id, 0)
+        ]).delete()
+        for item in cart_items:
+            if item.quantity > ordered.get(item.menu_item_id, item.quantity):
+                Cart.objects.filter(pk=item.pk).update(quantity=F('quantity') - ordered[item.menu_item_id])
+
+    return order, payment_transaction
+
+
+def finalize_checkout(checkout, gateway):
+    """
+    Turn a paid CheckoutSession into its order, exactly once.
+
+    Called both from confirm_payment and from the payment event worker,
+    possibly at the same time. The payment intent's idempotency key lets
+    one caller through. The others replay its stored response or get
+    IdempotencyConflict while it is still running. The gateway is only
+    asked about the payment after the key is claimed.
+
+    Returns the stored response. Raises PaymentNotCompleted or EmptyCartError.
+    """
+    from payment_system.idempotency import claim_idempotency_key, release_idempotency_key
+
+    payment_intent_id = checkout.payment_intent_id
+    claim, replay = claim_idempotency_key(payment_intent_id, checkout.user)
+    if replay:
+        return claim.response
+
+    try:
+        intent = gateway.retrieve_intent(payment_intent_id)
+        if not intent.succeeded:
+            raise PaymentNotCompleted(intent.status)
+        payment_method_type = intent.payment_method_type or 'card'
+
+        with transaction.atomic():
+            order, _ = place_order_from_cart(
+                checkout.user,
+                checkout.delivery_address,
+                transaction_id=payment_intent_id,
+                payment_method=payment_method_type,
+                payment_status='paid',
+                payment_intent_id=payment_intent_id,
+                gateway_response={
+                    'payment_intent_id': payment_intent_id,
+                    'status': intent.status,
+                    'payment_method_type': payment_method_type
+                },
+                totals=checkout.totals,
+                # Checkouts saved before lines were copied order the cart as it is
+                lines=checkout.items or None,
+            )
+            response = {
+                'success': True,
+                'order_id': order.id,
+                'redirect_url': f'/orders/{order.id}/'
+            }
+            claim.complete(response, order=order)
+            CheckoutSession.objects.filter(pk=checkout.pk).update(status='paid', order=order, updated_at=timezone.now())
+    except Exception:
+        release_idempotency_key(claim)
+        raise
+
+    return response
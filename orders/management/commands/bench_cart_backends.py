@@ -0,0 +1,84 @@
+import uuid
+from decimal import Decimal
+from importlib import import_module
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from restaurants.models import Restaurant, MenuItem
+from orders.cart_storage import DatabaseCartBackend, SessionCartBackend, CacheCartBackend
+
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class FakeRequest:
+    """Just enough of an HttpRequest for the cart backends"""
+
+    def __init__(self, user, session):
+        self.user = user
+        self.session = session
+
+
+class Command(BaseCommand):
+    help = 'Compare database write volume per N add-to-cart actions for each cart backend (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--actions', type=int, default=1000, help='Add-to-cart actions per backend')
+        parser.add_argument('--menu-size', type=int, default=30, help='Distinct menu items to pick from')
+        parser.add_argument('--session-engine', default=settings.SESSION_ENGINE,
+                            help='Session engine used for the session backend (default: SESSION_ENGINE)')
+
+    def handle(self, *args, **options):
+        actions = options['actions']
+        session_store = import_module(options['session_engine']).SessionStore
+        backends = [
+            ('database', DatabaseCartBackend),
+            ('session', SessionCartBackend),
+            ('cache', CacheCartBackend),
+        ]
+
+        self.stdout.write(f'Session engine: {options["session_engine"]}')
+        self.stdout.write(f'{"backend":>10} {"browse writes":>14} {"session writes":>15} {"checkout writes":>16}')
+        with transaction.atomic():
+            owner = User.objects.create_user(username=f'bench-owner-{uuid.uuid4().hex[:8]}')
+            restaurant = Restaurant.objects.create(
+                owner=owner, name='Bench Kitchen', cuisine='Indian',
+                location='Benchmark', description='Benchmark restaurant',
+            )
+            menu_items = MenuItem.objects.bulk_create([
+                MenuItem(restaurant=restaurant, name=f'Dish {i}', price=Decimal('99.00'), description='')
+                for i in range(options['menu_size'])
+            ])
+
+            for label, backend_class in backends:
+                user = User.objects.create_user(username=f'bench-{label}-{uuid.uuid4().hex[:8]}')
+                session = session_store()
+                browse_writes = session_writes = 0
+                for i in range(actions):
+                    # Every action is a separate request, so build a fresh backend each time
+                    with CaptureQueriesContext(connection) as ctx:
+                        request = FakeRequest(user, session)
+                        backend_class(request).add(menu_items[i % len(menu_items)])
+                    browse_writes += self._count_writes(ctx)
+                    # SESSION_SAVE_EVERY_REQUEST makes the middleware save the session each time
+                    with CaptureQueriesContext(connection) as ctx:
+                        session.save()
+                    session_writes += self._count_writes(ctx)
+
+                with CaptureQueriesContext(connection) as ctx:
+                    backend_class(FakeRequest(user, session)).persist()
+                checkout_writes = self._count_writes(ctx)
+
+                self.stdout.write(f'{label:>10} {browse_writes:>14} {session_writes:>15} {checkout_writes:>16}')
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Benchmark complete: {actions} add-to-cart actions per backend (no data was kept)'))
+
+    def _count_writes(self, ctx):
+        writes = sum(1 for query in ctx.captured_queries if query['sql'].lstrip().upper().startswith(WRITE_PREFIXES))
+        # Keep the connection's bounded query log from overflowing on long runs
+        reset_queries()
+        return writes
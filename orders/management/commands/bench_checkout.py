@@ -0,0 +1,63 @@
+import time
+import uuid
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from restaurants.models import Restaurant, MenuItem
+from orders.models import Cart
+from orders.checkout import place_order_from_cart
+
+
+class Command(BaseCommand):
+    help = 'Benchmark queries and latency per checkout for a range of cart sizes (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,10,15,25,50',
+                            help='Comma-separated cart sizes to benchmark')
+        parser.add_argument('--runs', type=int, default=20, help='Checkouts per cart size')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        runs = options['runs']
+
+        self.stdout.write(f'{"items":>6} {"queries":>8} {"avg ms":>9} {"p95 ms":>9}')
+        with transaction.atomic():
+            owner = User.objects.create_user(username=f'bench-owner-{uuid.uuid4().hex[:8]}')
+            customer = User.objects.create_user(username=f'bench-customer-{uuid.uuid4().hex[:8]}')
+            restaurant = Restaurant.objects.create(
+                owner=owner, name='Bench Kitchen', cuisine='Indian',
+                location='Benchmark', description='Benchmark restaurant',
+            )
+            menu_items = MenuItem.objects.bulk_create([
+                MenuItem(restaurant=restaurant, name=f'Dish {i}', price=Decimal('99.00'), description='')
+                for i in range(max(sizes))
+            ])
+
+            for size in sizes:
+                timings = []
+                queries = 0
+                for _ in range(runs):
+                    Cart.objects.bulk_create([
+                        Cart(user=customer, menu_item=item, quantity=2) for item in menu_items[:size]
+                    ])
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        place_order_from_cart(
+                            customer,
+                            'Benchmark address',
+                            transaction_id=f'BENCH-{uuid.uuid4().hex}',
+                            payment_method='card',
+                        )
+                        timings.append((time.perf_counter() - start) * 1000)
+                    queries = len(ctx.captured_queries)
+
+                timings.sort()
+                avg = sum(timings) / len(timings)
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(f'{size:>6} {queries:>8} {avg:>9.2f} {p95:>9.2f}')
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
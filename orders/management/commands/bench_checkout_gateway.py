@@ -0,0 +1,179 @@
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from restaurants.models import Restaurant, MenuItem
+from orders.models import Cart, CheckoutSession, Order
+from payment_system.events import process_pending_events
+from payment_system.gateways import get_gateway
+from payment_system.models import GatewayEvent
+
+
+class Command(BaseCommand):
+    help = ('Measure end-to-end checkout throughput against the in-process fake payment gateway. '
+            'SQLite allows a single writer, so use PostgreSQL (DATABASE_URL) for concurrency above 1.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=100, help='Checkouts to run')
+        parser.add_argument('--concurrency', type=int, default=1, help='Concurrent shoppers')
+        parser.add_argument('--latency', type=float, default=0.2, help='Fake gateway latency per call (seconds)')
+        parser.add_argument('--jitter', type=float, default=0.05, help='Extra random latency per call (seconds)')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of gateway calls that fail')
+        parser.add_argument('--items', type=int, default=3, help='Cart lines per checkout')
+        parser.add_argument('--webhooks', action='store_true',
+                            help='Finalize orders from webhooks in a background worker instead of in confirm_payment')
+
+    def handle(self, *args, **options):
+        gateway_options = {
+            'latency': options['latency'],
+            'jitter': options['jitter'],
+            'failure_rate': options['failure_rate'],
+            'seed': 42,
+        }
+        with override_settings(
+            PAYMENT_GATEWAY='payment_system.gateways.FakeGateway',
+            PAYMENT_GATEWAY_OPTIONS=gateway_options,
+            PAYMENT_ASYNC_CONFIRMATION=options['webhooks'],
+            PAYMENT_WEBHOOK_GRACE_SECONDS=60,
+            ALLOWED_HOSTS=['testserver'],
+        ):
+            self._run(options)
+
+    def _run(self, options):
+        run_id = uuid.uuid4().hex[:8]
+        owner = User.objects.create_user(username=f'bench-gw-owner-{run_id}')
+        restaurant = Restaurant.objects.create(
+            owner=owner, name='Bench Kitchen', cuisine='Indian',
+            location='Benchmark', description='Benchmark restaurant',
+        )
+        menu_items = MenuItem.objects.bulk_create([
+            MenuItem(restaurant=restaurant, name=f'Dish {i}', price=Decimal('99.00'), description='')
+            for i in range(options['items'])
+        ])
+        customers = [
+            User.objects.create_user(username=f'bench-gw-customer-{run_id}-{i}')
+            for i in range(options['checkouts'])
+        ]
+        gateway = get_gateway()
+        intent_ids = CheckoutSession.objects.filter(user__in=customers).values('payment_intent_id')
+
+        pending = list(customers)
+        lock = threading.Lock()
+        timings = []
+        confirm_timings = []
+        failures = []
+        shoppers_done = threading.Event()
+
+        def shopper():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        customer = pending.pop()
+                    start = time.perf_counter()
+                    error = self._checkout(client, customer, menu_items, gateway, options['webhooks'], confirm_timings)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        if error:
+                            failures.append(error)
+                        else:
+                            timings.append(elapsed)
+            finally:
+                connection.close()
+
+        def worker():
+            try:
+                while not shoppers_done.is_set():
+                    if not process_pending_events():
+                        time.sleep(0.05)
+            finally:
+                connection.close()
+
+        try:
+            threads = [threading.Thread(target=shopper) for _ in range(options['concurrency'])]
+            worker_thread = threading.Thread(target=worker) if options['webhooks'] else None
+            start = time.perf_counter()
+            if worker_thread:
+                worker_thread.start()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - start
+            shoppers_done.set()
+            if worker_thread:
+                worker_thread.join()
+
+            orders = Order.objects.filter(user__in=customers).count()
+            self.stdout.write(f'Gateway: fake, latency {options["latency"] * 1000:.0f} ms '
+                              f'(+{options["jitter"] * 1000:.0f} ms jitter), failure rate {options["failure_rate"]:.0%}')
+            self.stdout.write(f'Finalized by: {"webhook worker" if options["webhooks"] else "confirm_payment"}')
+            self.stdout.write(f'Checkouts: {options["checkouts"]}, concurrency: {options["concurrency"]}')
+            self.stdout.write(f'Orders created: {orders}, failed checkouts: {len(failures)}')
+            self.stdout.write(f'Gateway calls: {gateway.calls} ({gateway.calls / max(len(customers), 1):.2f} per checkout)')
+            self.stdout.write(f'Throughput: {len(timings) / wall:.1f} checkouts/s over {wall:.2f} s')
+            if timings:
+                timings.sort()
+                self.stdout.write(f'Checkout to order: {self._percentiles(timings)}')
+            if confirm_timings:
+                self.stdout.write(f'Each confirm_payment request: {self._percentiles(confirm_timings)}')
+            if options['webhooks']:
+                retried = GatewayEvent.objects.filter(payment_intent_id__in=intent_ids, attempts__gt=1).count()
+                self.stdout.write(f'Events that needed a retry: {retried}')
+            if failures:
+                self.stdout.write(f'First failure: {failures[0]}')
+            self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (benchmark data was removed)'))
+        finally:
+            Order.objects.filter(user__in=customers).delete()
+            GatewayEvent.objects.filter(payment_intent_id__in=intent_ids).delete()
+            User.objects.filter(username__startswith='bench-gw-').filter(username__contains=run_id).delete()
+
+    def _percentiles(self, timings):
+        timings = sorted(timings)
+        return (f'median {statistics.median(timings) * 1000:.0f} ms, '
+                f'p95 {timings[max(int(len(timings) * 0.95) - 1, 0)] * 1000:.0f} ms, max {timings[-1] * 1000:.0f} ms')
+
+    def _checkout(self, client, customer, menu_items, gateway, webhooks, confirm_timings):
+        """Run one shopper through checkout; return an error message or None"""
+        Cart.objects.bulk_create([Cart(user=customer, menu_item=item, quantity=1) for item in menu_items])
+        client.force_login(customer)
+        session = client.session
+        session['delivery_address'] = 'Benchmark address'
+        session['phone'] = '9999999999'
+        session.save()
+
+        response = client.get(reverse('orders:checkout'))
+        if response.status_code != 200:
+            return f'checkout page returned {response.status_code}'
+        intent = client.post(reverse('orders:create_payment_intent')).json()
+        if 'error' in intent:
+            return f'create_payment_intent: {intent["error"]}'
+        if webhooks:
+            # The gateway notifies us as soon as the payment goes through
+            payload, signature = gateway.build_event(intent['paymentIntentId'])
+            client.post(reverse('payments:gateway_webhook'), payload, content_type='application/json',
+                        **{f'HTTP_{gateway.signature_header.upper().replace("-", "_")}': signature})
+
+        while True:
+            start = time.perf_counter()
+            response = client.post(
+                reverse('orders:confirm_payment'),
+                {'payment_intent_id': intent['paymentIntentId']},
+                content_type='application/json',
+            )
+            confirm_timings.append(time.perf_counter() - start)
+            if response.status_code != 202:
+                break
+            time.sleep(0.1)
+        result = response.json()
+        if not result.get('success'):
+            return f'confirm_payment: {result.get("error")}'
+        return None
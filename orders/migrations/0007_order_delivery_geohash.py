@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:51
+
+import math
+from django.db import migrations, models
+
+
+# foodify_project.geo.encode_geohash when this migration was written, without NumPy
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=9):
+    bits = 5 * precision
+    lat_bits, lng_bits = bits // 2, bits - bits // 2
+    lat_index = min(max(math.floor((float(latitude) + 90.0) / 180.0 * (1 << lat_bits)), 0), (1 << lat_bits) - 1)
+    lng_index = min(max(math.floor((float(longitude) + 180.0) / 360.0 * (1 << lng_bits)), 0), (1 << lng_bits) - 1)
+    # Bits interleaved starting with longitude
+    value = 0
+    for bit in range(lng_bits):
+        value |= ((lng_index >> (lng_bits - 1 - bit)) & 1) << (bits - 1 - 2 * bit)
+    for bit in range(lat_bits):
+        value |= ((lat_index >> (lat_bits - 1 - bit)) & 1) << (bits - 2 - 2 * bit)
+    return ''.join(GEOHASH_ALPHABET[(value >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+
+def backfill_delivery_geohash(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    alias = schema_editor.connection.alias
+    rows = list(Order.objects.using(alias).filter(delivery_latitude__isnull=False, delivery_longitude__isnull=False).only('id', 'delivery_latitude', 'delivery_longitude'))
+    for row in rows:
+        row.delivery_geohash = encode_geohash(row.delivery_latitude, row.delivery_longitude)
+    Order.objects.using(alias).bulk_update(rows, ['delivery_geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_checkoutsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivery_geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Spatial index of the delivery location', max_length=12),
+        ),
+        migrations.RunPython(backfill_delivery_geohash, migrations.RunPython.noop),
+    ]
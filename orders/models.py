@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from restaurants.models import MenuItem, Restaurant
+from foodify_project.spatial import GeohashedModelMixin
 
 
 class Cart(models.Model):
@@ -23,8 +24,10 @@ class Cart(models.Model):
         return self.quantity * self.menu_item.price
 
 
-class Order(models.Model):
+class Order(GeohashedModelMixin, models.Model):
     """Orders placed by users"""
+    GEOHASH_FIELDS = {'delivery_geohash': ('delivery_latitude', 'delivery_longitude')}
+    
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
@@ -60,6 +63,7 @@ class Order(models.Model):
     # Location tracking fields
     delivery_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text='Customer delivery location latitude')
     delivery_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text='Customer delivery location longitude')
+    delivery_geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False, help_text='Spatial index of the delivery location')
     restaurant_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text='Restaurant location latitude')
     restaurant_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text='Restaurant location longitude')
     
@@ -83,6 +87,11 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of order history and owner order listings
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['restaurant', '-created_at', '-id'], name='order_restaurant_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
@@ -108,6 +117,47 @@ class OrderItem(models.Model):
         return self.quantity * self.price
 
 
+class CheckoutSession(models.Model):
+    """
+    A checkout waiting for payment, keyed by its payment intent.
+    Holds what is needed to build the order once the gateway reports the
+    payment, whether that happens in the request or in the event worker.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Awaiting Payment'),
+        ('paid', 'Paid'),
+        ('failed', 'Payment Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='checkout_sessions')
+    payment_intent_id = models.CharField(max_length=255, unique=True)
+    delivery_address = models.TextField()
+    phone = models.CharField(max_length=20, blank=True)
+
+    subtotal = models.DecimalField(max_digits=8, decimal_places=2)
+    delivery_fee = models.DecimalField(max_digits=6, decimal_places=2)
+    tax_amount = models.DecimalField(max_digits=6, decimal_places=2)
+    total_amount = models.DecimalField(max_digits=8, decimal_places=2)
+    # Copy of the cart lines the payment is for (see orders.checkout.cart_lines)
+    items = models.JSONField(default=list, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='checkout_sessions')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Checkout {self.payment_intent_id} - {self.user.username} ({self.status})"
+
+    @property
+    def totals(self):
+        return self.subtotal, self.delivery_fee, self.tax_amount, self.total_amount
+
+
 from payments.models import BasePayment
 
 
@@ -0,0 +1,70 @@
+"""
+Order state machine.
+
+Every lifecycle change is a single conditional UPDATE (compare-and-set):
+the WHERE clause carries the allowed source statuses and guard conditions,
+so when two requests race for the same order exactly one of them matches
+the row and wins. No row is read and re-saved in Python.
+"""
+from django.db import transaction
+from django.utils import timezone
+from .models import Order
+from .tracking import publish_status
+
+
+AWAITING_PICKUP = ('confirmed', 'preparing')
+
+# name -> allowed source statuses ('from'), target status ('to'), lifecycle
+# timestamp stamped on success ('timestamp'), extra guard conditions ('where')
+# and fixed column values written on success ('set').
+TRANSITIONS = {
+    # Delivery agent actions
+    'accept': {'from': AWAITING_PICKUP, 'where': {'delivery_agent__isnull': True}},
+    'reject': {'from': AWAITING_PICKUP, 'where': {'picked_at__isnull': True}, 'set': {'delivery_agent': None}},
+    'pick_up': {'from': AWAITING_PICKUP, 'to': 'out_for_delivery', 'timestamp': 'picked_at'},
+    'deliver': {'from': ('out_for_delivery',), 'to': 'delivered', 'timestamp': 'delivered_at'},
+    # Restaurant owner actions
+    'confirm': {'from': ('pending',), 'to': 'confirmed', 'timestamp': 'confirmed_at'},
+    'prepare': {'from': ('pending', 'confirmed'), 'to': 'preparing'},
+    'dispatch': {'from': AWAITING_PICKUP, 'to': 'out_for_delivery', 'timestamp': 'picked_at'},
+    'complete': {'from': ('out_for_delivery',), 'to': 'delivered', 'timestamp': 'delivered_at'},
+    'cancel': {'from': ('pending', 'confirmed', 'preparing'), 'to': 'cancelled'},
+}
+
+# Status picked in the owner's dropdown -> transition that reaches it
+OWNER_TRANSITIONS = {
+    'confirmed': 'confirm',
+    'preparing': 'prepare',
+    'out_for_delivery': 'dispatch',
+    'delivered': 'complete',
+    'cancelled': 'cancel',
+}
+
+
+def transition(order_id, name, scope=None, values=None):
+    """
+    Apply the named transition to one order and return True if this call won.
+
+    `scope` adds ownership filters (e.g. {'delivery_agent': user}) and
+    `values` adds columns to write alongside the transition (e.g. assigning
+    the accepting agent). Returns False when the order is missing, out of
+    scope, or no longer in an allowed source state.
+    """
+    spec = TRANSITIONS[name]
+    now = timezone.now()
+
+    queryset = Order.objects.filter(pk=order_id, status__in=spec['from'], **spec.get('where', {}))
+    if scope:
+        queryset = queryset.filter(**scope)
+
+    updates = {'updated_at': now, **spec.get('set', {}), **(values or {})}
+    if spec.get('to'):
+        updates['status'] = spec['to']
+    if spec.get('timestamp'):
+        updates[spec['timestamp']] = now
+
+    won = queryset.update(**updates) == 1
+    if won and spec.get('to'):
+        # Only once the change is committed: callers may roll it back
+        transaction.on_commit(lambda: publish_status(order_id, spec['to'], now))
+    return won
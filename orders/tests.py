@@ -1,3 +1,388 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from delivery.models import EarningEntry
+from payment_system.events import process_pending_events, record_event
+from payment_system.gateways import get_gateway
+from restaurants.models import MenuItem, Restaurant
+from .cart_storage import DatabaseCartBackend
+from .checkout import finalize_checkout
+from .models import Cart, CheckoutSession, Order
+from .state_machine import transition
+from .tracking import live_tracking_state
 
-# Create your tests here.
+
+class CartApiTests(TestCase):
+    """JSON cart mutations"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='owner')
+        restaurant = Restaurant.objects.create(owner=owner, name='Paradise', cuisine='Hyderabadi',
+                                               location='Hyderabad', description='Biryani')
+        self.biryani = MenuItem.objects.create(restaurant=restaurant, name='Chicken Biryani',
+                                               price=Decimal('100'), description='')
+        self.user = User.objects.create_user(username='customer', password='secret')
+        self.client.login(username='customer', password='secret')
+
+    def post(self, name, data=None):
+        return self.client.post(reverse(f'orders:{name}', args=[self.biryani.id]), data or {})
+
+    def test_add_inserts_then_increments_the_line(self):
+        self.assertEqual(self.post('api_add_to_cart').json()['line']['quantity'], 1)
+        data = self.post('api_add_to_cart').json()
+        self.assertEqual(data['line'], {'menu_item_id': self.biryani.id, 'name': 'Chicken Biryani',
+                                        'quantity': 2, 'subtotal': '200.00'})
+        self.assertEqual(data['cart'], {'line_count': 1, 'item_count': 2, 'subtotal': '200.00',
+                                        'delivery_fee': '40.00', 'tax': '10.00', 'total': '250.00'})
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 2)
+
+    def test_add_racing_another_insert_of_the_line(self):
+        increment = DatabaseCartBackend._increment
+        raced = []
+
+        def insert_meanwhile(backend, menu_item_id, delta):
+            if not raced:
+                # Another request inserts the line between our UPDATE and INSERT
+                raced.append(Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=1))
+                return 0
+            return increment(backend, menu_item_id, delta)
+
+        with mock.patch.object(DatabaseCartBackend, '_increment', autospec=True, side_effect=insert_meanwhile):
+            self.assertEqual(self.post('api_add_to_cart').json()['line']['quantity'], 2)
+        # Our insert hit the unique constraint and fell back to incrementing their line
+        self.assertEqual(list(Cart.objects.filter(user=self.user).values_list('quantity', flat=True)), [2])
+
+    def test_decrease_updates_the_line(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=3)
+        self.assertEqual(self.post('api_update_cart', {'action': 'decrease'}).json()['line']['quantity'], 2)
+        self.assertEqual(self.post('api_update_cart', {'action': 'increase'}).json()['line']['quantity'], 3)
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 3)
+
+    def test_decreasing_the_last_one_removes_the_line(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=1)
+        data = self.post('api_update_cart', {'action': 'decrease'}).json()
+        self.assertEqual(data['line']['quantity'], 0)
+        self.assertEqual(data['cart']['line_count'], 0)
+        self.assertEqual(data['cart']['total'], '0.00')
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        # Nothing left to decrease
+        self.assertEqual(self.post('api_update_cart', {'action': 'decrease'}).status_code, 404)
+
+    def test_invalid_action(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=1)
+        self.assertEqual(self.post('api_update_cart', {'action': 'double'}).status_code, 400)
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 1)
+
+    def test_remove(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=4)
+        self.assertEqual(self.post('api_remove_from_cart').json()['cart']['item_count'], 0)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(self.post('api_remove_from_cart').status_code, 404)
+
+
+class CartBackendTests(TestCase):
+    """Carts kept outside the Cart table, and moving between backends"""
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(username='owner')
+        restaurant = Restaurant.objects.create(owner=owner, name='Paradise', cuisine='Hyderabadi',
+                                               location='Hyderabad', description='Biryani')
+        self.biryani = MenuItem.objects.create(restaurant=restaurant, name='Chicken Biryani',
+                                               price=Decimal('100'), description='')
+        self.raita = MenuItem.objects.create(restaurant=restaurant, name='Raita', price=Decimal('20'),
+                                             description='')
+        self.user = User.objects.create_user(username='customer', password='secret')
+
+    def login(self, client=None):
+        client = client or self.client
+        client.login(username='customer', password='secret')
+        return client
+
+    def add(self, menu_item, client=None):
+        return (client or self.client).post(reverse('orders:api_add_to_cart', args=[menu_item.id])).json()
+
+    def cart_lines(self, client=None):
+        response = (client or self.client).get(reverse('orders:view_cart'))
+        return [(line.menu_item.name, line.quantity) for line in response.context['cart_items']]
+
+    @override_settings(CART_BACKEND='orders.cart_storage.SessionCartBackend')
+    def test_session_cart_adopts_database_rows_at_login(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=2)
+        self.login()
+        self.assertEqual(self.cart_lines(), [('Chicken Biryani', 2)])
+        self.assertEqual(self.client.session['cart'], {str(self.biryani.id): 2})
+        self.assertFalse(Cart.objects.exists())
+
+    @override_settings(CART_BACKEND='orders.cart_storage.SessionCartBackend')
+    def test_session_cart_writes_rows_only_when_persisted(self):
+        self.login()
+        self.add(self.biryani)
+        self.assertEqual(self.add(self.biryani)['cart']['item_count'], 2)
+        self.add(self.raita)
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.cart_lines(), [('Chicken Biryani', 2), ('Raita', 1)])
+
+        # Checkout persists the cart for the payment to be built from
+        session = self.client.session
+        session.update({'delivery_address': 'Banjara Hills', 'phone': '9999999999'})
+        session.save()
+        self.assertEqual(self.client.get(reverse('orders:checkout')).status_code, 200)
+        with override_settings(PAYMENT_GATEWAY='payment_system.gateways.FakeGateway',
+                               PAYMENT_GATEWAY_OPTIONS={'auto_succeed': False}):
+            self.assertEqual(self.client.post(reverse('orders:create_payment_intent')).status_code, 200)
+        self.assertEqual(sorted(Cart.objects.filter(user=self.user).values_list('menu_item__name', 'quantity')),
+                         [('Chicken Biryani', 2), ('Raita', 1)])
+
+    @override_settings(CART_BACKEND='orders.cart_storage.CacheCartBackend')
+    def test_cache_cart_follows_the_user_across_sessions(self):
+        self.login()
+        self.add(self.biryani)
+        self.assertFalse(Cart.objects.exists())
+        other_device = self.login(self.client_class())
+        self.assertEqual(self.cart_lines(other_device), [('Chicken Biryani', 1)])
+
+    def test_database_cart_imports_a_session_cart(self):
+        self.login()
+        session = self.client.session
+        session['cart'] = {str(self.biryani.id): 2, str(self.raita.id): 1}
+        session.save()
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=1)
+        self.assertEqual(sorted(self.cart_lines()), [('Chicken Biryani', 3), ('Raita', 1)])
+        self.assertNotIn('cart', self.client.session)
+        # Only once
+        self.assertEqual(sorted(self.cart_lines()), [('Chicken Biryani', 3), ('Raita', 1)])
+
+    def test_database_cart_lines_survive_logging_out(self):
+        self.login()
+        self.add(self.biryani)
+        self.client.logout()
+        self.login()
+        self.assertEqual(self.cart_lines(), [('Chicken Biryani', 1)])
+
+
+@override_settings(
+    PAYMENT_GATEWAY='payment_system.gateways.FakeGateway',
+    PAYMENT_GATEWAY_OPTIONS={'auto_succeed': False},
+    PAYMENT_ASYNC_CONFIRMATION=False,
+)
+class CheckoutTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner')
+        self.restaurant = Restaurant.objects.create(owner=owner, name='Paradise', cuisine='Hyderabadi',
+                                                    location='Hyderabad', description='Biryani')
+        self.biryani = MenuItem.objects.create(restaurant=self.restaurant, name='Chicken Biryani',
+                                               price=Decimal('100'), description='')
+        self.raita = MenuItem.objects.create(restaurant=self.restaurant, name='Raita',
+                                             price=Decimal('20'), description='')
+        self.user = User.objects.create_user(username='customer', password='secret')
+        self.client.login(username='customer', password='secret')
+        session = self.client.session
+        session['delivery_address'] = 'Banjara Hills'
+        session['phone'] = '9999999999'
+        session.save()
+        self.gateway = get_gateway()
+        self.gateway.calls = 0
+
+    def start_checkout(self):
+        """Open the checkout page and create its payment intent; returns the intent id"""
+        self.assertEqual(self.client.get(reverse('orders:checkout')).status_code, 200)
+        return self.client.post(reverse('orders:create_payment_intent')).json()['paymentIntentId']
+
+    def confirm(self, payment_intent_id):
+        return self.client.post(reverse('orders:confirm_payment'), json.dumps({'payment_intent_id': payment_intent_id}),
+                                content_type='application/json')
+
+    def test_reloading_checkout_reuses_the_intent(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=2)
+        self.assertEqual(self.start_checkout(), self.start_checkout())
+        self.assertEqual(self.gateway.calls, 1)
+
+    def test_finalized_intent_is_not_reused(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=2)
+        payment_intent_id = self.start_checkout()
+        # The event worker finalizes the payment before the browser confirms it
+        self.gateway.succeed(payment_intent_id)
+        finalize_checkout(CheckoutSession.objects.get(payment_intent_id=payment_intent_id), self.gateway)
+
+        # Same amount as the paid cart, so only the checkout's status tells them apart
+        Cart.objects.create(user=self.user, menu_item=self.raita, quantity=10)
+        new_intent_id = self.start_checkout()
+        self.assertNotEqual(new_intent_id, payment_intent_id)
+        self.assertEqual(self.client.session['checkout_payment_intent_id'], new_intent_id)
+        self.assertEqual(CheckoutSession.objects.get(payment_intent_id=new_intent_id).status, 'open')
+
+        # Confirming the new intent orders the new cart
+        self.gateway.succeed(new_intent_id)
+        self.assertEqual(self.confirm(new_intent_id).status_code, 200)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(list(Order.objects.latest('id').items.values_list('name', flat=True)), ['Raita'])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_order_contains_what_was_paid_for(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=2)
+        payment_intent_id = self.start_checkout()
+        # Added in another tab after the intent was created for the biryani
+        Cart.objects.create(user=self.user, menu_item=self.raita, quantity=1)
+        Cart.objects.filter(menu_item=self.biryani).update(quantity=3)
+        self.gateway.succeed(payment_intent_id)
+        self.assertEqual(self.confirm(payment_intent_id).status_code, 200)
+
+        order = Order.objects.get()
+        self.assertEqual([(item.name, item.quantity) for item in order.items.all()], [('Chicken Biryani', 2)])
+        self.assertEqual(order.total_amount, Decimal('200'))
+        self.assertEqual(sorted(Cart.objects.filter(user=self.user).values_list('menu_item__name', 'quantity')),
+                         [('Chicken Biryani', 1), ('Raita', 1)])
+
+    @override_settings(CART_BACKEND='orders.cart_storage.SessionCartBackend')
+    def test_session_cart_keeps_lines_added_after_paying(self):
+        self.client.post(reverse('orders:add_to_cart', args=[self.biryani.id]))
+        payment_intent_id = self.start_checkout()
+        self.client.post(reverse('orders:add_to_cart', args=[self.biryani.id]))
+        self.client.post(reverse('orders:add_to_cart', args=[self.raita.id]))
+        self.gateway.succeed(payment_intent_id)
+        self.assertEqual(self.confirm(payment_intent_id).status_code, 200)
+
+        self.assertEqual(Order.objects.get().items.get().quantity, 1)
+        self.assertEqual(self.client.session['cart'], {str(self.biryani.id): 1, str(self.raita.id): 1})
+
+    def test_cart_changed_since_checkout_page(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=2)
+        self.client.get(reverse('orders:checkout'))
+        Cart.objects.create(user=self.user, menu_item=self.raita, quantity=1)
+        response = self.client.post(reverse('orders:create_payment_intent'))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.gateway.calls, 0)
+
+    @override_settings(PAYMENT_ASYNC_CONFIRMATION=True, PAYMENT_WEBHOOK_GRACE_SECONDS=60)
+    def test_declined_card_retried_on_the_same_intent(self):
+        Cart.objects.create(user=self.user, menu_item=self.biryani, quantity=2)
+        payment_intent_id = self.start_checkout()
+        payload, signature = self.gateway.build_event(payment_intent_id, 'payment_intent.payment_failed')
+        record_event(self.gateway.parse_event(payload, signature))
+        process_pending_events()
+        self.assertEqual(CheckoutSession.objects.get().status, 'failed')
+        # Still declined: no need to wait for a webhook to say so
+        self.assertEqual(self.confirm(payment_intent_id).status_code, 400)
+
+        # The retry with another card succeeds on the same intent
+        self.gateway.succeed(payment_intent_id)
+        response = self.confirm(payment_intent_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['order_id'], Order.objects.get().id)
+        self.assertEqual(CheckoutSession.objects.get().status, 'paid')
+
+
+class TransitionTests(TestCase):
+    """The compare-and-set state machine behind every status change"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='owner')
+        restaurant = Restaurant.objects.create(owner=owner, name='Paradise', cuisine='Hyderabadi',
+                                               location='Hyderabad', description='Biryani')
+        self.agent = User.objects.create_user(username='agent')
+        self.order = Order.objects.create(user=User.objects.create_user(username='customer'), restaurant=restaurant,
+                                          total_amount=Decimal('200'), delivery_address='Banjara Hills',
+                                          status='confirmed')
+
+    def test_racing_transitions_have_one_winner(self):
+        # Both requests loaded the order as confirmed; only the first UPDATE still matches it
+        rival = User.objects.create_user(username='rival')
+        self.assertTrue(transition(self.order.id, 'accept', values={'delivery_agent': self.agent}))
+        self.assertFalse(transition(self.order.id, 'accept', values={'delivery_agent': rival}))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.delivery_agent, self.agent)
+
+    def test_racing_status_changes_have_one_winner(self):
+        self.assertTrue(transition(self.order.id, 'cancel'))
+        self.assertFalse(transition(self.order.id, 'dispatch'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertIsNone(self.order.picked_at)
+
+    def test_timestamp_is_stamped_on_success(self):
+        self.assertTrue(transition(self.order.id, 'dispatch'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'out_for_delivery')
+        self.assertIsNotNone(self.order.picked_at)
+
+    def test_scope_limits_who_can_transition(self):
+        Order.objects.filter(pk=self.order.pk).update(delivery_agent=self.agent)
+        rival = User.objects.create_user(username='rival')
+        self.assertFalse(transition(self.order.id, 'pick_up', scope={'delivery_agent': rival}))
+        self.assertTrue(transition(self.order.id, 'pick_up', scope={'delivery_agent': self.agent}))
+
+    def test_missing_order(self):
+        self.assertFalse(transition(self.order.id + 1, 'cancel'))
+
+
+class OwnerStatusTests(TestCase):
+    """Restaurant owners moving their orders through OWNER_TRANSITIONS"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='secret')
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name='Paradise', cuisine='Hyderabadi',
+                                                    location='Hyderabad', description='Biryani')
+        self.customer = User.objects.create_user(username='customer')
+        self.agent = User.objects.create_user(username='agent')
+        self.client.login(username='owner', password='secret')
+
+    def create_order(self, **fields):
+        return Order.objects.create(user=self.customer, restaurant=self.restaurant, total_amount=Decimal('200'),
+                                    delivery_fee=Decimal('40'), delivery_address='Banjara Hills', **fields)
+
+    def set_status(self, order, status):
+        self.client.post(reverse('orders:update_order_status', args=[order.id]), {'status': status})
+        order.refresh_from_db()
+        return order.status
+
+    def test_owner_transitions(self):
+        cases = [
+            ('pending', 'confirmed', 'confirmed'),
+            ('pending', 'preparing', 'preparing'),
+            ('confirmed', 'preparing', 'preparing'),
+            ('preparing', 'out_for_delivery', 'out_for_delivery'),
+            ('confirmed', 'cancelled', 'cancelled'),
+            # Not allowed from the current status
+            ('pending', 'delivered', 'pending'),
+            ('preparing', 'confirmed', 'preparing'),
+            ('out_for_delivery', 'cancelled', 'out_for_delivery'),
+            ('delivered', 'cancelled', 'delivered'),
+            ('cancelled', 'confirmed', 'cancelled'),
+            # Not an owner action, or not a status at all
+            ('confirmed', 'pending', 'confirmed'),
+            ('confirmed', 'shipped', 'confirmed'),
+        ]
+        for current, requested, expected in cases:
+            with self.subTest(current=current, requested=requested):
+                order = self.create_order(status=current)
+                self.assertEqual(self.set_status(order, requested), expected)
+
+    def test_other_owners_orders_are_not_found(self):
+        User.objects.create_user(username='other', password='secret')
+        self.client.login(username='other', password='secret')
+        order = self.create_order(status='pending')
+        response = self.client.post(reverse('orders:update_order_status', args=[order.id]), {'status': 'confirmed'})
+        self.assertEqual(response.status_code, 404)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+
+    def test_delivered_order_is_recorded_in_the_earnings_ledger(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        self.assertEqual(self.set_status(order, 'delivered'), 'delivered')
+        self.assertTrue(EarningEntry.objects.filter(order=order).exists())
+
+    def test_ledger_failure_rolls_back_the_status_change(self):
+        order = self.create_order(status='out_for_delivery', delivery_agent=self.agent)
+        with mock.patch('orders.views.record_delivery', side_effect=RuntimeError('ledger down')), \
+                self.assertRaises(RuntimeError):
+            self.set_status(order, 'delivered')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'out_for_delivery')
+        # Tracking pages were not told about the status that was rolled back
+        self.assertEqual(live_tracking_state(order)['status'], 'out_for_delivery')
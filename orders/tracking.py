@@ -0,0 +1,63 @@
+"""
+Live order tracking state for customers.
+
+A tracking snapshot is the order's status plus the agent's latest fix.
+The tracking stream sends a snapshot only when it changes. The JSON
+endpoint tags each snapshot with an ETag so unchanged polls get a 304.
+Status changes made through the state machine are published to the cache,
+so an open stream notices them without re-reading the order. A published
+status is only trusted if it is newer than the order row it is compared
+with, so one left behind by an older change never overrides the database.
+"""
+import hashlib
+import json
+from datetime import datetime
+from django.core.cache import cache
+from delivery.location_store import get_location
+
+
+# Statuses after which nothing about the order changes any more
+FINAL_STATUSES = ('delivered', 'cancelled')
+
+
+def _status_key(order_id):
+    return f'orders:tracking:status:{order_id}'
+
+
+def publish_status(order_id, status, changed_at):
+    """Tell open tracking streams that an order moved to a new status"""
+    cache.set(_status_key(order_id), (status, changed_at.isoformat()), 3600)
+
+
+def tracking_state(order, status=None):
+    """
+    Snapshot of what the tracking page shows. `status` overrides the order's
+    stored status (e.g. one read from the published status).
+    """
+    status = status or order.status
+    state = {'status': status, 'latitude': None, 'longitude': None, 'updated_at': None}
+    if status == 'out_for_delivery':
+        location = get_location(order.id)
+        if location and (order.agent_location_updated_at is None or location.updated_at >= order.agent_location_updated_at):
+            state.update(location.as_dict())
+        elif order.agent_current_latitude:
+            state.update({
+                'latitude': str(order.agent_current_latitude),
+                'longitude': str(order.agent_current_longitude),
+                'updated_at': order.agent_location_updated_at.isoformat() if order.agent_location_updated_at else None,
+            })
+    return state
+
+
+def live_tracking_state(order):
+    """Like tracking_state, but with the latest published status if it is newer than the loaded order"""
+    published = cache.get(_status_key(order.id))
+    status = None
+    if published and datetime.fromisoformat(published[1]) >= order.updated_at:
+        status = published[0]
+    return tracking_state(order, status)
+
+
+def tracking_etag(state):
+    digest = hashlib.md5(json.dumps(state, sort_keys=True).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
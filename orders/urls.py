@@ -14,6 +14,7 @@ urlpatterns = [
     path('<int:order_id>/', views.order_detail, name='order_detail'),
     path('<int:order_id>/track/', views.track_order, name='track_order'),
     path('<int:order_id>/agent-location/', views.get_agent_location, name='get_agent_location'),
+    path('<int:order_id>/track/stream/', views.track_order_stream, name='track_order_stream'),
     # Restaurant owner order management
     path('manage/', views.owner_orders, name='owner_orders'),
     path('manage/<int:order_id>/', views.owner_order_detail, name='owner_order_detail'),
@@ -25,4 +26,8 @@ urlpatterns = [
     # Stripe API endpoints
     path('api/create-payment-intent/', views.create_payment_intent, name='create_payment_intent'),
     path('api/confirm-payment/', views.confirm_payment, name='confirm_payment'),
+    # Cart JSON API
+    path('api/cart/add/<int:item_id>/', views.api_add_to_cart, name='api_add_to_cart'),
+    path('api/cart/update/<int:item_id>/', views.api_update_cart, name='api_update_cart'),
+    path('api/cart/remove/<int:item_id>/', views.api_remove_from_cart, name='api_remove_from_cart'),
 ]
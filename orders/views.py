@@ -1,16 +1,34 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Count
 from decimal import Decimal
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-import stripe
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
 import json
-from .models import Cart, Order, OrderItem, Payment
-from restaurants.models import Restaurant, MenuItem
+from time import monotonic, sleep
+from .models import Order, CheckoutSession, Payment
+from .checkout import (
+    place_order_from_cart, finalize_checkout, cart_lines, summarize_lines, EmptyCartError, PaymentNotCompleted,
+)
+from .cart import get_cart_summary
+from .cart_storage import get_cart
+from .pagination import keyset_paginate
+from .state_machine import OWNER_TRANSITIONS, transition
+from .tracking import FINAL_STATUSES, live_tracking_state, tracking_etag, tracking_state
+from restaurants.models import MenuItem
+from delivery.earnings import record_delivery
+from delivery.location_store import apply_live_location
+from payment_system import metrics
+from payment_system.gateways import get_gateway, PaymentGatewayError
+from payment_system.idempotency import IdempotencyConflict
+from payment_system.models import PaymentIdempotencyKey
 from payments import get_payment_model
 
 
@@ -18,17 +36,7 @@ from payments import get_payment_model
 def add_to_cart(request, item_id):
     """Add menu item to cart"""
     menu_item = get_object_or_404(MenuItem, id=item_id)
-    
-    # Get or create cart item
-    cart_item, created = Cart.objects.get_or_create(
-        user=request.user,
-        menu_item=menu_item,
-        defaults={'quantity': 1}
-    )
-    
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    get_cart(request).add(menu_item)
     
     messages.success(request, f'{menu_item.name} added to cart!')
     return redirect(request.META.get('HTTP_REFERER', 'restaurants:list'))
@@ -37,47 +45,40 @@ def add_to_cart(request, item_id):
 @login_required
 def view_cart(request):
     """View shopping cart with recent orders"""
-    from orders.models import Order
-    
-    cart_items = Cart.objects.filter(user=request.user).select_related('menu_item', 'menu_item__restaurant')
+    cart_items = get_cart(request).lines()
     
     # Get recent orders (last 5)
-    recent_orders = Order.objects.filter(user=request.user).order_by('-created_at')[:5]
+    recent_orders = Order.objects.filter(user=request.user).annotate(item_count=Count('items')).order_by('-created_at')[:5]
     
-    # Calculate totals
-    subtotal = sum(item.menu_item.price * item.quantity for item in cart_items)
-    delivery_fee = Decimal('40.00') if cart_items.exists() else Decimal('0.00')
-    tax = subtotal * Decimal('0.05')  # 5% tax
-    total = subtotal + delivery_fee + tax
+    # Calculate totals from the loaded lines (shared with the navbar badge)
+    summary = get_cart_summary(request, cart_items)
     
     context = {
         'cart_items': cart_items,
         'recent_orders': recent_orders,
-        'subtotal': subtotal,
-        'delivery_fee': delivery_fee,
-        'tax': tax,
-        'total': total,
+        'subtotal': summary.subtotal,
+        'delivery_fee': summary.delivery_fee,
+        'tax': summary.tax,
+        'total': summary.total,
     }
     return render(request, 'orders/cart.html', context)
 
 
+CART_ACTIONS = {'increase': 1, 'decrease': -1}
+
+
 @login_required
 def update_cart(request, item_id):
     """Update cart item quantity"""
-    cart_item = get_object_or_404(Cart, id=item_id, user=request.user)
+    cart = get_cart(request)
+    if not cart.quantity(item_id):
+        raise Http404('Item is not in the cart')
     
     if request.method == 'POST':
         action = request.POST.get('action')
         
-        if action == 'increase':
-            cart_item.quantity += 1
-            cart_item.save()
-        elif action == 'decrease':
-            if cart_item.quantity > 1:
-                cart_item.quantity -= 1
-                cart_item.save()
-            else:
-                cart_item.delete()
+        if action in CART_ACTIONS:
+            if not cart.change_quantity(item_id, CART_ACTIONS[action]):
                 messages.success(request, 'Item removed from cart')
                 return redirect('orders:view_cart')
         
@@ -89,27 +90,84 @@ def update_cart(request, item_id):
 @login_required
 def remove_from_cart(request, item_id):
     """Remove item from cart"""
-    cart_item = get_object_or_404(Cart, id=item_id, user=request.user)
-    item_name = cart_item.menu_item.name
-    cart_item.delete()
-    messages.success(request, f'{item_name} removed from cart')
+    menu_item = get_object_or_404(MenuItem, id=item_id)
+    if not get_cart(request).remove(item_id):
+        raise Http404('Item is not in the cart')
+    messages.success(request, f'{menu_item.name} removed from cart')
     return redirect('orders:view_cart')
 
 
 @login_required
 def clear_cart(request):
     """Clear entire cart"""
-    Cart.objects.filter(user=request.user).delete()
+    get_cart(request).clear()
     messages.success(request, 'Cart cleared!')
     return redirect('orders:view_cart')
 
 
+# CART JSON API - same mutations as above, answered in place without a page reload
+def _cart_response(request, menu_item, quantity):
+    """JSON payload with the changed line and the refreshed cart totals"""
+    summary = get_cart_summary(request)
+    return JsonResponse({
+        'success': True,
+        'line': {
+            'menu_item_id': menu_item.id,
+            'name': menu_item.name,
+            'quantity': quantity,
+            'subtotal': f'{menu_item.price * quantity:.2f}',
+        },
+        'cart': {
+            'line_count': summary.line_count,
+            'item_count': summary.item_count,
+            'subtotal': f'{summary.subtotal:.2f}',
+            'delivery_fee': f'{summary.delivery_fee:.2f}',
+            'tax': f'{summary.tax:.2f}',
+            'total': f'{summary.total:.2f}',
+        },
+    })
+
+
+@login_required
+@require_POST
+def api_add_to_cart(request, item_id):
+    """Add one of a menu item to the cart"""
+    menu_item = get_object_or_404(MenuItem, id=item_id)
+    quantity = get_cart(request).add(menu_item)
+    return _cart_response(request, menu_item, quantity)
+
+
+@login_required
+@require_POST
+def api_update_cart(request, item_id):
+    """Increase or decrease a cart line; decreasing the last one removes it"""
+    delta = CART_ACTIONS.get(request.POST.get('action'))
+    if delta is None:
+        return JsonResponse({'success': False, 'error': 'Invalid action'}, status=400)
+    
+    menu_item = get_object_or_404(MenuItem, id=item_id)
+    cart = get_cart(request)
+    if not cart.quantity(item_id):
+        return JsonResponse({'success': False, 'error': 'Item is not in the cart'}, status=404)
+    
+    quantity = cart.change_quantity(item_id, delta)
+    return _cart_response(request, menu_item, quantity)
+
+
+@login_required
+@require_POST
+def api_remove_from_cart(request, item_id):
+    """Remove a line from the cart"""
+    menu_item = get_object_or_404(MenuItem, id=item_id)
+    if not get_cart(request).remove(item_id):
+        return JsonResponse({'success': False, 'error': 'Item is not in the cart'}, status=404)
+    return _cart_response(request, menu_item, 0)
+
+
 @login_required
 def place_order(request):
     """Redirect to checkout page"""
-    cart_items = Cart.objects.filter(user=request.user).select_related('menu_item', 'menu_item__restaurant')
-    
-    if not cart_items.exists():
+    if get_cart_summary(request).is_empty:
         messages.error(request, 'Your cart is empty!')
         return redirect('orders:view_cart')
     
@@ -132,11 +190,46 @@ def place_order(request):
     return redirect('orders:view_cart')
 
 
+def _filter_orders(request, orders):
+    """
+    Apply the status and date filters from the query string in SQL.
+    Returns the filtered queryset and the active filter values.
+    """
+    status = request.GET.get('status', '')
+    date_from = parse_date(request.GET.get('date_from', '') or '')
+    date_to = parse_date(request.GET.get('date_to', '') or '')
+    
+    if status in dict(Order.STATUS_CHOICES):
+        orders = orders.filter(status=status)
+    else:
+        status = ''
+    # Plain datetime ranges (rather than created_at__date) keep the index usable
+    if date_from:
+        orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        orders = orders.filter(created_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+    
+    filters = {
+        'status': status,
+        'date_from': date_from.isoformat() if date_from else '',
+        'date_to': date_to.isoformat() if date_to else '',
+    }
+    return orders, filters
+
+
 @login_required
 def order_history(request):
-    """View user's order history"""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'orders/order_history.html', {'orders': orders})
+    """View user's order history, one keyset page at a time"""
+    orders, filters = _filter_orders(request, Order.objects.filter(user=request.user))
+    page = keyset_paginate(orders.annotate(item_count=Count('items')), request.GET.get('cursor'))
+    
+    context = {
+        'orders': page,
+        'page': page,
+        'filters': filters,
+        'STATUS_CHOICES': Order.STATUS_CHOICES,
+    }
+    return render(request, 'orders/order_history.html', context)
 
 
 @login_required
@@ -159,29 +252,76 @@ def order_detail(request, order_id):
 @login_required
 def track_order(request, order_id):
     """Live order tracking with delivery agent location"""
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = apply_live_location(get_object_or_404(Order, id=order_id, user=request.user))
     order_items = order.items.all().select_related('menu_item')
     
     context = {
         'order': order,
         'order_items': order_items,
+        'live_tracking': order.status not in FINAL_STATUSES,
+        'tracking_stream': getattr(settings, 'TRACKING_STREAM_SECONDS', 55) > 0,
     }
     return render(request, 'orders/track_order.html', context)
 
 
 @login_required
 def get_agent_location(request, order_id):
-    """API endpoint to get delivery agent's current location"""
+    """
+    API endpoint to get the order status and delivery agent's current location
+    (live store first, then the order row). Supports conditional GET:
+    an unchanged snapshot answers If-None-Match with 304 and no body.
+    """
     order = get_object_or_404(Order, id=order_id, user=request.user)
+    state = tracking_state(order)
+    etag = tracking_etag(state)
     
-    if order.status != 'out_for_delivery' or not order.agent_current_latitude:
-        return JsonResponse({'latitude': None, 'longitude': None})
-    
-    return JsonResponse({
-        'latitude': str(order.agent_current_latitude),
-        'longitude': str(order.agent_current_longitude),
-        'updated_at': order.agent_location_updated_at.isoformat() if order.agent_location_updated_at else None
-    })
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(state)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def track_order_stream(request, order_id):
+    """
+    Server-Sent Events stream of tracking snapshots. A snapshot is sent only
+    when the status or agent location changes. The loop reads the cache, not
+    the database. The stream ends after TRACKING_STREAM_SECONDS or once the
+    order is finished, and EventSource reconnects on its own.
+    """
+    order = get_object_or_404(Order, id=order_id, user=request.user)
+    max_seconds = getattr(settings, 'TRACKING_STREAM_SECONDS', 55)
+    interval = getattr(settings, 'TRACKING_STREAM_INTERVAL', 1.0)
+    
+    def events():
+        # Ask the browser to wait a little before reconnecting
+        yield 'retry: 2000\n\n'
+        last_etag = request.headers.get('Last-Event-ID')
+        deadline = monotonic() + max_seconds
+        last_sent = monotonic()
+        while True:
+            state = live_tracking_state(order)
+            etag = tracking_etag(state)
+            if etag != last_etag:
+                yield f'id: {etag}\nevent: tracking\ndata: {json.dumps(state)}\n\n'
+                last_etag, last_sent = etag, monotonic()
+            elif monotonic() - last_sent >= 15:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                last_sent = monotonic()
+            if state['status'] in FINAL_STATUSES:
+                yield 'event: end\ndata: {}\n\n'
+                return
+            if monotonic() >= deadline:
+                return
+            sleep(interval)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
 
 
 # RESTAURANT OWNER VIEWS
@@ -192,15 +332,16 @@ def owner_orders(request):
         messages.error(request, 'Access denied. This page is for restaurant owners only.')
         return redirect('accounts:user_home')
     
-    # Get all restaurants owned by this user
-    restaurants = Restaurant.objects.filter(owner=request.user)
-    
-    # Get all orders for these restaurants
-    orders = Order.objects.filter(restaurant__in=restaurants).select_related('user', 'restaurant').prefetch_related('items').order_by('-created_at')
+    # Orders for all restaurants owned by this user, one keyset page at a time
+    orders, filters = _filter_orders(request, Order.objects.filter(restaurant__owner=request.user))
+    orders = orders.select_related('user', 'restaurant').annotate(item_count=Count('items'))
+    page = keyset_paginate(orders, request.GET.get('cursor'))
     
     context = {
-        'orders': orders,
-        'restaurants': restaurants,
+        'orders': page,
+        'page': page,
+        'filters': filters,
+        'STATUS_CHOICES': Order.STATUS_CHOICES,
     }
     return render(request, 'orders/owner_orders.html', context)
 
@@ -212,12 +353,19 @@ def update_order_status(request, order_id):
     
     if request.method == 'POST':
         new_status = request.POST.get('status')
-        if new_status in dict(Order.STATUS_CHOICES):
-            order.status = new_status
-            order.save()
-            messages.success(request, f'Order #{order.id} status updated to {order.get_status_display()}')
-        else:
+        with transaction.atomic():
+            moved = new_status in OWNER_TRANSITIONS and transition(
+                order.id, OWNER_TRANSITIONS[new_status], scope={'restaurant__owner': request.user}
+            )
+            if moved and new_status == 'delivered':
+                # The earnings ledger entry lands together with the status change
+                record_delivery(order.id)
+        if new_status not in dict(Order.STATUS_CHOICES):
             messages.error(request, 'Invalid status')
+        elif not moved:
+            messages.error(request, f'Order #{order.id} cannot be moved from {order.get_status_display()} to {dict(Order.STATUS_CHOICES)[new_status]}')
+        else:
+            messages.success(request, f'Order #{order.id} status updated to {dict(Order.STATUS_CHOICES)[new_status]}')
     
     return redirect('orders:owner_orders')
 
@@ -250,9 +398,9 @@ def owner_order_detail(request, order_id):
 @login_required
 def checkout(request):
     """Stripe Payment Element checkout page"""
-    cart_items = Cart.objects.filter(user=request.user).select_related('menu_item', 'menu_item__restaurant')
+    cart_items = get_cart(request).lines()
     
-    if not cart_items.exists():
+    if not cart_items:
         messages.error(request, 'Your cart is empty!')
         return redirect('orders:view_cart')
     
@@ -265,10 +413,7 @@ def checkout(request):
         return redirect('orders:view_cart')
     
     # Calculate totals
-    subtotal = sum(item.menu_item.price * item.quantity for item in cart_items)
-    delivery_fee = Decimal('40.00')
-    tax = subtotal * Decimal('0.05')
-    grand_total = subtotal + delivery_fee + tax
+    subtotal, delivery_fee, tax, grand_total = get_cart_summary(request, cart_items).as_totals()
     
     # Store cart info in session for payment confirmation
     request.session['checkout_amount'] = str(grand_total)
@@ -294,8 +439,6 @@ def checkout(request):
 def payment_success(request):
     """Handle successful payment"""
     import uuid
-    from django.conf import settings
-    from payment_system.models import PaymentTransaction
     
     payment_id = request.GET.get('payment_id')
     
@@ -314,71 +457,28 @@ def payment_success(request):
                 'grand_total': payment.total,
             })
         
-        # Get cart items
-        cart_items = Cart.objects.filter(user=request.user).select_related('menu_item', 'menu_item__restaurant')
-        
-        if not cart_items.exists():
-            messages.error(request, 'Cart is empty')
-            return redirect('orders:view_cart')
-        
         # Get delivery info from session
         delivery_address = request.session.get('delivery_address', '')
         phone = request.session.get('phone', '')
         
-        # Calculate totals
-        subtotal = sum(item.menu_item.price * item.quantity for item in cart_items)
-        delivery_fee = Decimal('40.00')
-        tax = subtotal * Decimal('0.05')
-        grand_total = subtotal + delivery_fee + tax
-        
-        from django.utils import timezone
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            restaurant=cart_items.first().menu_item.restaurant,
-            total_amount=subtotal,
-            delivery_fee=delivery_fee,
-            tax_amount=tax,
-            status='confirmed',  # Auto-confirm paid orders
-            confirmed_at=timezone.now(),  # AUTO TIMESTAMP: payment → confirmed
-            delivery_address=f"{delivery_address}\nPhone: {phone}",
-            payment_status='completed',
-            is_paid=True,
-        )
-        
-        # Create order items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                menu_item=cart_item.menu_item,
-                name=cart_item.menu_item.name,
-                price=cart_item.menu_item.price,
-                quantity=cart_item.quantity
-            )
-        
-        # Link payment to order
-        payment.order = order
-        payment.save()
-        
-        # Create payment transaction record
-        transaction = PaymentTransaction.objects.create(
-            order=order,
-            restaurant=order.restaurant,
-            customer=request.user,
-            transaction_id=f"TXN-{uuid.uuid4().hex[:12].upper()}",
-            payment_method='stripe',
-            amount=grand_total,
-            currency='INR',
-            status='completed',
-            gateway_response={'payment_id': payment_id}
-        )
-        transaction.mark_completed()
-        
+        # Create order, items and transaction record in one database transaction
         # Notifications will be automatically sent via signals
-        
-        # Clear cart
-        cart_items.delete()
+        cart = get_cart(request)
+        cart.persist()
+        try:
+            order, transaction = place_order_from_cart(
+                request.user,
+                f"{delivery_address}\nPhone: {phone}",
+                transaction_id=f"TXN-{uuid.uuid4().hex[:12].upper()}",
+                payment_method='stripe',
+                gateway_response={'payment_id': payment_id},
+                payment=payment,
+            )
+        except EmptyCartError:
+            messages.error(request, 'Cart is empty')
+            return redirect('orders:view_cart')
+        cart.mark_ordered()
+        grand_total = transaction.amount
         
         # Clear session
         request.session.pop('delivery_address', None)
@@ -408,13 +508,35 @@ def payment_cancel(request):
 
 
 # STRIPE PAYMENT ELEMENT API
-stripe.api_key = settings.STRIPE_SECRET_KEY
+
+
+# Session keys of the checkout in progress
+CHECKOUT_INTENT_KEYS = (
+    'checkout_payment_intent_id', 'checkout_payment_intent_secret', 'checkout_payment_intent_amount',
+    'checkout_confirm_started',
+)
+CHECKOUT_SESSION_KEYS = (
+    'delivery_address', 'phone',
+    'checkout_amount', 'checkout_subtotal', 'checkout_delivery_fee', 'checkout_tax',
+) + CHECKOUT_INTENT_KEYS
 
 
 @login_required
 @require_POST
 def create_payment_intent(request):
-    """Create a Stripe Payment Intent for checkout"""
+    """
+    Create a Stripe Payment Intent for checkout, or reuse the one already
+    created for this checkout session.
+    
+    Reloading the checkout page reuses the stored intent without calling
+    the gateway, as long as its checkout is still open. If the amount changed because the cart changed, the intent is
+    updated in place. A new intent is only created when there is none or
+    the old one can no longer be modified.
+    
+    The checkout (address, totals, a copy of the cart lines) is saved against
+    the intent so the order can be built without this session once the
+    payment arrives, and contains exactly what was paid for.
+    """
     try:
         # Get amount from session
         amount_str = request.session.get('checkout_amount')
@@ -425,21 +547,70 @@ def create_payment_intent(request):
         # Convert to smallest currency unit (paise for INR)
         amount_cents = int(amount * 100)
         
-        # Create Payment Intent with automatic payment methods
-        # This enables all payment methods available in your Stripe account (cards, UPI, wallets, etc.)
-        intent = stripe.PaymentIntent.create(
-            amount=amount_cents,
-            currency='inr',
-            automatic_payment_methods={'enabled': True},  # Enable all available payment methods
-            metadata={
-                'user_id': str(request.user.id),
-                'username': request.user.username,
-            }
+        cart = get_cart(request)
+        lines = cart_lines(cart.lines())
+        if summarize_lines(lines).total != amount:
+            # The cart changed after the checkout page computed the amount
+            return JsonResponse({'error': 'Your cart changed, please reload the checkout page'}, status=409)
+        
+        intent_id = request.session.get('checkout_payment_intent_id')
+        if intent_id and not CheckoutSession.objects.filter(payment_intent_id=intent_id, status='open').exists():
+            # Already paid (the event worker may have built its order) or failed:
+            # handing it out again would replay the old order for this cart
+            for key in CHECKOUT_INTENT_KEYS:
+                request.session.pop(key, None)
+            intent_id = None
+        
+        if intent_id and request.session.get('checkout_payment_intent_amount') == amount_cents:
+            metrics.increment(metrics.INTENT_REUSED)
+            client_secret = request.session['checkout_payment_intent_secret']
+        else:
+            gateway = get_gateway()
+            intent = None
+            if intent_id:
+                try:
+                    intent = gateway.update_intent_amount(intent_id, amount_cents)
+                    metrics.increment(metrics.INTENT_UPDATED)
+                except PaymentGatewayError:
+                    # Already succeeded or cancelled; start over with a fresh intent
+                    intent = None
+            
+            if intent is None:
+                # Intents enable all payment methods available in the account (cards, UPI, wallets, etc.)
+                intent = gateway.create_intent(
+                    amount_cents,
+                    currency='inr',
+                    metadata={
+                        'user_id': str(request.user.id),
+                        'username': request.user.username,
+                    }
+                )
+                metrics.increment(metrics.INTENT_CREATED)
+            
+            intent_id, client_secret = intent.id, intent.client_secret
+            # Remember the intent for the rest of this checkout session
+            request.session['checkout_payment_intent_id'] = intent_id
+            request.session['checkout_payment_intent_secret'] = client_secret
+            request.session['checkout_payment_intent_amount'] = amount_cents
+        
+        cart.persist()
+        CheckoutSession.objects.update_or_create(
+            payment_intent_id=intent_id,
+            defaults={
+                'items': lines,
+                'user': request.user,
+                'delivery_address': request.session.get('delivery_address', ''),
+                'phone': request.session.get('phone', ''),
+                'subtotal': Decimal(request.session.get('checkout_subtotal', '0')),
+                'delivery_fee': Decimal(request.session.get('checkout_delivery_fee', '0')),
+                'tax_amount': Decimal(request.session.get('checkout_tax', '0')),
+                'total_amount': amount,
+            },
         )
         
         return JsonResponse({
-            'clientSecret': intent.client_secret,
-            'paymentIntentId': intent.id
+            'clientSecret': client_secret,
+            'paymentIntentId': intent_id
         })
     
     except Exception as e:
@@ -449,102 +620,71 @@ def create_payment_intent(request):
 @login_required
 @require_POST
 def confirm_payment(request):
-    """Confirm payment and create order"""
+    """
+    Report whether a checkout's payment has become an order.
+    
+    Orders are normally built by the payment event worker from the gateway
+    webhook, so this is a cheap status poll. It returns the stored outcome
+    once there is one and 202 while the payment is still being finalized.
+    If no webhook has done the job within PAYMENT_WEBHOOK_GRACE_SECONDS of
+    the first poll (or async confirmation is off), the checkout is finalized
+    here instead. Either way an order is created at most once per payment intent.
+    A 'failed' checkout is only final if the gateway still says so.
+    """
     try:
         data = json.loads(request.body)
         payment_intent_id = data.get('payment_intent_id')
-        
-        if not payment_intent_id:
-            return JsonResponse({'error': 'Payment Intent ID required'}, status=400)
-        
-        # Verify Payment Intent with Stripe
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-        
-        if intent.status != 'succeeded':
-            return JsonResponse({'error': 'Payment not successful'}, status=400)
-        
-        # Get cart and session data
-        cart_items = Cart.objects.filter(user=request.user).select_related('menu_item', 'menu_item__restaurant')
-        
-        if not cart_items.exists():
-            return JsonResponse({'error': 'Cart is empty'}, status=400)
-        
-        # Get delivery info from session
-        delivery_address = request.session.get('delivery_address', '')
-        subtotal = Decimal(request.session.get('checkout_subtotal', '0'))
-        delivery_fee = Decimal(request.session.get('checkout_delivery_fee', '0'))
-        tax = Decimal(request.session.get('checkout_tax', '0'))
-        grand_total = Decimal(request.session.get('checkout_amount', '0'))
-        
-        from payment_system.models import PaymentTransaction
-        
-        # Get restaurant
-        restaurant = cart_items.first().menu_item.restaurant
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            restaurant=restaurant,
-            status='confirmed',
-            confirmed_at=timezone.now(),  # AUTO TIMESTAMP: payment → confirmed
-            delivery_address=delivery_address,
-            total_amount=subtotal,
-            delivery_fee=delivery_fee,
-            tax_amount=tax,
-            payment_status='paid',
-            payment_intent_id=payment_intent_id,
-            is_paid=True
-        )
-        
-        # Create order items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                menu_item=cart_item.menu_item,
-                name=cart_item.menu_item.name,
-                price=cart_item.menu_item.price,
-                quantity=cart_item.quantity
-            )
-        
-        # Determine payment method
-        payment_method_type = 'card'  # Default
-        if hasattr(intent, 'payment_method') and intent.payment_method:
-            pm = stripe.PaymentMethod.retrieve(intent.payment_method)
-            payment_method_type = pm.type
-        
-        # Create payment transaction
-        PaymentTransaction.objects.create(
-            order=order,
-            restaurant=restaurant,
-            customer=request.user,
-            transaction_id=payment_intent_id,
-            payment_method=payment_method_type,
-            amount=grand_total,
-            currency='INR',
-            status='completed',
-            gateway_response={
-                'payment_intent_id': payment_intent_id,
-                'status': intent.status,
-                'payment_method_type': payment_method_type
-            }
-        )
-        
-        # Clear cart
-        cart_items.delete()
-        
-        # Clear session
-        request.session.pop('delivery_address', None)
-        request.session.pop('phone', None)
-        request.session.pop('checkout_amount', None)
-        request.session.pop('checkout_subtotal', None)
-        request.session.pop('checkout_delivery_fee', None)
-        request.session.pop('checkout_tax', None)
-        
-        return JsonResponse({
-            'success': True,
-            'order_id': order.id,
-            'redirect_url': f'/orders/{order.id}/'
-        })
-    
+    except ValueError:
+        return JsonResponse({'error': 'Invalid request body'}, status=400)
+    
+    if not payment_intent_id:
+        return JsonResponse({'error': 'Payment Intent ID required'}, status=400)
+    
+    checkout = CheckoutSession.objects.filter(payment_intent_id=payment_intent_id, user=request.user).first()
+    if checkout is None:
+        return JsonResponse({'error': 'Invalid Payment Intent ID'}, status=400)
+    
+    outcome = PaymentIdempotencyKey.objects.filter(key=payment_intent_id, completed_at__isnull=False).first()
+    if outcome:
+        return _checkout_finished(request, payment_intent_id, outcome.response, outcome.status_code)
+    
+    # A failed checkout is asked about right away: the card may have been
+    # declined and then retried on the same intent
+    if getattr(settings, 'PAYMENT_ASYNC_CONFIRMATION', False) and checkout.status == 'open':
+        now = timezone.now().timestamp()
+        started = request.session.get('checkout_confirm_started')
+        if not started or started[0] != payment_intent_id:
+            started = request.session['checkout_confirm_started'] = [payment_intent_id, now]
+        if now - started[1] < getattr(settings, 'PAYMENT_WEBHOOK_GRACE_SECONDS', 10):
+            return _checkout_pending()
+    
+    # No webhook yet: finalize in this request
+    try:
+        response_data = finalize_checkout(checkout, get_gateway())
+    except IdempotencyConflict:
+        # The event worker (or a parallel poll) is building the order right now
+        return _checkout_pending()
+    except PaymentNotCompleted as e:
+        if e.status == 'processing':
+            return _checkout_pending()
+        return JsonResponse({'error': 'Payment not successful'}, status=400)
+    except EmptyCartError:
+        return JsonResponse({'error': 'Cart is empty'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
+    
+    return _checkout_finished(request, payment_intent_id, response_data)
+
+
+def _checkout_pending():
+    return JsonResponse({'success': False, 'pending': True}, status=202)
+
+
+def _checkout_finished(request, payment_intent_id, response_data, status=200):
+    # Forget the checkout the first time its outcome reaches this session
+    if request.session.get('checkout_payment_intent_id') == payment_intent_id:
+        lines = CheckoutSession.objects.filter(payment_intent_id=payment_intent_id).values_list('items', flat=True).first()
+        get_cart(request).mark_ordered(lines or None)
+        for key in CHECKOUT_SESSION_KEYS:
+            request.session.pop(key, None)
+    return JsonResponse(response_data, status=status)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import PaymentTransaction, PaymentNotification
+from .models import PaymentTransaction, PaymentNotification, PaymentIdempotencyKey, GatewayEvent
 
 
 @admin.register(PaymentTransaction)
@@ -85,3 +85,22 @@ class PaymentNotificationAdmin(admin.ModelAdmin):
         updated = queryset.update(is_read=True)
         self.message_user(request, f'{updated} notifications marked as read.')
     mark_as_read.short_description = 'Mark selected as read'
+
+
+@admin.register(PaymentIdempotencyKey)
+class PaymentIdempotencyKeyAdmin(admin.ModelAdmin):
+    """Admin interface for stored payment confirmation outcomes"""
+    list_display = ['key', 'user', 'order', 'status_code', 'created_at', 'completed_at']
+    search_fields = ['key', 'user__username', 'order__id']
+    readonly_fields = ['key', 'user', 'order', 'response', 'status_code', 'created_at', 'completed_at']
+    ordering = ['-created_at']
+
+
+@admin.register(GatewayEvent)
+class GatewayEventAdmin(admin.ModelAdmin):
+    """Admin interface for the gateway event inbox"""
+    list_display = ['event_id', 'event_type', 'payment_intent_id', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type', 'received_at']
+    search_fields = ['event_id', 'payment_intent_id']
+    readonly_fields = ['event_id', 'event_type', 'payment_intent_id', 'payload', 'received_at', 'claimed_at', 'processed_at']
+    ordering = ['-received_at']
@@ -0,0 +1,121 @@
+"""
+Gateway event inbox.
+
+The webhook view only verifies and stores events (record_event). The
+`process_payment_events` worker later turns them into orders
+(process_pending_events), away from the customer's request. Workers claim
+events with a conditional UPDATE, so several can run side by side without
+handling the same event twice.
+"""
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .gateways import get_gateway
+from .idempotency import IdempotencyConflict
+from .models import GatewayEvent
+
+
+MAX_ATTEMPTS = 5
+
+# Wait before retrying an event whose last attempt failed
+RETRY_DELAY = timedelta(seconds=10)
+
+# An event left in 'processing' this long belongs to a worker that died
+STALE_PROCESSING = timedelta(minutes=5)
+
+
+def record_event(webhook_event):
+    """Store a verified webhook event. Returns False for redeliveries of a known event."""
+    try:
+        with transaction.atomic():
+            GatewayEvent.objects.create(
+                event_id=webhook_event.id,
+                event_type=webhook_event.type,
+                payment_intent_id=webhook_event.payment_intent_id,
+                payload=webhook_event.payload,
+            )
+        return True
+    except IntegrityError:
+        return False
+
+
+def requeue_stale_events():
+    return GatewayEvent.objects.filter(
+        status='processing', claimed_at__lt=timezone.now() - STALE_PROCESSING,
+    ).update(status='pending')
+
+
+def process_pending_events(batch_size=50):
+    """Process up to batch_size pending events; returns {status: count} for the batch"""
+    counts = {}
+    now = timezone.now()
+    pending = GatewayEvent.objects.filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - RETRY_DELAY), status='pending',
+    ).order_by('received_at').values_list('pk', flat=True)
+    for pk in list(pending[:batch_size]):
+        # Claim the event; another worker may have taken it since the scan
+        claimed = GatewayEvent.objects.filter(pk=pk, status='pending').update(
+            status='processing', attempts=F('attempts') + 1, claimed_at=timezone.now(),
+        )
+        if not claimed:
+            continue
+        event = GatewayEvent.objects.get(pk=pk)
+        status = _process(event)
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def _process(event):
+    from orders.checkout import EmptyCartError, PaymentNotCompleted
+
+    handler = EVENT_HANDLERS.get(event.event_type)
+    try:
+        if handler is None:
+            return _finish(event, 'ignored')
+        return _finish(event, handler(event))
+    except EmptyCartError as e:
+        # Nothing left to order; retrying cannot help
+        return _finish(event, 'failed', str(e))
+    except (IdempotencyConflict, PaymentNotCompleted) as e:
+        return _retry(event, f'{type(e).__name__}: {e}')
+    except Exception as e:
+        return _retry(event, str(e))
+
+
+def _finish(event, status, error=''):
+    GatewayEvent.objects.filter(pk=event.pk).update(status=status, last_error=error, processed_at=timezone.now())
+    return status
+
+
+def _retry(event, error):
+    status = 'failed' if event.attempts >= MAX_ATTEMPTS else 'pending'
+    GatewayEvent.objects.filter(pk=event.pk).update(status=status, last_error=error)
+    return status
+
+
+def _payment_succeeded(event):
+    from orders.checkout import finalize_checkout
+    from orders.models import CheckoutSession
+
+    checkout = CheckoutSession.objects.select_related('user').filter(payment_intent_id=event.payment_intent_id).first()
+    if checkout is None:
+        # Paid through another flow (e.g. django-payments); not ours to build
+        return 'ignored'
+    finalize_checkout(checkout, get_gateway())
+    return 'processed'
+
+
+def _payment_failed(event):
+    from orders.models import CheckoutSession
+
+    CheckoutSession.objects.filter(payment_intent_id=event.payment_intent_id, status='open').update(
+        status='failed', updated_at=timezone.now(),
+    )
+    return 'processed'
+
+
+EVENT_HANDLERS = {
+    'payment_intent.succeeded': _payment_succeeded,
+    'payment_intent.payment_failed': _payment_failed,
+}
@@ -0,0 +1,261 @@
+"""
+Payment gateway interface.
+
+Checkout talks to the gateway only through get_gateway(). The PAYMENT_GATEWAY
+setting chooses the class and PAYMENT_GATEWAY_OPTIONS holds its keyword
+arguments:
+
+* StripeGateway - the real Stripe API over one shared keep-alive HTTP
+  session, with explicit timeouts and automatic network retries.
+* FakeGateway   - in-process intents with configurable latency and failure
+  rate, for load-testing checkout without leaving the machine.
+
+The gateway is created once per process so its connection pool is reused
+across requests.
+"""
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class PaymentGatewayError(Exception):
+    """The gateway rejected a request or could not be reached"""
+
+
+class GatewayIntent:
+    """The parts of a payment intent checkout needs, independent of the gateway"""
+
+    def __init__(self, id, client_secret, amount, status, payment_method_type=None):
+        self.id = id
+        self.client_secret = client_secret
+        self.amount = amount
+        self.status = status
+        self.payment_method_type = payment_method_type
+
+    @property
+    def succeeded(self):
+        return self.status == 'succeeded'
+
+
+class WebhookEvent:
+    """A verified webhook event"""
+
+    def __init__(self, id, type, payment_intent_id, payload):
+        self.id = id
+        self.type = type
+        self.payment_intent_id = payment_intent_id
+        self.payload = payload
+
+
+class BasePaymentGateway:
+    """Interface shared by all payment gateways. Amounts are in the smallest currency unit."""
+
+    # Request header carrying the webhook signature
+    signature_header = None
+    # Secret webhooks are signed with; without one no webhook can be trusted
+    webhook_secret = ''
+
+    def create_intent(self, amount, currency='inr', metadata=None):
+        raise NotImplementedError
+
+    def update_intent_amount(self, intent_id, amount):
+        """Change the amount; raises PaymentGatewayError once the intent can no longer change"""
+        raise NotImplementedError
+
+    def retrieve_intent(self, intent_id):
+        """Fetch an intent with its payment method type resolved"""
+        raise NotImplementedError
+
+    def parse_event(self, payload, signature):
+        """Verify a webhook body and return a WebhookEvent; raises PaymentGatewayError if it is not authentic"""
+        raise NotImplementedError
+
+
+class StripeGateway(BasePaymentGateway):
+    """Stripe PaymentIntents over a pooled, keep-alive HTTP session"""
+
+    signature_header = 'Stripe-Signature'
+
+    def __init__(self, api_key=None, webhook_secret=None, timeout=(3.05, 10), max_network_retries=2, pool_size=10):
+        import requests
+        import stripe
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+
+        self._stripe = stripe
+        self.webhook_secret = webhook_secret or getattr(settings, 'STRIPE_WEBHOOK_SECRET', '')
+        self.client = stripe.StripeClient(
+            api_key or settings.STRIPE_SECRET_KEY,
+            http_client=stripe.RequestsClient(timeout=timeout, session=session),
+            max_network_retries=max_network_retries,
+        )
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except self._stripe.StripeError as e:
+            raise PaymentGatewayError(str(e)) from e
+
+    def _to_intent(self, intent):
+        payment_method = getattr(intent, 'payment_method', None)
+        # Expanded payment methods arrive as objects, unexpanded ones as ids
+        payment_method_type = getattr(payment_method, 'type', None) if payment_method else None
+        return GatewayIntent(intent.id, intent.client_secret, intent.amount, intent.status, payment_method_type)
+
+    def create_intent(self, amount, currency='inr', metadata=None):
+        intent = self._call(self.client.v1.payment_intents.create, params={
+            'amount': amount,
+            'currency': currency,
+            'automatic_payment_methods': {'enabled': True},  # Cards, UPI, wallets, etc.
+            'metadata': metadata or {},
+        })
+        return self._to_intent(intent)
+
+    def update_intent_amount(self, intent_id, amount):
+        intent = self._call(self.client.v1.payment_intents.update, intent_id, params={'amount': amount})
+        return self._to_intent(intent)
+
+    def retrieve_intent(self, intent_id):
+        # Expanding the payment method saves a second round trip
+        intent = self._call(self.client.v1.payment_intents.retrieve, intent_id, params={'expand': ['payment_method']})
+        return self._to_intent(intent)
+
+    def parse_event(self, payload, signature):
+        if not self.webhook_secret:
+            raise PaymentGatewayError('STRIPE_WEBHOOK_SECRET is not set')
+        try:
+            event = self._stripe.Webhook.construct_event(payload, signature, self.webhook_secret)
+        except (ValueError, self._stripe.SignatureVerificationError) as e:
+            raise PaymentGatewayError(f'Invalid webhook: {e}') from e
+        payment_intent_id = event.data.object.id if event.type.startswith('payment_intent.') else ''
+        return WebhookEvent(event.id, event.type, payment_intent_id, json.loads(payload))
+
+
+class FakeGateway(BasePaymentGateway):
+    """
+    In-process gateway for offline tests and benchmarks.
+
+    Every call sleeps for `latency` seconds (plus up to `jitter`) and fails
+    with probability `failure_rate`. With `auto_succeed`, intents report as
+    succeeded once created, standing in for the browser-side confirmation.
+    Webhooks are signed with HMAC-SHA256 over the body; build_event() makes
+    one the way the gateway would send it.
+    """
+
+    signature_header = 'X-Fake-Signature'
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, auto_succeed=True, seed=None,
+                 webhook_secret='fake-webhook-secret'):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.auto_succeed = auto_succeed
+        self.webhook_secret = webhook_secret
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._intents = {}
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise PaymentGatewayError('Simulated gateway failure')
+
+    def _get(self, intent_id):
+        try:
+            return self._intents[intent_id]
+        except KeyError:
+            raise PaymentGatewayError(f'No such payment_intent: {intent_id}')
+
+    def create_intent(self, amount, currency='inr', metadata=None):
+        self._round_trip()
+        intent_id = f'pi_fake_{uuid.uuid4().hex[:24]}'
+        status = 'succeeded' if self.auto_succeed else 'requires_payment_method'
+        intent = GatewayIntent(intent_id, f'{intent_id}_secret', amount, status, 'card' if self.auto_succeed else None)
+        with self._lock:
+            self._intents[intent_id] = intent
+        return intent
+
+    def update_intent_amount(self, intent_id, amount):
+        self._round_trip()
+        intent = self._get(intent_id)
+        if intent.status in ('succeeded', 'canceled'):
+            raise PaymentGatewayError(f'PaymentIntent {intent_id} is {intent.status} and cannot be updated')
+        intent.amount = amount
+        return intent
+
+    def retrieve_intent(self, intent_id):
+        self._round_trip()
+        return self._get(intent_id)
+
+    def succeed(self, intent_id, payment_method_type='card'):
+        """Mark an intent as paid, as the browser confirmation would"""
+        intent = self._get(intent_id)
+        intent.status = 'succeeded'
+        intent.payment_method_type = payment_method_type
+        return intent
+
+    def sign(self, payload):
+        return hmac.new(self.webhook_secret.encode(), payload, hashlib.sha256).hexdigest()
+
+    def build_event(self, intent_id, event_type='payment_intent.succeeded'):
+        """Return (payload, signature) for a webhook about an intent"""
+        intent = self._get(intent_id)
+        payload = json.dumps({
+            'id': f'evt_fake_{uuid.uuid4().hex[:24]}',
+            'type': event_type,
+            'data': {'object': {'id': intent.id, 'object': 'payment_intent', 'amount': intent.amount, 'status': intent.status}},
+        }).encode()
+        return payload, self.sign(payload)
+
+    def parse_event(self, payload, signature):
+        if not hmac.compare_digest(self.sign(payload), signature or ''):
+            raise PaymentGatewayError('Invalid webhook signature')
+        try:
+            data = json.loads(payload)
+            intent_id = data['data']['object']['id'] if data['type'].startswith('payment_intent.') else ''
+            return WebhookEvent(data['id'], data['type'], intent_id, data)
+        except (ValueError, KeyError, TypeError) as e:
+            raise PaymentGatewayError(f'Invalid webhook: {e}') from e
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the configured gateway, created once per process"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                gateway_class = import_string(getattr(settings, 'PAYMENT_GATEWAY', 'payment_system.gateways.StripeGateway'))
+                _gateway = gateway_class(**getattr(settings, 'PAYMENT_GATEWAY_OPTIONS', {}))
+    return _gateway
+
+
+def reset_gateway():
+    """Forget the cached gateway (after changing settings, e.g. in tests)"""
+    global _gateway
+    _gateway = None
+
+
+@receiver(setting_changed)
+def _reset_gateway_on_setting_change(setting, **kwargs):
+    if setting in ('PAYMENT_GATEWAY', 'PAYMENT_GATEWAY_OPTIONS'):
+        reset_gateway()
@@ -0,0 +1,78 @@
+"""
+Idempotent payment confirmation.
+
+The first request for a payment intent claims a PaymentIdempotencyKey row
+(the unique key makes the claim atomic). It then calls the gateway and
+creates the order. The order and the stored response are committed together.
+Retries either replay that response or are told the first request is still
+running. Either way they never reach the gateway or create a second order.
+"""
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import PaymentIdempotencyKey
+
+
+# A claim older than this with no response is treated as abandoned
+# (e.g. the worker died mid-request) and may be taken over.
+IN_PROGRESS_TIMEOUT = timedelta(minutes=2)
+
+
+class IdempotencyConflict(Exception):
+    """Another request holds the key and has not finished yet"""
+
+
+class IdempotencyKeyMismatch(Exception):
+    """The key was claimed by a different user"""
+
+
+def _create_claim(key, user):
+    """A new claim on the key, or None if someone holds it"""
+    try:
+        with transaction.atomic():
+            return PaymentIdempotencyKey.objects.create(key=key, user=user)
+    except IntegrityError:
+        return None
+
+
+def claim_idempotency_key(key, user):
+    """
+    Return (record, replay).
+
+    If replay is True, record.response holds the stored outcome and should be
+    returned unchanged. Otherwise the caller now owns the key. It must finish
+    with record.complete(...) or give it back with release_idempotency_key().
+    """
+    record = _create_claim(key, user)
+    if record is not None:
+        return record, False
+
+    try:
+        record = PaymentIdempotencyKey.objects.get(key=key)
+    except PaymentIdempotencyKey.DoesNotExist:
+        # The holder released the key after our insert failed; try once more
+        record = _create_claim(key, user)
+        if record is None:
+            raise IdempotencyConflict(key)
+        return record, False
+    if record.user_id != user.id:
+        raise IdempotencyKeyMismatch(key)
+    if record.is_completed:
+        return record, True
+
+    # Take over an abandoned claim. The conditional delete lets only one of
+    # several concurrent retries win it.
+    stale_before = timezone.now() - IN_PROGRESS_TIMEOUT
+    deleted, _ = PaymentIdempotencyKey.objects.filter(
+        pk=record.pk, completed_at__isnull=True, created_at__lt=stale_before
+    ).delete()
+    if deleted:
+        record = _create_claim(key, user)
+        if record is not None:
+            return record, False
+    raise IdempotencyConflict(key)
+
+
+def release_idempotency_key(record):
+    """Drop an unfinished claim so the client can retry after a failure"""
+    PaymentIdempotencyKey.objects.filter(pk=record.pk, completed_at__isnull=True).delete()
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from payment_system.events import process_pending_events, requeue_stale_events
+
+
+class Command(BaseCommand):
+    help = 'Turn stored payment gateway events into orders (runs until stopped unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process one batch and exit')
+        parser.add_argument('--batch-size', type=int, default=50, help='Events claimed per batch')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the inbox is empty')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                requeued = requeue_stale_events()
+                if requeued:
+                    self.stdout.write(f'Requeued {requeued} stale event(s)')
+
+                counts = process_pending_events(options['batch_size'])
+                if counts:
+                    summary = ', '.join(f'{status}: {count}' for status, count in sorted(counts.items()))
+                    self.stdout.write(self.style.SUCCESS(f'✓ Processed {sum(counts.values())} event(s) ({summary})'))
+
+                if options['once']:
+                    break
+                if not counts:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
@@ -0,0 +1,47 @@
+"""
+Lightweight payment counters kept in the Django cache.
+
+Counters live as long as the cache does. Use a shared cache backend
+(Redis/Memcached) in production so every worker adds to the same totals.
+"""
+from django.core.cache import cache
+
+
+METRIC_KEY_PREFIX = 'metrics:payments:'
+
+# How create_payment_intent satisfied a request
+INTENT_CREATED = 'intent_created'
+INTENT_REUSED = 'intent_reused'
+INTENT_UPDATED = 'intent_updated'
+
+
+def increment(name, delta=1):
+    """Atomically bump a counter, creating it on first use"""
+    key = METRIC_KEY_PREFIX + name
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, delta, timeout=None)
+
+
+def get_counts(*names):
+    values = cache.get_many([METRIC_KEY_PREFIX + name for name in names])
+    return {name: values.get(METRIC_KEY_PREFIX + name, 0) for name in names}
+
+
+def intent_reuse_stats():
+    """Counts per outcome plus the share of requests that avoided creating a new intent"""
+    counts = get_counts(INTENT_CREATED, INTENT_REUSED, INTENT_UPDATED)
+    total = sum(counts.values())
+    avoided = counts[INTENT_REUSED] + counts[INTENT_UPDATED]
+    return {
+        **counts,
+        'total': total,
+        'reuse_ratio': round(avoided / total, 4) if total else None,
+    }
+
+
+def reset(*names):
+    cache.delete_many([METRIC_KEY_PREFIX + name for name in names])
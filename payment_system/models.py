@@ -164,3 +164,96 @@ class PaymentNotification(models.Model):
             self.is_read = True
             self.read_at = timezone.now()
             self.save(update_fields=['is_read', 'read_at'])
+
+
+class PaymentIdempotencyKey(models.Model):
+    """
+    Outcome of a payment confirmation, keyed by the gateway's payment intent.
+    Retries of the same confirmation replay the stored response instead of
+    calling the gateway or creating another order.
+    """
+    key = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text='Payment intent ID the confirmation was made for'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='payment_idempotency_keys'
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='idempotency_keys'
+    )
+    
+    # Stored response (empty while the first request is still in flight)
+    response = models.JSONField(blank=True, null=True)
+    status_code = models.PositiveSmallIntegerField(default=200)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Payment Idempotency Key'
+        verbose_name_plural = 'Payment Idempotency Keys'
+    
+    def __str__(self):
+        return f"{self.key} ({'completed' if self.completed_at else 'in progress'})"
+    
+    @property
+    def is_completed(self):
+        return self.completed_at is not None
+    
+    def complete(self, response, status_code=200, order=None):
+        """Store the response that retries should replay"""
+        self.response = response
+        self.status_code = status_code
+        self.order = order
+        self.completed_at = timezone.now()
+        self.save(update_fields=['response', 'status_code', 'order', 'completed_at'])
+
+
+class GatewayEvent(models.Model):
+    """
+    Inbox of verified webhook events from the payment gateway.
+    The unique event_id drops gateway redeliveries. The event worker builds
+    orders from pending rows outside the user's request.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+    
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payment_intent_id = models.CharField(max_length=255, blank=True, db_index=True)
+    payload = models.JSONField()
+    
+    # Processing state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['received_at']
+        verbose_name = 'Gateway Event'
+        verbose_name_plural = 'Gateway Events'
+        indexes = [
+            # The worker's queue scan
+            models.Index(fields=['status', 'received_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
@@ -1 +1,112 @@
-# This file is intentionally left empty for tests
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .gateways import PaymentGatewayError, StripeGateway, get_gateway
+from .idempotency import (
+    IdempotencyConflict, IdempotencyKeyMismatch, claim_idempotency_key, release_idempotency_key,
+)
+from .models import GatewayEvent, PaymentIdempotencyKey
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='customer')
+
+    def test_first_claim_owns_the_key(self):
+        record, replay = claim_idempotency_key('pi_1', self.user)
+        self.assertFalse(replay)
+        self.assertFalse(record.is_completed)
+
+    def test_completed_key_is_replayed(self):
+        record, _ = claim_idempotency_key('pi_1', self.user)
+        record.complete({'success': True, 'order_id': 7})
+        replayed, replay = claim_idempotency_key('pi_1', self.user)
+        self.assertTrue(replay)
+        self.assertEqual(replayed.pk, record.pk)
+        self.assertEqual(replayed.response, {'success': True, 'order_id': 7})
+
+    def test_key_in_flight_conflicts(self):
+        claim_idempotency_key('pi_1', self.user)
+        with self.assertRaises(IdempotencyConflict):
+            claim_idempotency_key('pi_1', self.user)
+
+    def test_key_of_another_user(self):
+        claim_idempotency_key('pi_1', self.user)
+        with self.assertRaises(IdempotencyKeyMismatch):
+            claim_idempotency_key('pi_1', User.objects.create_user(username='other'))
+
+    def test_released_key_can_be_claimed_again(self):
+        record, _ = claim_idempotency_key('pi_1', self.user)
+        release_idempotency_key(record)
+        _, replay = claim_idempotency_key('pi_1', self.user)
+        self.assertFalse(replay)
+
+    def test_abandoned_claim_is_taken_over(self):
+        record, _ = claim_idempotency_key('pi_1', self.user)
+        PaymentIdempotencyKey.objects.filter(pk=record.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        taken, replay = claim_idempotency_key('pi_1', self.user)
+        self.assertFalse(replay)
+        self.assertNotEqual(taken.pk, record.pk)
+
+    def test_key_released_between_insert_and_read(self):
+        record, _ = claim_idempotency_key('pi_1', self.user)
+        get = PaymentIdempotencyKey.objects.get
+
+        def released_meanwhile(**kwargs):
+            # The holder gives the key back right after our insert failed
+            release_idempotency_key(record)
+            return get(**kwargs)
+
+        with mock.patch.object(PaymentIdempotencyKey.objects, 'get', side_effect=released_meanwhile):
+            claimed, replay = claim_idempotency_key('pi_1', self.user)
+        self.assertFalse(replay)
+        self.assertNotEqual(claimed.pk, record.pk)
+
+    def test_key_released_and_reclaimed_between_insert_and_read(self):
+        record, _ = claim_idempotency_key('pi_1', self.user)
+        get = PaymentIdempotencyKey.objects.get
+
+        def taken_meanwhile(**kwargs):
+            release_idempotency_key(record)
+            try:
+                return get(**kwargs)
+            finally:
+                # A third request claims it before our retry
+                PaymentIdempotencyKey.objects.create(key='pi_1', user=self.user)
+
+        with mock.patch.object(PaymentIdempotencyKey.objects, 'get', side_effect=taken_meanwhile):
+            with self.assertRaises(IdempotencyConflict):
+                claim_idempotency_key('pi_1', self.user)
+
+
+class GatewayWebhookTests(TestCase):
+    def post_event(self, payload, signature, header='HTTP_X_FAKE_SIGNATURE'):
+        return self.client.post(reverse('payments:gateway_webhook'), payload, content_type='application/json',
+                                **{header: signature})
+
+    @override_settings(PAYMENT_GATEWAY='payment_system.gateways.FakeGateway', PAYMENT_GATEWAY_OPTIONS={})
+    def test_signed_event_is_recorded(self):
+        gateway = get_gateway()
+        intent = gateway.create_intent(10000)
+        payload, signature = gateway.build_event(intent.id)
+        self.assertEqual(self.post_event(payload, signature).status_code, 200)
+        self.assertEqual(GatewayEvent.objects.get().payment_intent_id, intent.id)
+
+    @override_settings(PAYMENT_GATEWAY='payment_system.gateways.FakeGateway', PAYMENT_GATEWAY_OPTIONS={})
+    def test_badly_signed_event_is_rejected(self):
+        gateway = get_gateway()
+        payload, _ = gateway.build_event(gateway.create_intent(10000).id)
+        self.assertEqual(self.post_event(payload, 'forged').status_code, 400)
+        self.assertFalse(GatewayEvent.objects.exists())
+
+    @override_settings(PAYMENT_GATEWAY='payment_system.gateways.StripeGateway',
+                       PAYMENT_GATEWAY_OPTIONS={}, STRIPE_WEBHOOK_SECRET='')
+    def test_events_refused_without_a_webhook_secret(self):
+        payload = b'{"id": "evt_1", "type": "payment_intent.succeeded", "data": {"object": {"id": "pi_1"}}}'
+        self.assertEqual(self.post_event(payload, 't=1,v1=forged', 'HTTP_STRIPE_SIGNATURE').status_code, 503)
+        self.assertFalse(GatewayEvent.objects.exists())
+        with self.assertRaises(PaymentGatewayError):
+            StripeGateway(api_key='sk_test_1').parse_event(payload, 't=1,v1=forged')
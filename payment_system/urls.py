@@ -15,4 +15,10 @@ urlpatterns = [
     path('notifications/', views.notifications, name='notifications'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_read'),
+    
+    # Gateway callbacks
+    path('webhook/', views.gateway_webhook, name='gateway_webhook'),
+    
+    # Operations
+    path('metrics/', views.payment_metrics, name='metrics'),
 ]
@@ -1,10 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.db.models import Sum, Count, Q
 from django.db.models.functions import TruncDate
 from decimal import Decimal
 from .models import PaymentTransaction, PaymentNotification
+from . import metrics
+from .events import record_event
+from .gateways import get_gateway, PaymentGatewayError
 from restaurants.models import Restaurant
 from datetime import datetime, timedelta
 
@@ -201,3 +208,32 @@ def mark_all_notifications_read(request):
     
     messages.success(request, 'All notifications marked as read.')
     return redirect('payments:notifications')
+
+
+@staff_member_required
+def payment_metrics(request):
+    """Payment counters as JSON (staff only)"""
+    return JsonResponse({
+        'payment_intents': metrics.intent_reuse_stats(),
+    })
+
+
+@csrf_exempt
+@require_POST
+def gateway_webhook(request):
+    """
+    Payment gateway webhook. Only verifies the signature and stores the event;
+    the process_payment_events worker acts on it. Redeliveries are
+    acknowledged without being stored twice. Without a webhook secret nothing
+    can be verified, so every event is refused with 503.
+    """
+    gateway = get_gateway()
+    if not gateway.webhook_secret:
+        return HttpResponse(status=503)
+    try:
+        event = gateway.parse_event(request.body, request.headers.get(gateway.signature_header, ''))
+    except PaymentGatewayError:
+        return HttpResponse(status=400)
+    
+    record_event(event)
+    return HttpResponse(status=200)
@@ -6,6 +6,7 @@ import random
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodify_project.settings')
 django.setup()
 
+from restaurants.calories import recount_calories
 from restaurants.models import MenuItem
 
 def add_calories_to_menu_items():
@@ -71,6 +72,7 @@ def add_calories_to_menu_items():
     }
     
     updated_count = 0
+    updated_items = []
     
     for item in menu_items:
         # Check if calories already set
@@ -99,11 +101,16 @@ def add_calories_to_menu_items():
         
         # Update the item
         item.calories = calories
-        item.save()
+        updated_items.append(item)
         updated_count += 1
         
         print(f"✅ {item.name}: {calories} calories")
     
+    # Saved in batches (no per-item signals), then the restaurants' calorie
+    # histograms are recounted once
+    MenuItem.objects.bulk_update(updated_items, ['calories'], batch_size=1000)
+    recount_calories({item.restaurant_id for item in updated_items})
+    
     print(f"\n🎉 Successfully added calories to {updated_count} menu items!")
     print(f"📊 Summary:")
     print(f"   - Total items: {menu_items.count()}")
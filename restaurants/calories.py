@@ -0,0 +1,72 @@
+"""
+Per-restaurant calorie histograms.
+
+The listing's calorie filter used to join every restaurant to its menu and
+deduplicate with DISTINCT. Instead each restaurant keeps how many of its menu
+items fall in each range (low_calorie_items, ...), plus its lowest and
+highest calories, so the filter is a predicate on an indexed column.
+
+The columns are recounted from the menu, in one UPDATE with a correlated
+subquery per column: after commit when a menu item is saved or deleted
+(signals.py), and in bulk by populate_calories.py and the migration that
+added them. Like the old join, they count every menu item, available or not.
+"""
+import threading
+from django.db import transaction
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from .models import MenuItem, Restaurant
+
+
+# The ranges offered by the calorie filters, by menu item calories
+CALORIE_RANGES = {
+    'low': Q(calories__lte=300),
+    'medium': Q(calories__gt=300, calories__lte=600),
+    'high': Q(calories__gt=600),
+}
+
+
+def calorie_columns(menu_item_model):
+    """The histogram columns as expressions over the restaurant's menu, for update()"""
+    menu = menu_item_model.objects.filter(restaurant=OuterRef('pk')).order_by().values('restaurant')
+
+    def per_restaurant(aggregate):
+        return Subquery(menu.annotate(value=aggregate).values('value'))
+
+    columns = {f'{name}_calorie_items': Coalesce(per_restaurant(Count('pk', filter=condition)), 0)
+               for name, condition in CALORIE_RANGES.items()}
+    columns['min_calories'] = per_restaurant(Min('calories'))
+    columns['max_calories'] = per_restaurant(Max('calories'))
+    return columns
+
+
+def recount_calories(restaurant_ids=None):
+    """Recount the histograms of the given restaurants (all of them by default)"""
+    restaurants = Restaurant.objects.all()
+    if restaurant_ids is not None:
+        restaurants = restaurants.filter(pk__in=restaurant_ids)
+    return restaurants.update(**calorie_columns(MenuItem))
+
+
+def calorie_filter(calorie_range):
+    """Restaurant filter keeping those with menu items in `calorie_range` (None if unknown)"""
+    if calorie_range not in CALORIE_RANGES:
+        return None
+    return Q(**{f'{calorie_range}_calorie_items__gt': 0})
+
+
+_pending = threading.local()
+
+
+def _flush_pending():
+    ids, _pending.ids = getattr(_pending, 'ids', set()), set()
+    if ids:
+        recount_calories(ids)
+
+
+def schedule_recount(restaurant_id):
+    """Recount a restaurant's histogram once, when the current transaction commits"""
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    _pending.ids.add(restaurant_id)
+    transaction.on_commit(_flush_pending)
@@ -0,0 +1,122 @@
+"""
+Facet counts for the restaurant listing's filters.
+
+For each option of each filter (cuisine, veg, minimum rating, calorie range)
+the listing shows how many restaurants choosing it would list, given the
+search and the other filters. A filter's own choice is left out of its
+counts, so switching cuisine shows what every cuisine would give.
+
+All the counts come from one grouped query over the searched restaurants:
+one row per (cuisine, veg, rating, menu has low/medium/high calories)
+combination with its number of restaurants, far fewer rows than restaurants.
+Each facet is then summed in Python from the rows matching the other
+filters. The calorie flags come from the histogram columns (calories.py).
+
+Results are cached per filter combination under the catalog version stamp
+(suggest.py), which signals bump after commit whenever a restaurant or menu
+item changes (and for at most FACETS_CACHE_SECONDS).
+"""
+import hashlib
+import json
+import math
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
+from .calories import CALORIE_RANGES
+from .models import Restaurant
+from .suggest import catalog_version
+
+
+# Minimum ratings offered by the rating filter, as submitted
+RATING_BANDS = ['4.5', '4.0', '3.5', '3.0']
+FACETS = ('cuisine', 'veg', 'rating', 'calorie_range')
+
+
+def clean_filters(params):
+    """The listing's filters from request parameters; unusable values are dropped"""
+    filters = {
+        'cuisine': params.get('cuisine', '').strip(),
+        'veg': bool(params.get('veg', '')),
+        'rating': None,
+        'calorie_range': params.get('calorie_range', '') if params.get('calorie_range', '') in CALORIE_RANGES else '',
+    }
+    try:
+        rating = float(params.get('rating', ''))
+    except ValueError:
+        rating = None
+    # inf, nan and 1e400 are floats too, but not ratings the database can compare
+    if rating is not None and math.isfinite(rating):
+        filters['rating'] = rating
+    return filters
+
+
+def _matches(row, filters, skip):
+    """Whether a grouped row passes every filter but `skip`"""
+    if skip != 'cuisine' and filters['cuisine'] and filters['cuisine'].lower() not in row['cuisine'].lower():
+        return False
+    if skip != 'veg' and filters['veg'] and not row['is_veg']:
+        return False
+    if skip != 'rating' and filters['rating'] is not None and float(row['rating']) < filters['rating']:
+        return False
+    if skip != 'calorie_range' and filters['calorie_range'] and not row[filters['calorie_range']]:
+        return False
+    return True
+
+
+def _size(rows):
+    return sum(row['restaurants'] for row in rows)
+
+
+def count_facets(filters, restaurants=None):
+    """
+    Facet counts for `filters` (see clean_filters) among `restaurants`, the
+    search's results (all approved restaurants by default).
+    """
+    if restaurants is None:
+        restaurants = Restaurant.objects.filter(is_approved=True)
+    flags = {name: ExpressionWrapper(Q(**{f'{name}_calorie_items__gt': 0}), output_field=BooleanField())
+             for name in CALORIE_RANGES}
+    rows = list(restaurants.annotate(**flags).values('cuisine', 'is_veg', 'rating', *flags)
+                .annotate(restaurants=Count('pk')).order_by())
+
+    matching = {facet: [row for row in rows if _matches(row, filters, facet)] for facet in FACETS}
+
+    # Cuisines differing only in case are one option
+    cuisines = defaultdict(int)
+    names = {}
+    for row in matching['cuisine']:
+        key = row['cuisine'].strip().lower()
+        names.setdefault(key, row['cuisine'].strip())
+        cuisines[key] += row['restaurants']
+    if filters['cuisine'] and filters['cuisine'].lower() not in cuisines:
+        # The filter matches by substring ("Indian" lists "South Indian")
+        cuisines[filters['cuisine'].lower()] = _size(
+            row for row in matching['cuisine'] if filters['cuisine'].lower() in row['cuisine'].lower())
+        names[filters['cuisine'].lower()] = filters['cuisine']
+
+    return {
+        'total': _size(row for row in rows if _matches(row, filters, None)),
+        'cuisine': sorted(((names[key], count) for key, count in cuisines.items() if names[key]),
+                          key=lambda option: (-option[1], option[0])),
+        'cuisine_total': _size(matching['cuisine']),
+        'veg': _size(row for row in matching['veg'] if row['is_veg']),
+        'veg_total': _size(matching['veg']),
+        'rating': [(band, _size(row for row in matching['rating'] if float(row['rating']) >= float(band)))
+                   for band in RATING_BANDS],
+        'rating_total': _size(matching['rating']),
+        'calorie_range': {name: _size(row for row in matching['calorie_range'] if row[name])
+                          for name in CALORIE_RANGES},
+        'calorie_range_total': _size(matching['calorie_range']),
+    }
+
+
+def facets_for(filters, search='', restaurants=None):
+    """count_facets, cached per search and filters until the catalog changes"""
+    combination = json.dumps([search.strip().lower(), filters], sort_keys=True)
+    key = f'restaurants:facets:{catalog_version()}:{hashlib.md5(combination.encode()).hexdigest()}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = count_facets(filters, restaurants)
+        cache.set(key, facets, getattr(settings, 'FACETS_CACHE_SECONDS', 600))
+    return facets
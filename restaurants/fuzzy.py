@@ -0,0 +1,310 @@
+"""
+Typo-tolerant matching of search words ("biriyani" -> "biryani").
+
+SymSpell: every vocabulary word is indexed under each string obtained by
+deleting up to FUZZY_MAX_DISTANCE characters from its first
+FUZZY_PREFIX_LENGTH characters. Doing the same to a query word and looking
+those strings up finds every word within that many edits, which are then
+checked with a real edit distance. A lookup is a few dozen probes whatever
+the vocabulary size; only indexing pays for the deletes.
+
+A million words make ~30 million deletes, far too many for a dict of
+strings. They are kept as 64-bit hashes in a sorted numpy array beside the
+id of their word; a hash collision only adds a candidate that fails the
+distance check. Words added later go to a small dict that is merged into
+the arrays once it grows.
+
+Each process builds its index from SearchTerm on first use, which takes
+about 5 s per 100,000 words (`manage.py bench_fuzzy`). search.py keeps
+that table current and stamps a version in the cache; lookups compare
+stamps and fetch only the words changed since, or reload after a rebuild.
+"""
+import threading
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import SearchTerm
+from .search import VOCABULARY_VERSION_KEY, tokenize
+
+
+HASH_MASK = (1 << 64) - 1
+# Words shorter than this are not corrected: too many words are an edit or two away
+MIN_WORD_LENGTH = 3
+# Candidate counts above which distances are computed with numpy
+VECTOR_THRESHOLD = 64
+# Reaches back past the last sync for changes of transactions that committed late
+SYNC_SLACK = timedelta(seconds=60)
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (edits and adjacent transpositions)
+    between a and b, or limit + 1 as soon as it must exceed limit.
+    """
+    if a == b:
+        return 0
+    # Common prefix and suffix do not change the distance
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a or not b:
+        return min(len(a) or len(b), limit + 1)
+
+    # Plain comparisons instead of min(): this loop is most of a lookup
+    before, previous = None, list(range(len(b) + 1))
+    last = ''
+    for i, char in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        best = i
+        other_last = ''
+        for j, other in enumerate(b, 1):
+            value = previous[j - 1] + (char != other)
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if char == other_last and last == other and before[j - 2] + 1 < value:
+                value = before[j - 2] + 1
+            current[j] = value
+            if value < best:
+                best = value
+            other_last = other
+        if best > limit:
+            return limit + 1
+        before, previous, last = previous, current, char
+    return min(previous[-1], limit + 1)
+
+
+def edit_distances(word, terms, limit):
+    """
+    edit_distance(word, term, limit) for many terms at once: the dynamic
+    programming table is filled for all of them together, one numpy
+    operation per cell, and only within `limit` of the diagonal since every
+    cell outside exceeds it.
+    """
+    width = max(len(term) for term in terms)
+    codes = np.frombuffer(''.join(term.ljust(width, '\0') for term in terms).encode('utf-32-le'),
+                          dtype=np.uint32).reshape(len(terms), width)
+    query = [ord(char) for char in word]
+    count = len(terms)
+    over = limit + 1
+    # Cells never need to exceed limit + 1, so int8 is enough and quick
+    before, previous = None, np.minimum(np.arange(width + 1), over).astype(np.int8)[None, :].repeat(count, axis=0)
+    last_matches = None
+    for i, char in enumerate(query, 1):
+        current = np.full_like(previous, over)
+        current[:, 0] = min(i, over)
+        matches = codes == char
+        for j in range(max(1, i - limit), min(width, i + limit) + 1):
+            value = previous[:, j - 1] + ~matches[:, j - 1]
+            np.minimum(value, previous[:, j] + 1, out=value)
+            np.minimum(value, current[:, j - 1] + 1, out=value)
+            if i > 1 and j > 1 and query[i - 2] != char:
+                swapped = matches[:, j - 2] & last_matches[:, j - 1]
+                np.minimum(value, np.where(swapped, before[:, j - 2] + 1, value), out=value)
+            np.minimum(value, over, out=value)
+            current[:, j] = value
+        before, previous, last_matches = previous, current, matches
+    lengths = np.fromiter((len(term) for term in terms), dtype=np.int64, count=count)
+    return np.minimum(previous[np.arange(count), lengths], over).tolist()
+
+
+class SymSpell:
+    """Symmetric-delete index of words and their frequencies"""
+
+    def __init__(self, max_distance=2, prefix_length=7, merge_at=50_000):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.merge_at = merge_at
+        self.terms = []
+        self.ids = {}
+        # Per word id, as arrays so candidates are filtered without a Python loop
+        self.frequencies = np.zeros(0, dtype=np.int64)
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._owners = np.empty(0, dtype=np.int32)
+        self._recent = {}
+        self._recent_count = 0
+
+    def _levels(self, word, depth):
+        """[{word prefix}, {its 1-deletes}, {its 2-deletes}, ...] down to `depth`, each new"""
+        word = word[:self.prefix_length]
+        levels, seen = [{word}], {word}
+        for _ in range(depth):
+            frontier = {part[:i] + part[i + 1:] for part in levels[-1] if len(part) > 1 for i in range(len(part))}
+            levels.append(frontier - seen)
+            seen |= frontier
+        return levels
+
+    def _hashes_of(self, word, depth):
+        return [hash(delete) & HASH_MASK for level in self._levels(word, depth) for delete in level]
+
+    def frequency(self, term):
+        term_id = self.ids.get(term)
+        return int(self.frequencies[term_id]) if term_id is not None else 0
+
+    def _add_terms(self, terms, frequencies):
+        first = len(self.terms)
+        self.terms.extend(terms)
+        self.ids.update(zip(terms, range(first, first + len(terms))))
+        self.frequencies = np.concatenate((self.frequencies[:first], np.array(frequencies, dtype=np.int64)))
+        self._lengths = np.concatenate((self._lengths[:first], np.array([len(term) for term in terms], dtype=np.int32)))
+        return first
+
+    def load(self, items, chunk=100_000):
+        """Add or update many (term, frequency) pairs at once"""
+        new_terms, new_frequencies = {}, []
+        for term, frequency in items:
+            term_id = self.ids.get(term)
+            if term_id is not None:
+                self.frequencies[term_id] = frequency
+            elif term in new_terms:
+                new_frequencies[new_terms[term]] = frequency
+            else:
+                new_terms[term] = len(new_frequencies)
+                new_frequencies.append(frequency)
+        first = self._add_terms(list(new_terms), new_frequencies)
+
+        hashes, owners = [self._hashes], [self._owners]
+        batch_hashes, batch_owners = [], []
+        for term_id, term in enumerate(new_terms, first):
+            deletes = self._hashes_of(term, self.max_distance)
+            batch_hashes.extend(deletes)
+            batch_owners.extend([term_id] * len(deletes))
+            if len(batch_hashes) >= chunk:
+                hashes.append(np.array(batch_hashes, dtype=np.uint64))
+                owners.append(np.array(batch_owners, dtype=np.int32))
+                batch_hashes, batch_owners = [], []
+        hashes.append(np.array(batch_hashes, dtype=np.uint64))
+        owners.append(np.array(batch_owners, dtype=np.int32))
+        self._merge(hashes, owners)
+
+    def set(self, term, frequency):
+        """Add or update one word; a frequency of 0 hides it"""
+        term_id = self.ids.get(term)
+        if term_id is not None:
+            self.frequencies[term_id] = frequency
+            return
+        if frequency <= 0:
+            return
+        if len(self.terms) == len(self.frequencies):
+            # Grow the arrays by half, not by one word per call
+            spare = max(len(self.terms) // 2, 1024)
+            self.frequencies = np.concatenate((self.frequencies, np.zeros(spare, dtype=np.int64)))
+            self._lengths = np.concatenate((self._lengths, np.zeros(spare, dtype=np.int32)))
+        term_id = self.ids[term] = len(self.terms)
+        self.terms.append(term)
+        self.frequencies[term_id] = frequency
+        self._lengths[term_id] = len(term)
+        for key in self._hashes_of(term, self.max_distance):
+            self._recent.setdefault(key, []).append(term_id)
+        self._recent_count += 1
+        if self._recent_count >= self.merge_at:
+            self._merge([self._hashes], [self._owners])
+
+    def _merge(self, hashes, owners):
+        for key, term_ids in self._recent.items():
+            hashes.append(np.full(len(term_ids), key, dtype=np.uint64))
+            owners.append(np.array(term_ids, dtype=np.int32))
+        self._recent, self._recent_count = {}, 0
+        hashes, owners = np.concatenate(hashes), np.concatenate(owners)
+        order = np.argsort(hashes, kind='stable')
+        self._hashes, self._owners = hashes[order], owners[order]
+
+    def lookup(self, word, max_distance=None, limit=5):
+        """
+        [(term, distance, frequency)] of the words within max_distance edits
+        of `word`, closest first, then most frequent.
+        """
+        depth = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        found, seen = [], np.empty(0, dtype=np.int32)
+        cap = depth
+        # Every word within d edits shares a delete with the query's first d
+        # levels, so once `limit` matches that close are found the deeper
+        # levels cannot improve on them
+        for level, deletes in enumerate(self._levels(word, depth)):
+            keys = np.array([hash(delete) & HASH_MASK for delete in deletes], dtype=np.uint64)
+            starts = np.searchsorted(self._hashes, keys, side='left').tolist()
+            ends = np.searchsorted(self._hashes, keys, side='right').tolist()
+            candidates = [self._owners[start:end] for start, end in zip(starts, ends) if end > start]
+            candidates += [np.array(self._recent[key], dtype=np.int32) for key in keys.tolist() if key in self._recent]
+            if not candidates:
+                continue
+            candidates = np.setdiff1d(np.concatenate(candidates), seen)
+            seen = np.concatenate((seen, candidates))
+
+            candidates = candidates[(self.frequencies[candidates] > 0)
+                                    & (np.abs(self._lengths[candidates] - len(word)) <= cap)]
+            terms = [self.terms[term_id] for term_id in candidates.tolist()]
+            if len(terms) > VECTOR_THRESHOLD:
+                distances = edit_distances(word, terms, cap)
+            else:
+                distances = [edit_distance(word, term, cap) for term in terms]
+            found.extend((term, distance, frequency) for term, distance, frequency
+                         in zip(terms, distances, self.frequencies[candidates].tolist()) if distance <= cap)
+
+            found.sort(key=lambda match: (match[1], -match[2], match[0]))
+            if len(found) >= limit:
+                # Farther words can no longer make the cut
+                del found[limit:]
+                cap = found[-1][1]
+                if cap <= level:
+                    break
+        return found
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def vocabulary():
+    """This process's SymSpell index of SearchTerm, brought up to date"""
+    global _index
+    version = cache.get(VOCABULARY_VERSION_KEY)
+    index = _index
+    if index is not None and (version is None or version == index.version):
+        return index
+
+    with _lock:
+        index = _index
+        if index is not None and (version is None or version == index.version):
+            return index
+        now = timezone.now()
+        if index is None or index.version is None or version[0] != index.version[0]:
+            index = SymSpell(getattr(settings, 'FUZZY_MAX_DISTANCE', 2), getattr(settings, 'FUZZY_PREFIX_LENGTH', 7))
+            index.load(SearchTerm.objects.filter(frequency__gt=0).values_list('term', 'frequency').iterator())
+        elif version != index.version:
+            for term, frequency in SearchTerm.objects.filter(
+                    updated_at__gte=index.synced_at - SYNC_SLACK).values_list('term', 'frequency'):
+                index.set(term, frequency)
+        index.version, index.synced_at = version, now
+        _index = index
+    return index
+
+
+def correct_word(word, index=None):
+    """The vocabulary word closest to `word`, or `word` itself if known or nothing is close"""
+    if index is None:
+        index = vocabulary()
+    if len(word) < MIN_WORD_LENGTH or word.isdigit() or index.frequency(word) > 0:
+        return word
+    if word.endswith('s') and index.frequency(word[:-1]) > 0:
+        return word
+    matches = index.lookup(word, max_distance=1 if len(word) <= 4 else 2, limit=1)
+    return matches[0][0] if matches else word
+
+
+def did_you_mean(query):
+    """The query with misspelled words corrected, or None if nothing was corrected"""
+    index = vocabulary()
+    words = tokenize(query)
+    corrected = [correct_word(word, index) for word in words]
+    return ' '.join(corrected) if corrected != words else None
@@ -0,0 +1,78 @@
+import time
+import uuid
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from restaurants.calories import CALORIE_RANGES, calorie_filter, recount_calories
+from restaurants.models import MenuItem, Restaurant
+from .bench_search import CUISINES
+
+
+class Command(BaseCommand):
+    help = 'Compare the menu join and the calorie histogram columns for the calorie filter (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=50_000, help='Restaurants to create')
+        parser.add_argument('--items', type=int, default=1_000_000, help='Menu items to create')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query')
+        parser.add_argument('--page', type=int, default=24, help='Restaurants fetched per listing query')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+
+        with transaction.atomic():
+            owner = User.objects.create_user(username=f'bench-calories-owner-{uuid.uuid4().hex[:8]}')
+            started = time.perf_counter()
+            restaurants = Restaurant.objects.bulk_create([
+                Restaurant(owner=owner, name=f'Bench {i}', cuisine=CUISINES[i % len(CUISINES)],
+                           location='Benchmark', description='')
+                for i in range(options['restaurants'])
+            ], batch_size=5000)
+            restaurant_ids = [restaurant.pk for restaurant in restaurants]
+            # Mostly medium dishes, a few light or heavy ones; some without calories
+            calories = np.clip(rng.normal(450, 130, size=options['items']), 40, 1400).astype(int).tolist()
+            unknown = (rng.random(options['items']) < 0.1).tolist()
+            owners = rng.choice(restaurant_ids, size=options['items']).tolist()
+            MenuItem.objects.bulk_create([
+                MenuItem(restaurant_id=restaurant_id, name='Dish', price=199, description='',
+                         calories=None if missing else value)
+                for restaurant_id, value, missing in zip(owners, calories, unknown)
+            ], batch_size=5000)
+            self.stdout.write(f'Inserted {options["restaurants"]} restaurants and {options["items"]} menu items '
+                              f'in {time.perf_counter() - started:.1f} s')
+
+            started = time.perf_counter()
+            recount_calories()
+            self.stdout.write(f'Counted every histogram in {time.perf_counter() - started:.1f} s')
+
+            base = Restaurant.objects.filter(is_approved=True)
+            modes = (
+                ('join', lambda name: base.filter(
+                    **{f'menu_items__{lookup}': value for lookup, value in CALORIE_RANGES[name].children}).distinct()),
+                ('columns', lambda name: base.filter(calorie_filter(name))),
+            )
+            self.stdout.write(f'{"range":<8} {"mode":>8} {"page ms":>9} {"count ms":>9} {"matches":>8}')
+            for name in CALORIE_RANGES:
+                for mode, query in modes:
+                    page = count = 0.0
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        list(query(name)[:options['page']])
+                        page += time.perf_counter() - started
+                        started = time.perf_counter()
+                        matches = query(name).count()
+                        count += time.perf_counter() - started
+                    self.stdout.write(f'{name:<8} {mode:>8} {page * 1000 / options["repeat"]:>9.1f} '
+                                      f'{count * 1000 / options["repeat"]:>9.1f} {matches:>8}')
+
+            # Cost of the signal path: recounting one restaurant after a menu change
+            sample = rng.choice(restaurant_ids, size=min(500, len(restaurant_ids)), replace=False).tolist()
+            started = time.perf_counter()
+            for restaurant_id in sample:
+                recount_calories([restaurant_id])
+            self.stdout.write(f'Recounting one restaurant: {(time.perf_counter() - started) * 1000 / len(sample):.2f} ms')
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
@@ -0,0 +1,87 @@
+import time
+import uuid
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from restaurants.calories import CALORIE_RANGES, calorie_filter
+from restaurants.facets import RATING_BANDS, clean_filters, count_facets, facets_for
+from restaurants.models import Restaurant
+from restaurants.suggest import catalog_changed
+from .bench_search import CUISINES
+
+
+# Filter combinations people pick, from none to all four
+COMBINATIONS = [{}, {'veg': 'True'}, {'cuisine': 'Indian'}, {'rating': '4.0', 'calorie_range': 'low'},
+                {'cuisine': 'Italian', 'veg': 'True', 'rating': '3.5', 'calorie_range': 'medium'}]
+
+
+class Command(BaseCommand):
+    help = 'Time facet counts: a COUNT per option, the grouped query and the cache (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=50_000, help='Restaurants to create')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per combination')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        count = options['restaurants']
+
+        with transaction.atomic():
+            owner = User.objects.create_user(username=f'bench-facets-owner-{uuid.uuid4().hex[:8]}')
+            started = time.perf_counter()
+            cuisines = rng.integers(0, len(CUISINES), size=count).tolist()
+            ratings = rng.choice(np.arange(20, 51) / 10, size=count).tolist()
+            veg = (rng.random(count) < 0.3).tolist()
+            # Histogram columns as calories.py would count them
+            histograms = rng.poisson([4, 10, 3], size=(count, 3)).tolist()
+            Restaurant.objects.bulk_create([
+                Restaurant(owner=owner, name=f'Bench {i}', cuisine=CUISINES[cuisine], location='Benchmark',
+                           description='', rating=rating, is_veg=is_veg, low_calorie_items=low,
+                           medium_calorie_items=medium, high_calorie_items=high)
+                for i, (cuisine, rating, is_veg, (low, medium, high))
+                in enumerate(zip(cuisines, ratings, veg, histograms))
+            ], batch_size=5000)
+            self.stdout.write(f'Inserted {count} restaurants in {time.perf_counter() - started:.1f} s')
+
+            self.stdout.write(f'{"filters":<70} {"per-option ms":>14} {"grouped ms":>11} {"cached ms":>10}')
+            for params in COMBINATIONS:
+                filters = clean_filters(params)
+                facets_for(filters, 'bench')
+                timings = []
+                for run in (self._count_each_option, count_facets, lambda filters: facets_for(filters, 'bench')):
+                    started = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        facets = run(filters)
+                    timings.append((time.perf_counter() - started) * 1000 / options['repeat'])
+                self.stdout.write(f'{str(params):<70} {timings[0]:>14.1f} {timings[1]:>11.1f} {timings[2]:>10.3f} '
+                                  f'({facets["total"]} listed)')
+            transaction.set_rollback(True)
+        # The cached counts were of rolled-back restaurants
+        catalog_changed()
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
+
+    def _count_each_option(self, filters):
+        """The counts without facets.py: one COUNT query per option shown"""
+        def restaurants(skip):
+            queryset = Restaurant.objects.filter(is_approved=True)
+            if filters['cuisine'] and skip != 'cuisine':
+                queryset = queryset.filter(cuisine__icontains=filters['cuisine'])
+            if filters['veg'] and skip != 'veg':
+                queryset = queryset.filter(is_veg=True)
+            if filters['rating'] is not None and skip != 'rating':
+                queryset = queryset.filter(rating__gte=filters['rating'])
+            if filters['calorie_range'] and skip != 'calorie_range':
+                queryset = queryset.filter(calorie_filter(filters['calorie_range']))
+            return queryset
+
+        return {
+            'total': restaurants(None).count(),
+            'cuisine': [(cuisine, restaurants('cuisine').filter(cuisine__iexact=cuisine).count()) for cuisine in CUISINES],
+            'veg': restaurants('veg').filter(is_veg=True).count(),
+            'rating': [(band, restaurants('rating').filter(rating__gte=float(band)).count()) for band in RATING_BANDS],
+            'calorie_range': {name: restaurants('calorie_range').filter(calorie_filter(name)).count()
+                              for name in CALORIE_RANGES},
+        }
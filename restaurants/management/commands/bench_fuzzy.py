@@ -0,0 +1,93 @@
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from restaurants.fuzzy import SymSpell, correct_word
+
+
+FOOD_WORDS = ['biryani', 'paneer', 'dosa', 'idli', 'sambar', 'chicken', 'mutton', 'tikka', 'masala', 'butter',
+              'haleem', 'kebab', 'pizza', 'noodles', 'manchurian', 'shawarma', 'falafel', 'gongura', 'pesarattu',
+              'uttapam', 'rasgulla', 'jamun', 'kulfi', 'lassi', 'hyderabadi', 'chettinad', 'mughlai', 'tandoori']
+CONSONANTS = list('bcdfghjklmnprstvy') + ['ch', 'sh', 'th', 'kh', 'bh']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'aa', 'ee']
+
+
+class Command(BaseCommand):
+    help = 'Time "did you mean" lookups against a synthetic vocabulary (nothing is stored)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terms', type=int, default=1_000_000, help='Vocabulary size')
+        parser.add_argument('--queries', type=int, default=2000, help='Misspelled words to correct')
+        parser.add_argument('--updates', type=int, default=10_000, help='Words added one at a time after the build')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        vocabulary = self._vocabulary(rng, options['terms'] + options['updates'])
+        terms, extra = vocabulary[:options['terms']], vocabulary[options['terms']:]
+        # Word frequencies are skewed: a few dishes are on every menu
+        frequencies = np.maximum(1, (1e5 / np.arange(1, len(terms) + 1)).astype(int))
+        rng.shuffle(frequencies)
+        frequencies[:len(FOOD_WORDS)] = 10_000
+
+        index = SymSpell(getattr(settings, 'FUZZY_MAX_DISTANCE', 2), getattr(settings, 'FUZZY_PREFIX_LENGTH', 7))
+        started = time.perf_counter()
+        index.load(zip(terms, frequencies.tolist()))
+        self.stdout.write(f'Indexed {len(terms)} words ({len(index._hashes)} deletes, '
+                          f'{(index._hashes.nbytes + index._owners.nbytes) / 2 ** 20:.0f} MB) '
+                          f'in {time.perf_counter() - started:.1f} s')
+
+        started = time.perf_counter()
+        for term in extra:
+            index.set(term, 1)
+        self.stdout.write(f'Added {len(extra)} words one at a time: '
+                          f'{(time.perf_counter() - started) * 1e6 / max(len(extra), 1):.0f} µs per word')
+
+        # One or two random edits of vocabulary words, the food words included
+        picks = rng.integers(0, len(terms), size=options['queries'])
+        picks[:len(FOOD_WORDS)] = np.arange(len(FOOD_WORDS))
+        originals = [terms[i] for i in picks.tolist()]
+        queries = [self._misspell(rng, word, 1 + int(rng.random() < 0.3)) for word in originals]
+
+        timings, corrected = [], 0
+        for original, query in zip(originals, queries):
+            started = time.perf_counter()
+            suggestion = correct_word(query, index)
+            timings.append((time.perf_counter() - started) * 1000)
+            corrected += suggestion == original
+        timings = np.array(timings)
+        self.stdout.write(f'{len(queries)} corrections: mean {timings.mean():.2f} ms, '
+                          f'p50 {np.percentile(timings, 50):.2f} ms, p99 {np.percentile(timings, 99):.2f} ms, '
+                          f'max {timings.max():.2f} ms')
+        self.stdout.write(f'Original word suggested for {corrected / len(queries):.1%} of the misspellings')
+        for original, query in list(zip(originals, queries))[:8]:
+            self.stdout.write(f'  {query!r} -> {correct_word(query, index)!r} (was {original!r})')
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
+
+    def _vocabulary(self, rng, size):
+        """FOOD_WORDS plus distinct made-up words of 2-4 syllables"""
+        words = dict.fromkeys(FOOD_WORDS)
+        while len(words) < size:
+            count = size - len(words)
+            lengths = rng.integers(2, 5, size=count).tolist()
+            consonants = rng.integers(0, len(CONSONANTS), size=(count, 4)).tolist()
+            vowels = rng.integers(0, len(VOWELS), size=(count, 4)).tolist()
+            for length, cs, vs in zip(lengths, consonants, vowels):
+                words[''.join(CONSONANTS[c] + VOWELS[v] for c, v in zip(cs[:length], vs[:length]))] = None
+        return list(words)[:size]
+
+    def _misspell(self, rng, word, edits):
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        for _ in range(edits):
+            i = int(rng.integers(0, len(word)))
+            kind = int(rng.integers(0, 4))
+            if kind == 0 and len(word) > 3:
+                word = word[:i] + word[i + 1:]
+            elif kind == 1:
+                word = word[:i] + letters[int(rng.integers(26))] + word[i:]
+            elif kind == 2:
+                word = word[:i] + letters[int(rng.integers(26))] + word[i + 1:]
+            elif i + 1 < len(word):
+                word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        return word
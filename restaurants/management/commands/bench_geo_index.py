@@ -0,0 +1,84 @@
+import time
+import uuid
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from foodify_project.geo import encode_geohashes, haversine_km
+from foodify_project.spatial import nearest, within_radius_q
+from restaurants.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Compare "k nearest within radius" queries: full scan vs the geohash index (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=1_000_000, help='Restaurants to create')
+        parser.add_argument('--region-km', type=float, default=200.0, help='Side of the square region the points cover')
+        parser.add_argument('--queries', type=int, default=200, help='Index queries to run')
+        parser.add_argument('--scan-queries', type=int, default=3, help='Full-scan queries to run (slow)')
+        parser.add_argument('--radius', type=float, default=2.0, help='Search radius in km')
+        parser.add_argument('--k', type=int, default=20, help='Nearest results wanted')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        center = np.array([17.385, 78.4867])
+        half = options['region_km'] / 2 / 111.195
+        spread = np.array([half, half / np.cos(np.radians(center[0]))])
+
+        with transaction.atomic():
+            run_id = uuid.uuid4().hex[:8]
+            owner = User.objects.create_user(username=f'bench-geo-owner-{run_id}')
+            started = time.perf_counter()
+            for first in range(0, options['points'], 50_000):
+                points = center + rng.uniform(-1, 1, size=(min(50_000, options['points'] - first), 2)) * spread
+                points = np.round(points, 6)
+                hashes = encode_geohashes(points[:, 0], points[:, 1])
+                Restaurant.objects.bulk_create([
+                    Restaurant(owner=owner, name=f'Bench {run_id}', cuisine='Benchmark', location='Benchmark',
+                               description='', latitude=lat, longitude=lng, geohash=geohash)
+                    for (lat, lng), geohash in zip(points.tolist(), hashes)
+                ], batch_size=5000)
+            self.stdout.write(f'Inserted {options["points"]} points in {time.perf_counter() - started:.1f} s')
+
+            queryset = Restaurant.objects.all()
+            targets = center + rng.uniform(-0.9, 0.9, size=(max(options['queries'], options['scan_queries']), 2)) * spread
+            radius, k = options['radius'], options['k']
+
+            self.stdout.write(f'{"mode":>6} {"queries":>8} {"ms/query":>9} {"rows read":>10} {"results":>8}')
+            scan_results = []
+            started = time.perf_counter()
+            for lat, lng in targets[:options['scan_queries']].tolist():
+                ids, lats, lngs = zip(*queryset.values_list('id', 'latitude', 'longitude'))
+                distances = haversine_km(lat, lng, np.array(lats, dtype=float), np.array(lngs, dtype=float))
+                in_range = np.flatnonzero(distances <= radius)
+                ranked = in_range[np.argsort(distances[in_range], kind='stable')][:k]
+                scan_results.append([ids[i] for i in ranked.tolist()])
+            self._report('scan', time.perf_counter() - started, options['scan_queries'], options['points'], scan_results)
+
+            index_results = []
+            started = time.perf_counter()
+            for lat, lng in targets[:options['queries']].tolist():
+                found = nearest(queryset.only('id', 'latitude', 'longitude'), lat, lng, radius, k)
+                index_results.append([restaurant.id for restaurant, _ in found])
+            elapsed = time.perf_counter() - started
+            rows_read = sum(
+                queryset.filter(within_radius_q(lat, lng, radius)).count()
+                for lat, lng in targets[:options['queries']].tolist()
+            )
+            self._report('index', elapsed, options['queries'], rows_read / options['queries'], index_results)
+
+            mismatches = sum(
+                1 for scanned, indexed in zip(scan_results, index_results)
+                if scanned != indexed
+            )
+            self.stdout.write(f'Index results differing from the full scan: {mismatches} of {len(scan_results)}')
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
+
+    def _report(self, mode, elapsed, queries, rows_read, results):
+        mean_results = sum(len(found) for found in results) / max(len(results), 1)
+        self.stdout.write(f'{mode:>6} {queries:>8} {elapsed * 1000 / max(queries, 1):>9.1f} '
+                          f'{rows_read:>10.0f} {mean_results:>8.1f}')
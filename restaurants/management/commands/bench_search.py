@@ -0,0 +1,123 @@
+import time
+import uuid
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from restaurants.models import MenuItem, Restaurant
+from restaurants.search import index_restaurants, is_supported, rebuild_index, search_restaurant_ids
+
+
+CUISINES = ['North Indian', 'South Indian', 'Hyderabadi', 'Chinese', 'Italian', 'Mexican', 'Thai', 'Japanese',
+            'Continental', 'Street Food', 'Bengali', 'Mughlai', 'Andhra', 'Chettinad', 'Lebanese', 'Korean']
+DISHES = ['biryani', 'paneer tikka', 'butter chicken', 'masala dosa', 'idli', 'vada', 'haleem', 'kebab',
+          'pizza', 'pasta', 'risotto', 'lasagna', 'noodles', 'fried rice', 'manchurian', 'dumplings', 'momos',
+          'tacos', 'burrito', 'quesadilla', 'nachos', 'pad thai', 'green curry', 'sushi', 'ramen', 'tempura',
+          'falafel', 'shawarma', 'hummus', 'kimchi', 'bibimbap', 'dal makhani', 'chole bhature', 'pav bhaji',
+          'pani puri', 'samosa', 'rasgulla', 'gulab jamun', 'kulfi', 'lassi', 'filter coffee', 'uttapam',
+          'pesarattu', 'gongura mutton', 'chicken 65', 'fish curry', 'prawn masala', 'mutton rogan josh']
+WORDS = ['spicy', 'crispy', 'creamy', 'tangy', 'smoky', 'fresh', 'homemade', 'classic', 'signature', 'served',
+         'with', 'rice', 'bread', 'sauce', 'gravy', 'chutney', 'onions', 'tomatoes', 'garlic', 'ginger', 'herbs',
+         'cheese', 'butter', 'yogurt', 'coconut', 'tamarind', 'saffron', 'cashews', 'lentils', 'potatoes',
+         'chicken', 'mutton', 'paneer', 'vegetables', 'slow', 'cooked', 'grilled', 'tandoor', 'wok', 'tossed',
+         'stuffed', 'baked', 'family', 'recipe', 'portion', 'chef', 'special', 'traditional', 'authentic']
+NAMES = ['Spice', 'Royal', 'Grand', 'Paradise', 'Golden', 'Urban', 'Little', 'Blue', 'Tandoor', 'Saffron',
+         'Dragon', 'Bella', 'Cafe', 'Kitchen', 'House', 'Bistro', 'Dhaba', 'Express', 'Garden', 'Corner']
+# (label, query): dish words, a prefix, a cuisine + dish, and a multi-word dish
+QUERIES = [('dish', 'biryani'), ('dish', 'ramen'), ('prefix', 'shawa'), ('prefix', 'gul'),
+           ('cuisine+dish', 'andhra gongura'), ('cuisine+dish', 'italian risotto'), ('phrase', 'butter chicken'),
+           ('name', 'saffron')]
+
+
+class Command(BaseCommand):
+    help = 'Compare LIKE scans and the full-text index on synthetic restaurants and menus (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=50_000, help='Restaurants to create')
+        parser.add_argument('--items', type=int, default=2_000_000, help='Menu items to create')
+        parser.add_argument('--repeat', type=int, default=20, help='Index runs per query')
+        parser.add_argument('--scan-repeat', type=int, default=1, help='LIKE runs per query (slow)')
+        parser.add_argument('--limit', type=int, default=500, help='Ranked results wanted')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError(f'No search index on {connection.vendor}')
+        rng = np.random.default_rng(options['seed'])
+
+        with transaction.atomic():
+            run_id = uuid.uuid4().hex[:8]
+            owner = User.objects.create_user(username=f'bench-search-owner-{run_id}')
+            started = time.perf_counter()
+            restaurant_ids = self._create_restaurants(rng, owner, options['restaurants'])
+            self._create_items(rng, restaurant_ids, options['items'])
+            self.stdout.write(f'Inserted {options["restaurants"]} restaurants and {options["items"]} menu items '
+                              f'in {time.perf_counter() - started:.1f} s')
+
+            started = time.perf_counter()
+            rebuild_index()
+            self.stdout.write(f'Built the index in {time.perf_counter() - started:.1f} s')
+
+            # The old listing query, and LIKE extended to the fields the index covers
+            base = Restaurant.objects.filter(is_approved=True)
+            modes = (
+                ('like', options['scan_repeat'], lambda query: list(
+                    (base.filter(name__icontains=query) | base.filter(cuisine__icontains=query))
+                    .values_list('id', flat=True))),
+                ('like-all', options['scan_repeat'], lambda query: list(
+                    base.filter(Q(name__icontains=query) | Q(cuisine__icontains=query)
+                                | Q(description__icontains=query) | Q(menu_items__name__icontains=query)
+                                | Q(menu_items__description__icontains=query))
+                    .distinct().values_list('id', flat=True))),
+                ('index', options['repeat'], lambda query: search_restaurant_ids(query, options['limit'])),
+            )
+
+            self.stdout.write(f'{"query":<32} {"mode":>9} {"ms/query":>9} {"results":>8}')
+            totals = {mode: [] for mode, _, _ in modes}
+            for label, query in QUERIES:
+                for mode, repeat, run in modes:
+                    started = time.perf_counter()
+                    for _ in range(max(repeat, 1)):
+                        found = run(query)
+                    elapsed = (time.perf_counter() - started) * 1000 / max(repeat, 1)
+                    totals[mode].append(elapsed)
+                    self.stdout.write(f'{f"{query} ({label})":<32} {mode:>9} {elapsed:>9.1f} {len(found):>8}')
+            self.stdout.write('Mean ms/query: ' + ', '.join(
+                f'{mode} {np.mean(timings):.1f}' for mode, timings in totals.items()))
+
+            # Cost of the signal path: rebuilding one restaurant's document
+            sample = rng.choice(restaurant_ids, size=min(200, len(restaurant_ids)), replace=False).tolist()
+            started = time.perf_counter()
+            for restaurant_id in sample:
+                index_restaurants([restaurant_id])
+            self.stdout.write(f'Reindexing one restaurant: {(time.perf_counter() - started) * 1000 / len(sample):.2f} ms')
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
+
+    def _create_restaurants(self, rng, owner, count):
+        cuisines = rng.integers(0, len(CUISINES), size=count)
+        names = rng.integers(0, len(NAMES), size=(count, 2))
+        words = rng.integers(0, len(WORDS), size=(count, 8))
+        restaurants = Restaurant.objects.bulk_create([
+            Restaurant(owner=owner, name=f'{NAMES[first]} {NAMES[second]} {i}', cuisine=CUISINES[cuisine],
+                       location='Benchmark', description=' '.join(WORDS[w] for w in row))
+            for i, (cuisine, (first, second), row) in enumerate(zip(cuisines.tolist(), names.tolist(), words.tolist()))
+        ], batch_size=5000)
+        return [restaurant.pk for restaurant in restaurants]
+
+    def _create_items(self, rng, restaurant_ids, count, chunk=100_000):
+        # Dish popularity is skewed, like real menus
+        weights = 1.0 / np.arange(1, len(DISHES) + 1)
+        weights /= weights.sum()
+        for first in range(0, count, chunk):
+            size = min(chunk, count - first)
+            owners = rng.choice(restaurant_ids, size=size).tolist()
+            dishes = rng.choice(len(DISHES), size=size, p=weights).tolist()
+            words = rng.integers(0, len(WORDS), size=(size, 6)).tolist()
+            MenuItem.objects.bulk_create([
+                MenuItem(restaurant_id=restaurant_id, name=DISHES[dish].title(), price=199,
+                         description=' '.join(WORDS[w] for w in row))
+                for restaurant_id, dish, row in zip(owners, dishes, words)
+            ], batch_size=5000)
@@ -0,0 +1,92 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from restaurants import suggest, views
+from restaurants.suggest import Suggestion, SuggestIndex
+from .bench_fuzzy import CONSONANTS, VOWELS
+from .bench_search import CUISINES, DISHES, NAMES, WORDS
+
+
+class Command(BaseCommand):
+    help = 'Time autocomplete on a synthetic catalog held in memory (nothing is stored)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=50_000, help='Restaurant names')
+        parser.add_argument('--dishes', type=int, default=100_000, help='Distinct dish names')
+        parser.add_argument('--queries', type=int, default=20_000, help='Prefixes to complete')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        suggestions = self._suggestions(rng, options['restaurants'], options['dishes'])
+
+        started = time.perf_counter()
+        index = SuggestIndex(suggestions, version='bench')
+        self.stdout.write(f'Indexed {len(suggestions)} suggestions ({len(index.keys)} keys, '
+                          f'{len(index.precomputed)} precomputed prefixes) in {time.perf_counter() - started:.1f} s')
+
+        # Prefixes of 1-8 characters of the words people type
+        texts = [suggestions[i].text for i in rng.integers(0, len(suggestions), size=options['queries']).tolist()]
+        queries = []
+        for text, cut in zip(texts, rng.integers(1, 9, size=len(texts)).tolist()):
+            words = text.split()
+            word = words[int(rng.integers(0, len(words)))]
+            queries.append(word[:cut])
+
+        timings, empty = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            found = index.complete(query)
+            timings.append((time.perf_counter() - started) * 1000)
+            empty += not found
+        self._report('complete()', np.array(timings))
+        self.stdout.write(f'  {empty} prefixes without suggestions')
+
+        # The whole view, with the synthetic index swapped in for this process's
+        factory, previous = RequestFactory(), suggest._index
+        suggest._index, suggest._checked_at = index, time.monotonic() + 3600
+        try:
+            timings = []
+            with CaptureQueriesContext(connection) as queries_run:
+                for query in queries[:5000]:
+                    request = factory.get('/restaurants/api/suggest/', {'q': query})
+                    started = time.perf_counter()
+                    views.suggest(request)
+                    timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            suggest._index, suggest._checked_at = previous, 0.0
+        self._report('view', np.array(timings))
+        self.stdout.write(f'  {len(queries_run)} database queries')
+
+        for query in ['b', 'bir', 'chicken', 'hyd', 'saff']:
+            self.stdout.write(f'  {query!r}: ' + ', '.join(s.text for s in index.complete(query, 5)))
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete (no data was kept)'))
+
+    def _report(self, label, timings):
+        self.stdout.write(f'{label}: mean {timings.mean() * 1000:.0f} µs, p50 {np.percentile(timings, 50) * 1000:.0f} µs, '
+                          f'p99 {np.percentile(timings, 99) * 1000:.0f} µs, max {timings.max():.2f} ms')
+
+    def _suggestions(self, rng, restaurants, dishes):
+        # Order counts are skewed: a few restaurants and dishes get most orders
+        weights = (1e5 / np.arange(1, restaurants + dishes + 1)).astype(int)
+        rng.shuffle(weights)
+        weights = weights.tolist()
+
+        suggestions = [Suggestion(cuisine, 'cuisine', 0, 1) for cuisine in CUISINES]
+        names = rng.integers(0, len(NAMES), size=(restaurants, 2)).tolist()
+        for i, (first, second) in enumerate(names):
+            suggestions.append(Suggestion(f'{NAMES[first]} {NAMES[second]} {i}', 'restaurant', weights[i], 4.0, i + 1))
+
+        # The real dishes, then made-up ones: "<adjective> <made-up word> <dish>"
+        texts = dict.fromkeys(dish.title() for dish in DISHES)
+        while len(texts) < dishes:
+            word = ''.join(CONSONANTS[c] + VOWELS[v] for c, v in zip(
+                rng.integers(0, len(CONSONANTS), size=3).tolist(), rng.integers(0, len(VOWELS), size=3).tolist()))
+            texts[f'{WORDS[int(rng.integers(len(WORDS)))]} {word} {DISHES[int(rng.integers(len(DISHES)))]}'.title()] = None
+        suggestions.extend(Suggestion(text, 'dish', weights[restaurants + i], 1)
+                           for i, text in enumerate(list(texts)[:dishes]))
+        return suggestions
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:51
+
+import math
+from django.db import migrations, models
+
+
+# foodify_project.geo.encode_geohash when this migration was written, without NumPy
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=9):
+    bits = 5 * precision
+    lat_bits, lng_bits = bits // 2, bits - bits // 2
+    lat_index = min(max(math.floor((float(latitude) + 90.0) / 180.0 * (1 << lat_bits)), 0), (1 << lat_bits) - 1)
+    lng_index = min(max(math.floor((float(longitude) + 180.0) / 360.0 * (1 << lng_bits)), 0), (1 << lng_bits) - 1)
+    # Bits interleaved starting with longitude
+    value = 0
+    for bit in range(lng_bits):
+        value |= ((lng_index >> (lng_bits - 1 - bit)) & 1) << (bits - 1 - 2 * bit)
+    for bit in range(lat_bits):
+        value |= ((lat_index >> (lat_bits - 1 - bit)) & 1) << (bits - 2 - 2 * bit)
+    return ''.join(GEOHASH_ALPHABET[(value >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+
+def backfill_geohash(apps, schema_editor):
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    alias = schema_editor.connection.alias
+    rows = list(Restaurant.objects.using(alias).filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude'))
+    for row in rows:
+        row.geohash = encode_geohash(row.latitude, row.longitude)
+    Restaurant.objects.using(alias).bulk_update(rows, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0004_menuitem_calories'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Spatial index of latitude/longitude', max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
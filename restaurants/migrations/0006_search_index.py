@@ -0,0 +1,65 @@
+from django.db import migrations
+
+
+# The search table and its first fill as restaurants/search.py built them
+# when this migration was written, frozen so later changes there cannot
+# change what this migration does.
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE restaurants_search USING fts5("
+    "name, cuisine, description, menu_names, menu_descriptions, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+SQLITE_FILL = """
+    INSERT INTO restaurants_search (rowid, name, cuisine, description, menu_names, menu_descriptions)
+    SELECT r.id, r.name, r.cuisine, r.description,
+           COALESCE(group_concat(m.name, ' '), ''), COALESCE(group_concat(m.description, ' '), '')
+    FROM restaurants_restaurant r LEFT JOIN restaurants_menuitem m ON m.restaurant_id = r.id
+    GROUP BY r.id
+"""
+POSTGRES_CREATE = (
+    'CREATE TABLE restaurants_search ('
+    'restaurant_id bigint PRIMARY KEY REFERENCES restaurants_restaurant (id) '
+    'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)'
+)
+POSTGRES_FILL = """
+    INSERT INTO restaurants_search (restaurant_id, document)
+    SELECT r.id,
+           setweight(to_tsvector('simple', r.name), 'A')
+           || setweight(to_tsvector('simple', r.cuisine), 'A')
+           || setweight(to_tsvector('simple', coalesce(m.names, '')), 'B')
+           || setweight(to_tsvector('simple', r.description), 'C')
+           || setweight(to_tsvector('simple', coalesce(m.descriptions, '')), 'D')
+    FROM restaurants_restaurant r LEFT JOIN LATERAL (
+        SELECT string_agg(name, ' ') AS names, string_agg(description, ' ') AS descriptions
+        FROM restaurants_menuitem WHERE restaurant_id = r.id
+    ) m ON true
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_FILL)
+        schema_editor.execute("INSERT INTO restaurants_search (restaurants_search) VALUES ('optimize')")
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_CREATE)
+        schema_editor.execute('CREATE INDEX restaurants_search_document_idx ON restaurants_search USING GIN (document)')
+        schema_editor.execute(POSTGRES_FILL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS restaurants_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0005_restaurant_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
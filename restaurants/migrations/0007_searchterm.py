@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:39
+
+from django.db import migrations, models
+
+
+# As restaurants/search.py counted the vocabulary when this migration was
+# written: restaurants using each word of a name, cuisine or dish name
+SQLITE_TERM_COUNTS = (
+    "SELECT term, SUM(doc) FROM restaurants_search_vocab "
+    "WHERE col IN ('name', 'cuisine', 'menu_names') GROUP BY term"
+)
+POSTGRES_TERM_COUNTS = "SELECT word, ndoc FROM ts_stat('SELECT ts_filter(document, ''{a,b}'') FROM restaurants_search')"
+
+
+def create_vocabulary(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("CREATE VIRTUAL TABLE restaurants_search_vocab USING fts5vocab(restaurants_search, 'col')")
+
+
+def drop_vocabulary(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS restaurants_search_vocab')
+
+
+def backfill_terms(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        query = SQLITE_TERM_COUNTS
+    elif connection.vendor == 'postgresql':
+        query = POSTGRES_TERM_COUNTS
+    else:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        counts = cursor.fetchall()
+    SearchTerm = apps.get_model('restaurants', 'SearchTerm')
+    max_length = SearchTerm._meta.get_field('term').max_length
+    SearchTerm.objects.using(connection.alias).bulk_create(
+        [SearchTerm(term=term, frequency=frequency) for term, frequency in counts if len(term) <= max_length],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, unique=True)),
+                ('frequency', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.RunPython(create_vocabulary, drop_vocabulary),
+        migrations.RunPython(backfill_terms, migrations.RunPython.noop),
+    ]
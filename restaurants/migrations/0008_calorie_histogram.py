@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:01
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+# The ranges of restaurants/calories.py when this migration was written
+CALORIE_RANGES = {
+    'low': Q(calories__lte=300),
+    'medium': Q(calories__gt=300, calories__lte=600),
+    'high': Q(calories__gt=600),
+}
+
+
+def count_calories(apps, schema_editor):
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    MenuItem = apps.get_model('restaurants', 'MenuItem')
+    alias = schema_editor.connection.alias
+    menu = MenuItem.objects.using(alias).filter(restaurant=OuterRef('pk')).order_by().values('restaurant')
+
+    def per_restaurant(aggregate):
+        return Subquery(menu.annotate(value=aggregate).values('value'))
+
+    columns = {f'{name}_calorie_items': Coalesce(per_restaurant(Count('pk', filter=condition)), 0)
+               for name, condition in CALORIE_RANGES.items()}
+    Restaurant.objects.using(alias).update(
+        min_calories=per_restaurant(Min('calories')), max_calories=per_restaurant(Max('calories')), **columns)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0007_searchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='high_calorie_items',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Menu items of more than 600 calories'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='low_calorie_items',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Menu items of 300 calories or less'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='max_calories',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='medium_calorie_items',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Menu items of 301-600 calories'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='min_calories',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(count_calories, migrations.RunPython.noop),
+    ]
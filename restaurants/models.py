@@ -1,10 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from foodify_project.spatial import GeohashedModelMixin
 
 
-class Restaurant(models.Model):
+class Restaurant(GeohashedModelMixin, models.Model):
     """Restaurant model with all details"""
+    GEOHASH_FIELDS = {'geohash': ('latitude', 'longitude')}
+    
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_restaurants')
     name = models.CharField(max_length=200)
     cuisine = models.CharField(max_length=100)
@@ -17,11 +20,18 @@ class Restaurant(models.Model):
     location = models.CharField(max_length=200)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text='Restaurant latitude for maps')
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text='Restaurant longitude for maps')
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False, help_text='Spatial index of latitude/longitude')
     distance = models.DecimalField(max_digits=4, decimal_places=1, default=5.0)  # in km
     image = models.ImageField(upload_to='restaurant_images/', blank=True, null=True)
     description = models.TextField()
     is_veg = models.BooleanField(default=False)
     is_approved = models.BooleanField(default=True)  # Admin can approve/reject
+    # Calorie histogram of the menu, maintained by calories.py
+    low_calorie_items = models.PositiveIntegerField(default=0, db_index=True, editable=False, help_text='Menu items of 300 calories or less')
+    medium_calorie_items = models.PositiveIntegerField(default=0, db_index=True, editable=False, help_text='Menu items of 301-600 calories')
+    high_calorie_items = models.PositiveIntegerField(default=0, db_index=True, editable=False, help_text='Menu items of more than 600 calories')
+    min_calories = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    max_calories = models.PositiveIntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -63,3 +73,17 @@ class Favorite(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.restaurant.name}"
+
+
+class SearchTerm(models.Model):
+    """
+    A word of the search vocabulary (restaurant names, cuisines and dish
+    names) and how many restaurants use it. Maintained by search.py and read
+    by the fuzzy matcher; a frequency of 0 means the word is gone.
+    """
+    term = models.CharField(max_length=100, unique=True)
+    frequency = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.term} ({self.frequency})"
@@ -0,0 +1,299 @@
+"""
+Full-text search over restaurants and their menus.
+
+Each restaurant gets one document in the restaurants_search table: its name,
+cuisine and description plus the names and descriptions of all its menu
+items. The table is an inverted index, so a query reads the posting lists of
+its words instead of scanning every row with LIKE '%word%'.
+
+- SQLite (development): an FTS5 virtual table keyed by rowid = restaurant
+  id and ranked with bm25().
+- PostgreSQL (production): a tsvector column with a GIN index. PostgreSQL
+  has no built-in BM25; ts_rank_cd with length normalization is used instead.
+
+On both, fields are weighted: name over cuisine and dish names over
+descriptions. Words are not stemmed: stemmers mangle partial words ("biry"
+becomes "biri"), so every query word is a prefix match instead, with a
+trailing plural s dropped. "biry" and "dosas" find biryani and dosa.
+
+signals.py reindexes a restaurant when it or one of its menu items is saved
+or deleted, once per transaction after commit. Bulk writes (bulk_create,
+QuerySet.update) send no signals; follow them with rebuild_index() and
+rebuild_terms() (`manage.py rebuild_search_index`). On other databases search_restaurant_ids()
+returns None and callers fall back to LIKE.
+
+Reindexing also keeps the SearchTerm vocabulary current: the words of
+names, cuisines and dish names, each with the number of restaurants using
+it, read back from the index. Only words whose counts can have changed are
+recounted, and a version stamp in the cache tells the fuzzy matcher
+(fuzzy.py) in every process to fetch them.
+"""
+import re
+import threading
+import unicodedata
+import uuid
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import SearchTerm
+
+
+TABLE = 'restaurants_search'
+VOCABULARY_TABLE = 'restaurants_search_vocab'
+# (generation, change): a new generation means the vocabulary was rebuilt
+VOCABULARY_VERSION_KEY = 'restaurants:search:vocabulary'
+# Document columns whose words make up the vocabulary
+TERM_COLUMNS = ('name', 'cuisine', 'menu_names')
+# bm25() column weights: name, cuisine, description, menu item names, menu item descriptions
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0, 4.0, 0.5)
+# ts_rank_cd weights of the D, C, B, A labels set in _POSTGRES_DOCUMENT
+POSTGRES_WEIGHTS = '{0.05, 0.2, 0.5, 1.0}'
+POSTGRES_CONFIG = 'simple'
+MAX_QUERY_WORDS = 8
+
+_SQLITE_DOCUMENT = """
+    SELECT r.id, r.name, r.cuisine, r.description,
+           COALESCE(group_concat(m.name, ' '), ''), COALESCE(group_concat(m.description, ' '), '')
+    FROM restaurants_restaurant r LEFT JOIN restaurants_menuitem m ON m.restaurant_id = r.id
+    {where} GROUP BY r.id
+"""
+_POSTGRES_DOCUMENT = f"""
+    SELECT r.id,
+           setweight(to_tsvector('{POSTGRES_CONFIG}', r.name), 'A')
+           || setweight(to_tsvector('{POSTGRES_CONFIG}', r.cuisine), 'A')
+           || setweight(to_tsvector('{POSTGRES_CONFIG}', coalesce(m.names, '')), 'B')
+           || setweight(to_tsvector('{POSTGRES_CONFIG}', r.description), 'C')
+           || setweight(to_tsvector('{POSTGRES_CONFIG}', coalesce(m.descriptions, '')), 'D')
+    FROM restaurants_restaurant r LEFT JOIN LATERAL (
+        SELECT string_agg(name, ' ') AS names, string_agg(description, ' ') AS descriptions
+        FROM restaurants_menuitem WHERE restaurant_id = r.id
+    ) m ON true
+    {{where}}
+"""
+
+
+def is_supported(using=None):
+    return (using or connection).vendor in ('sqlite', 'postgresql')
+
+
+def create_index(schema_editor):
+    """Create the search table for the schema editor's database (migration helper)"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            f"name, cuisine, description, menu_names, menu_descriptions, "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE} ('
+            f'restaurant_id bigint PRIMARY KEY REFERENCES restaurants_restaurant (id) '
+            f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX {TABLE}_document_idx ON {TABLE} USING GIN (document)')
+
+
+def drop_index(schema_editor):
+    if is_supported(schema_editor.connection):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def create_vocabulary(schema_editor):
+    """Create the per-column word counts of the SQLite index (migration helper)"""
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"CREATE VIRTUAL TABLE {VOCABULARY_TABLE} USING fts5vocab({TABLE}, 'col')")
+
+
+def drop_vocabulary(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {VOCABULARY_TABLE}')
+
+
+def tokenize(text):
+    # The words FTS5's unicode61 tokenizer produces: lowercased, without diacritics
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(char))
+    return re.findall(r'[^\W_]+', text)
+
+
+def _document_terms(cursor, ids):
+    """{restaurant_id: {(column, term)}} of the vocabulary words in these documents"""
+    placeholders = ', '.join(['%s'] * len(ids))
+    terms = {}
+    if connection.vendor == 'sqlite':
+        cursor.execute(f'SELECT rowid, {", ".join(TERM_COLUMNS)} FROM {TABLE} WHERE rowid IN ({placeholders})', ids)
+        for restaurant_id, *texts in cursor.fetchall():
+            terms[restaurant_id] = {(column, term) for column, text in zip(TERM_COLUMNS, texts) for term in tokenize(text)}
+    else:
+        # Name, cuisine and dish names carry weights A and B
+        cursor.execute(
+            f"SELECT restaurant_id, lexeme FROM {TABLE}, unnest(document) "
+            f"WHERE restaurant_id IN ({placeholders}) AND weights && ARRAY['A', 'B']::\"char\"[]", ids)
+        for restaurant_id, term in cursor.fetchall():
+            terms.setdefault(restaurant_id, set()).add((None, term))
+    return terms
+
+
+def _count_terms(cursor, terms, chunk=500):
+    """{term: restaurants using it} for these words, 0 for words no longer used"""
+    terms = sorted(terms)
+    counts = dict.fromkeys(terms, 0)
+    for start in range(0, len(terms), chunk):
+        batch = terms[start:start + chunk]
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f'SELECT term, SUM(doc) FROM {VOCABULARY_TABLE} WHERE term IN ({", ".join(["%s"] * len(batch))}) '
+                f'AND col IN ({", ".join(["%s"] * len(TERM_COLUMNS))}) GROUP BY term', [*batch, *TERM_COLUMNS])
+        else:
+            cursor.execute(
+                f"SELECT term, (SELECT COUNT(*) FROM {TABLE} WHERE document @@ (quote_literal(term) || ':AB')::tsquery) "
+                f"FROM unnest(%s::text[]) AS term", [batch])
+        counts.update(cursor.fetchall())
+    return counts
+
+
+def _all_term_counts(cursor):
+    if connection.vendor == 'sqlite':
+        cursor.execute(f'SELECT term, SUM(doc) FROM {VOCABULARY_TABLE} '
+                       f'WHERE col IN ({", ".join(["%s"] * len(TERM_COLUMNS))}) GROUP BY term', TERM_COLUMNS)
+    else:
+        cursor.execute(f"SELECT word, ndoc FROM ts_stat('SELECT ts_filter(document, ''{{a,b}}'') FROM {TABLE}')")
+    return cursor.fetchall()
+
+
+def _bump_vocabulary_version(rebuilt=False):
+    generation, _ = cache.get(VOCABULARY_VERSION_KEY) or (None, None)
+    if rebuilt or generation is None:
+        generation = uuid.uuid4().hex
+    cache.set(VOCABULARY_VERSION_KEY, (generation, uuid.uuid4().hex), None)
+
+
+def _store_terms(counts):
+    max_length = SearchTerm._meta.get_field('term').max_length
+    now = timezone.now()
+    SearchTerm.objects.bulk_create(
+        [SearchTerm(term=term, frequency=frequency, updated_at=now)
+         for term, frequency in counts if len(term) <= max_length],
+        update_conflicts=True, unique_fields=['term'], update_fields=['frequency', 'updated_at'], batch_size=1000,
+    )
+
+
+def rebuild_terms():
+    """Recount the whole vocabulary from the index; returns the number of words"""
+    if not is_supported():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        counts = _all_term_counts(cursor)
+        SearchTerm.objects.all().delete()
+        _store_terms(counts)
+        transaction.on_commit(lambda: _bump_vocabulary_version(rebuilt=True))
+    return len(counts)
+
+
+def _write(cursor, ids):
+    where, params = '', []
+    if ids is not None:
+        where = 'WHERE r.id IN ({})'.format(', '.join(['%s'] * len(ids)))
+        params = list(ids)
+    if connection.vendor == 'sqlite':
+        cursor.execute(f'INSERT INTO {TABLE} (rowid, name, cuisine, description, menu_names, menu_descriptions) '
+                       + _SQLITE_DOCUMENT.format(where=where), params)
+    else:
+        cursor.execute(f'INSERT INTO {TABLE} (restaurant_id, document) '
+                       + _POSTGRES_DOCUMENT.format(where=where), params)
+
+
+def index_restaurants(restaurant_ids, chunk=500):
+    """
+    (Re)build the documents of these restaurants from their current rows.
+    Ids of restaurants that no longer exist are removed from the index.
+    """
+    if not is_supported():
+        return
+    restaurant_ids = sorted(set(restaurant_ids))
+    key = 'rowid' if connection.vendor == 'sqlite' else 'restaurant_id'
+    with transaction.atomic(), connection.cursor() as cursor:
+        changed = set()
+        for start in range(0, len(restaurant_ids), chunk):
+            ids = restaurant_ids[start:start + chunk]
+            before = _document_terms(cursor, ids)
+            cursor.execute(f'DELETE FROM {TABLE} WHERE {key} IN ({", ".join(["%s"] * len(ids))})', ids)
+            _write(cursor, ids)
+            after = _document_terms(cursor, ids)
+            # Only words added to or dropped from a document change their counts
+            for restaurant_id in before.keys() | after.keys():
+                changed.update(term for _, term in before.get(restaurant_id, set()) ^ after.get(restaurant_id, set()))
+        if changed:
+            _store_terms(_count_terms(cursor, changed).items())
+            transaction.on_commit(_bump_vocabulary_version)
+
+
+def rebuild_index():
+    """Rebuild every document in one pass; returns the number of restaurants indexed"""
+    if not is_supported():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        _write(cursor, None)
+        if connection.vendor == 'sqlite':
+            # Merge the segments written by the bulk insert
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+_pending = threading.local()
+
+
+def _flush_pending():
+    ids, _pending.ids = getattr(_pending, 'ids', set()), set()
+    if ids:
+        index_restaurants(ids)
+
+
+def schedule_reindex(restaurant_id):
+    """
+    Reindex a restaurant when the current transaction commits. Restaurants
+    touched several times in one transaction are reindexed once.
+    """
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    _pending.ids.add(restaurant_id)
+    # Callbacks after the first find the set empty. Ids left over by a
+    # rolled-back transaction are flushed with the next one, harmlessly.
+    transaction.on_commit(_flush_pending)
+
+
+def query_words(query):
+    """Lowercased prefixes of a user query's words, safe to put into a MATCH/tsquery"""
+    return [word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+            for word in re.findall(r'[^\W_]+', query.lower())[:MAX_QUERY_WORDS]]
+
+
+def search_restaurant_ids(query, limit=500):
+    """
+    Restaurant ids matching every word of `query` (as a prefix), best match
+    first. Returns [] for a query without words and None if the database has
+    no search index.
+    """
+    if not is_supported():
+        return None
+    words = query_words(query)
+    if not words:
+        return []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY bm25({TABLE}, {weights}) LIMIT %s',
+                [' '.join(f'"{word}"*' for word in words), limit],
+            )
+        else:
+            # Normalization 1 divides by 1 + log(document length), like BM25's length penalty
+            cursor.execute(
+                f"SELECT restaurant_id FROM {TABLE}, to_tsquery('{POSTGRES_CONFIG}', %s) query "
+                f"WHERE document @@ query ORDER BY ts_rank_cd('{POSTGRES_WEIGHTS}', document, query, 1) DESC LIMIT %s",
+                [' & '.join(f'{word}:*' for word in words), limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .calories import schedule_recount
+from .models import MenuItem, Restaurant
+from .search import schedule_reindex
+from .suggest import catalog_changed
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def reindex_restaurant(sender, instance, **kwargs):
+    """Keep the restaurant's search document and the suggestions in sync"""
+    schedule_reindex(instance.pk)
+    transaction.on_commit(catalog_changed)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def reindex_menu_item_restaurant(sender, instance, **kwargs):
+    """Menu items are part of their restaurant's search document and calorie histogram"""
+    schedule_reindex(instance.restaurant_id)
+    schedule_recount(instance.restaurant_id)
+    # Last, so cached facets are recounted from the new histogram
+    transaction.on_commit(catalog_changed)
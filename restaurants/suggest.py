@@ -0,0 +1,195 @@
+"""
+Search box autocomplete, answered from memory.
+
+Each process holds every suggestion: the names and cuisines of approved
+restaurants and the distinct dish names on their menus, weighted by the
+quantities ordered (OrderItem). Every word-suffix of a suggestion is a key
+("chicken biryani" is filed under "chicken biryani" and "biryani"), and the
+keys are kept in one sorted list. A prefix is two bisects away from the
+range of keys starting with it.
+
+Suggestions are numbered best first (most ordered, then the most common on
+menus, then shortest), so the best matches of a range are just its lowest
+numbers. Ranges too wide to scan (one or two letters) have their best
+matches precomputed.
+
+Requests never touch the database. At most every SUGGEST_CHECK_SECONDS a
+request compares the catalog version stamp in the cache, bumped by signals
+when a restaurant or menu item changes, and the index is rebuilt in a
+background thread if it changed or is older than SUGGEST_MAX_AGE (order
+counts drift). Meanwhile the previous index keeps answering.
+"""
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Sum
+from orders.models import OrderItem
+from .models import MenuItem, Restaurant
+from .search import tokenize
+
+
+CATALOG_VERSION_KEY = 'restaurants:catalog:version'
+# Sorts after every character, so prefix + END bounds the keys starting with prefix
+END = '\U0010ffff'
+# Key ranges wider than this get their best suggestions precomputed
+SCAN_LIMIT = 2000
+MAX_LIMIT = 20
+
+
+def catalog_changed():
+    """Make every process rebuild its suggestions and cached facets (called after commit)"""
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def catalog_version():
+    """The current catalog version stamp (a new one if the cache lost it)"""
+    return cache.get_or_set(CATALOG_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+
+
+class Suggestion:
+    def __init__(self, text, kind, weight, prior, restaurant_id=None):
+        self.text = text
+        self.kind = kind
+        self.weight = weight
+        self.prior = prior
+        self.restaurant_id = restaurant_id
+
+
+class SuggestIndex:
+    """Sorted word-suffix keys of ranked suggestions"""
+
+    def __init__(self, suggestions, version=None):
+        self.suggestions = sorted(suggestions, key=lambda s: (-s.weight, -s.prior, len(s.text), s.text))
+        self.version = version
+        self.built_at = time.monotonic()
+
+        pairs = []
+        for number, suggestion in enumerate(self.suggestions):
+            words = tokenize(suggestion.text)
+            pairs.extend((' '.join(words[start:]), number) for start in range(len(words)))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.numbers = np.array([number for _, number in pairs], dtype=np.int32)
+        self.precomputed = self._precompute()
+
+    def _best(self, low, high, limit):
+        return np.unique(self.numbers[low:high])[:limit].tolist()
+
+    def _precompute(self):
+        # Walk down from the empty prefix, one character at a time, into the
+        # ranges still wider than SCAN_LIMIT
+        precomputed, pending = {}, [('', 0, len(self.keys))]
+        while pending:
+            prefix, low, high = pending.pop()
+            start = low
+            while start < high and len(self.keys[start]) == len(prefix):
+                start += 1
+            while start < high:
+                child = self.keys[start][:len(prefix) + 1]
+                end = bisect_left(self.keys, child + END, start, high)
+                if end - start > SCAN_LIMIT:
+                    precomputed[child] = self._best(start, end, MAX_LIMIT)
+                    pending.append((child, start, end))
+                start = end
+        return precomputed
+
+    def complete(self, query, limit=8):
+        """The best `limit` suggestions having a word-suffix that starts with `query`"""
+        prefix = ' '.join(tokenize(query))
+        if not prefix:
+            return []
+        limit = min(limit, MAX_LIMIT)
+        low = bisect_left(self.keys, prefix)
+        high = bisect_left(self.keys, prefix + END, low)
+        if high - low > SCAN_LIMIT and prefix in self.precomputed:
+            numbers = self.precomputed[prefix][:limit]
+        else:
+            numbers = self._best(low, high, limit)
+        return [self.suggestions[number] for number in numbers]
+
+
+def load_suggestions():
+    """Suggestions for the current catalog and order counts (a few queries)"""
+    restaurants = Restaurant.objects.filter(is_approved=True)
+    ordered = dict(OrderItem.objects.filter(order__restaurant__in=restaurants).values_list(
+        'order__restaurant').annotate(Sum('quantity')).order_by())
+
+    suggestions, cuisines = [], defaultdict(lambda: [0, 0, ''])
+    for restaurant_id, name, cuisine, rating in restaurants.values_list('id', 'name', 'cuisine', 'rating'):
+        weight = ordered.get(restaurant_id) or 0
+        suggestions.append(Suggestion(name, 'restaurant', weight, float(rating), restaurant_id))
+        totals = cuisines[' '.join(tokenize(cuisine))]
+        totals[0] += weight
+        totals[1] += 1
+        totals[2] = totals[2] or cuisine
+    suggestions.extend(Suggestion(text, 'cuisine', weight, count) for weight, count, text in cuisines.values() if text)
+
+    # Dish names differing only in case or accents are one suggestion,
+    # spelled as on most menus
+    dishes = defaultdict(lambda: [0, 0, '', 0])
+    for name, menus in MenuItem.objects.filter(is_available=True, restaurant__in=restaurants).values_list(
+            'name').annotate(Count('id')).order_by():
+        totals = dishes[' '.join(tokenize(name))]
+        totals[1] += menus
+        if menus > totals[3]:
+            totals[2], totals[3] = name, menus
+    for name, quantity in OrderItem.objects.filter(order__restaurant__in=restaurants).values_list(
+            'name').annotate(Sum('quantity')).order_by():
+        key = ' '.join(tokenize(name))
+        if key in dishes:
+            dishes[key][0] += quantity or 0
+    suggestions.extend(Suggestion(text, 'dish', weight, menus) for weight, menus, text, _ in dishes.values() if text)
+    return suggestions
+
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_rebuilding = threading.Event()
+
+
+def _build(version):
+    global _index
+    _index = SuggestIndex(load_suggestions(), version)
+
+
+def _rebuild_in_background(version):
+    try:
+        _build(version)
+    finally:
+        # The thread's own connections
+        connections.close_all()
+        _rebuilding.clear()
+
+
+def current_index():
+    """This process's index; rebuilt when the catalog stamp changes or it is too old"""
+    global _checked_at
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _build(catalog_version())
+        return _index
+
+    now = time.monotonic()
+    if now - _checked_at < getattr(settings, 'SUGGEST_CHECK_SECONDS', 1.0):
+        return _index
+    _checked_at = now
+    version = catalog_version()
+    stale = version != _index.version or now - _index.built_at > getattr(settings, 'SUGGEST_MAX_AGE', 600)
+    if not stale:
+        return _index
+    if not getattr(settings, 'SUGGEST_BACKGROUND_REFRESH', True):
+        _build(version)
+        return _index
+    with _lock:
+        if not _rebuilding.is_set():
+            _rebuilding.set()
+            threading.Thread(target=_rebuild_in_background, args=(version,), daemon=True).start()
+    return _index
@@ -1,3 +1,28 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from .facets import clean_filters
+from .models import Restaurant
 
-# Create your tests here.
+
+class RatingFilterTests(TestCase):
+    """The listing's minimum rating filter ignores values that are not ratings"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='owner')
+        Restaurant.objects.create(owner=owner, name='Paradise', cuisine='Hyderabadi', location='Hyderabad',
+                                  description='Biryani', rating=4.5)
+        Restaurant.objects.create(owner=owner, name='Corner Cafe', cuisine='Continental', location='Hyderabad',
+                                  description='Sandwiches', rating=3.0)
+
+    def test_rating_filter(self):
+        response = self.client.get(reverse('restaurants:list'), {'rating': '4.0'})
+        self.assertEqual([restaurant.name for restaurant in response.context['restaurants']], ['Paradise'])
+
+    def test_non_finite_and_malformed_ratings_are_ignored(self):
+        for value in ['inf', '-inf', 'nan', 'NaN', '1e400', '-1e400', 'four', '']:
+            with self.subTest(rating=value):
+                self.assertIsNone(clean_filters({'rating': value})['rating'])
+                response = self.client.get(reverse('restaurants:list'), {'rating': value})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['restaurants']), 2)
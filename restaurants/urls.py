@@ -6,6 +6,7 @@ app_name = 'restaurants'
 urlpatterns = [
     path('', views.restaurant_list, name='list'),
     path('<int:restaurant_id>/', views.restaurant_detail, name='detail'),
+    path('api/suggest/', views.suggest, name='suggest'),
     path('dashboard/', views.owner_dashboard, name='owner_dashboard'),
     path('add/', views.add_restaurant, name='add_restaurant'),
     path('edit/<int:restaurant_id>/', views.edit_restaurant, name='edit_restaurant'),
@@ -1,8 +1,17 @@
+from urllib.parse import urlencode
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Restaurant, MenuItem
 from .forms import RestaurantForm, MenuItemForm
+from .calories import CALORIE_RANGES, calorie_filter
+from .facets import clean_filters, facets_for
+from .fuzzy import did_you_mean
+from .search import search_restaurant_ids
+from .suggest import current_index
 
 
 def restaurant_list(request):
@@ -11,30 +20,73 @@ def restaurant_list(request):
     
     # Filtering
     search = request.GET.get('search', '')
-    cuisine = request.GET.get('cuisine', '')
-    veg_only = request.GET.get('veg', '')
-    rating_filter = request.GET.get('rating', '')
-    calorie_range = request.GET.get('calorie_range', '')
+    filters = clean_filters(request.GET)
     
+    ranked = corrected_search = None
     if search:
-        restaurants = restaurants.filter(name__icontains=search) | restaurants.filter(cuisine__icontains=search)
-    if cuisine:
-        restaurants = restaurants.filter(cuisine__icontains=cuisine)
-    if veg_only:
+        # Ranked ids from the full-text index; LIKE on databases without one
+        ranked = search_restaurant_ids(search, getattr(settings, 'SEARCH_MAX_RESULTS', 500))
+        if ranked == []:
+            # Nothing found: retry with typos corrected ("biriyani" -> "biryani")
+            corrected_search = did_you_mean(search)
+            if corrected_search:
+                ranked = search_restaurant_ids(corrected_search, getattr(settings, 'SEARCH_MAX_RESULTS', 500))
+        if ranked is None:
+            restaurants = restaurants.filter(name__icontains=search) | restaurants.filter(cuisine__icontains=search)
+        else:
+            restaurants = restaurants.filter(pk__in=ranked)
+    
+    # Counts per filter option, before the filters narrow the results down
+    facets = facets_for(filters, search, restaurants)
+    if filters['cuisine']:
+        restaurants = restaurants.filter(cuisine__icontains=filters['cuisine'])
+    if filters['veg']:
         restaurants = restaurants.filter(is_veg=True)
-    if rating_filter:
-        restaurants = restaurants.filter(rating__gte=float(rating_filter))
+    if filters['rating'] is not None:
+        restaurants = restaurants.filter(rating__gte=filters['rating'])
+    
+    # Filter by calorie range (restaurants with menu items in it, from their calorie histogram)
+    if filters['calorie_range']:
+        restaurants = restaurants.filter(calorie_filter(filters['calorie_range']))
     
-    # Filter by calorie range (filter restaurants with menu items in calorie range)
-    if calorie_range:
-        if calorie_range == 'low':
-            restaurants = restaurants.filter(menu_items__calories__lte=300, menu_items__calories__isnull=False).distinct()
-        elif calorie_range == 'medium':
-            restaurants = restaurants.filter(menu_items__calories__gt=300, menu_items__calories__lte=600).distinct()
-        elif calorie_range == 'high':
-            restaurants = restaurants.filter(menu_items__calories__gt=600).distinct()
+    if ranked:
+        # Best match first instead of by rating
+        position = {pk: i for i, pk in enumerate(ranked)}
+        restaurants = sorted(restaurants, key=lambda restaurant: position[restaurant.pk])
     
-    return render(request, 'restaurants/list.html', {'restaurants': restaurants})
+    return render(request, 'restaurants/list.html', {
+        'restaurants': restaurants,
+        'corrected_search': corrected_search,
+        'facets': facets,
+    })
+
+
+def suggest(request):
+    """
+    Search box autocomplete: ?q=<what was typed>&limit= (default 8, max 20).
+    Answered from the in-memory index in suggest.py, without database queries.
+    """
+    query = request.GET.get('q', '')[:100]
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), 20))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'limit must be a number'}, status=400)
+
+    suggestions = current_index().complete(query, limit) if query.strip() else []
+    list_url = reverse('restaurants:list')
+    return JsonResponse({
+        'success': True,
+        'query': query,
+        'suggestions': [
+            {
+                'text': suggestion.text,
+                'kind': suggestion.kind,
+                'url': (reverse('restaurants:detail', args=[suggestion.restaurant_id]) if suggestion.restaurant_id
+                        else f"{list_url}?{urlencode({'search': suggestion.text})}"),
+            }
+            for suggestion in suggestions
+        ],
+    })
 
 
 @login_required
@@ -141,13 +193,12 @@ def restaurant_detail(request, restaurant_id):
     
     # Calorie filtering
     calorie_range = request.GET.get('calorie_range', '')
-    if calorie_range:
-        if calorie_range == 'low':
-            menu_items = menu_items.filter(calories__lte=300, calories__isnull=False)
-        elif calorie_range == 'medium':
-            menu_items = menu_items.filter(calories__gt=300, calories__lte=600)
-        elif calorie_range == 'high':
-            menu_items = menu_items.filter(calories__gt=600)
+    if calorie_range in CALORIE_RANGES:
+        if getattr(restaurant, f'{calorie_range}_calorie_items'):
+            menu_items = menu_items.filter(CALORIE_RANGES[calorie_range])
+        else:
+            # The histogram says nothing on the menu is in range
+            menu_items = menu_items.none()
     
     # Sorting
     sort_by = request.GET.get('sort_by', '')